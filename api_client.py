@@ -0,0 +1,74 @@
+"""
+Client mỏng cho api_server.py: front-end (web app, script) gọi HTTP thay vì tự quét
+- Bật bằng env SCANNER_API_URL (ví dụ http://127.0.0.1:8780); không đặt thì front-end quét tại chỗ như cũ
+- Chỉ cần requests + pandas, không import scanner_core
+"""
+from __future__ import annotations
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+import requests
+
+SCANNER_API_URL = os.getenv("SCANNER_API_URL", "")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 300))  # lượt quét toàn thị trường có thể mất vài phút
+
+
+class ScannerClient:
+    def __init__(self, base_url: str = SCANNER_API_URL, timeout: float = API_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()  # giữ kết nối keep-alive giữa các lần gọi
+
+    def _get(self, path: str, **params) -> dict:
+        params = {k: (",".join(v) if isinstance(v, (list, tuple)) else v)
+                  for k, v in params.items() if v not in (None, "", [], ())}
+        r = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        if r.status_code >= 400:
+            try:
+                msg = r.json().get("error", r.text)
+            except ValueError:
+                msg = r.text
+            raise RuntimeError(f"API {r.status_code}: {msg}")
+        return r.json()
+
+    def health(self) -> dict:
+        return self._get("/health")
+
+    def symbols(self, floors: Optional[List[str]] = None) -> List[str]:
+        return self._get("/symbols", floors=floors)["symbols"]
+
+    def scan(self, name: str, symbols: Optional[List[str]] = None, floors: Optional[List[str]] = None,
+             timeframe: str = "D", fresh: bool = False) -> List[dict]:
+        return self.scan_result(name, symbols, floors, timeframe, fresh)["rows"]
+
+    def scan_result(self, name: str, symbols: Optional[List[str]] = None, floors: Optional[List[str]] = None,
+                    timeframe: str = "D", fresh: bool = False) -> dict:
+        """Kết quả đầy đủ: rows + scanned_at/age/source (cache|coalesced|computed)."""
+        return self._get(f"/scan/{name}", symbols=symbols, floors=floors, timeframe=timeframe,
+                         fresh="1" if fresh else None)
+
+    def evaluate(self, symbol: str, filters: Optional[List[str]] = None, explain: bool = False) -> dict:
+        """explain=True: kèm conditions {bộ lọc: [[tín hiệu, điều kiện, đạt?], ...]}."""
+        return self._get(f"/evaluate/{symbol}", filters=filters, explain="1" if explain else None)
+
+    def quotes(self, symbols: List[str]) -> Dict[str, dict]:
+        return self._get("/quotes", symbols=symbols)["quotes"]
+
+    def events(self, since: int = 0, symbols: Optional[List[str]] = None) -> dict:
+        """Sự kiện tín hiệu của engine phía server: {"engine", "total", "events": [Event.to_dict()]}."""
+        return self._get("/events", since=since, symbols=symbols)
+
+    def stats(self) -> dict:
+        return self._get("/stats")
+
+    def chart(self, symbol: str, days: int = 120, timeframe: str = "D") -> pd.DataFrame:
+        """Nến dạng DataFrame O/H/L/C/V, index 'date' UTC naive (như get_chart_data)."""
+        bars = self._get(f"/chart/{symbol}", days=days, timeframe=timeframe)["bars"]
+        index = pd.DatetimeIndex(pd.to_datetime(bars.pop("t"), unit="s"), name="date")
+        return pd.DataFrame(bars, index=index)
+
+
+def get_client() -> Optional[ScannerClient]:
+    """Client nếu đã cấu hình SCANNER_API_URL, ngược lại None (quét tại chỗ)."""
+    return ScannerClient() if SCANNER_API_URL else None
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+API nội bộ (HTTP + JSON) dùng chung cho bot, web app và script
+- 1 process giữ cache nến, bảng giá, panel; các front-end chỉ gọi HTTP (api_client.py)
+- Cache phía server theo TTL (trong phiên ngắn, ngoài phiên dài) + gộp request trùng:
+  nhiều client hỏi cùng 1 scan khi đang quét thì chờ chung 1 lượt quét
+- Scan chạy trong thread (asyncio.to_thread), giới hạn số lượt quét đồng thời
+
+Endpoint:
+  GET /health                                   trạng thái + uptime
+  GET /symbols?floors=HOSE,HNX                  universe
+  GET /scan/{mua1|sin|sin2|sin3}?floors=&symbols=&timeframe=D&fresh=1
+                                                khung không đủ nến cho bộ lọc -> 400 (scanner_core.timeframe_error)
+  GET /evaluate/{symbol}?filters=mua1,sin&explain=1   tín hiệu từng bộ lọc của 1 mã (+ từng điều kiện)
+  GET /quotes?symbols=FPT,VNM                   bảng giá từ quote poller
+  GET /events?since=0&symbols=FPT,VNM           sự kiện vào/ra tín hiệu của engine realtime (seq > since)
+  GET /chart/{symbol}?days=120&timeframe=D      nến dạng cột (t/O/H/L/C/V)
+  GET /stats                                    cache API, cache nến, provider
+
+Run:
+  python api_server.py                          # 127.0.0.1:8780
+  API_PORT=9000 python api_server.py --host 0.0.0.0
+"""
+from __future__ import annotations
+import os, sys, time, asyncio, argparse
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import scanner_core as core
+from scanner_core import SCAN_FUNCTIONS, SIGNAL_FILTERS
+from bar_cache import in_session, vn_now
+from async_http import HttpServer, HttpError, Request, json_response
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", 8780))
+API_SCAN_TTL = float(os.getenv("API_SCAN_TTL", 60))            # giây, trong phiên
+API_SCAN_TTL_CLOSED = float(os.getenv("API_SCAN_TTL_CLOSED", 900))  # ngoài phiên dữ liệu không đổi
+API_EVAL_TTL = float(os.getenv("API_EVAL_TTL", 15))
+API_CHART_TTL = float(os.getenv("API_CHART_TTL", 30))
+API_SCAN_CONCURRENCY = int(os.getenv("API_SCAN_CONCURRENCY", 2))  # lượt quét toàn thị trường cùng lúc
+API_CACHE_MAX = int(os.getenv("API_CACHE_MAX", 2000))          # số key tối đa trong cache
+
+
+class Coalescer:
+    """Cache TTL + single-flight: mỗi key chỉ có 1 lượt tính, request trùng chờ chung kết quả."""
+
+    def __init__(self, max_entries: int = API_CACHE_MAX):
+        self.max_entries = max_entries
+        self._cache: Dict[Any, Tuple[float, Any]] = {}   # key -> (thời điểm tính, giá trị)
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    async def get(self, key, ttl: float, compute: Callable[[], Awaitable[Any]],
+                  fresh: bool = False) -> Tuple[Any, float, str]:
+        """(giá trị, thời điểm tính, nguồn: cache|coalesced|computed)."""
+        hit = self._cache.get(key)
+        if hit is not None and not fresh and time.time() - hit[0] <= ttl:
+            self.stats["hits"] += 1
+            return hit[1], hit[0], "cache"
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            value, at = await asyncio.shield(fut)
+            return value, at, "coalesced"
+        self.stats["misses"] += 1
+        fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await compute()
+        except BaseException as e:
+            self.stats["errors"] += 1
+            fut.set_exception(e)
+            fut.exception()  # không có ai chờ thì không cảnh báo "exception never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        at = time.time()
+        self._cache[key] = (at, value)
+        if len(self._cache) > self.max_entries:  # bỏ các key cũ nhất
+            for k, _ in sorted(self._cache.items(), key=lambda kv: kv[1][0])[:len(self._cache) - self.max_entries]:
+                del self._cache[k]
+        fut.set_result((value, at))
+        return value, at, "computed"
+
+    def info(self) -> dict:
+        return {"entries": len(self._cache), "inflight": len(self._inflight), **self.stats}
+
+
+def _list(value: Optional[str], upper: bool = True) -> List[str]:
+    items = [s.strip() for s in (value or "").split(",") if s.strip()]
+    return [s.upper() for s in items] if upper else items
+
+
+def scan_ttl() -> float:
+    return API_SCAN_TTL if in_session(vn_now()) else API_SCAN_TTL_CLOSED
+
+
+def bars_payload(frame) -> dict:
+    """DataFrame nến -> dạng cột (ít byte hơn danh sách object)."""
+    if frame is None or frame.empty:
+        return {"t": [], "O": [], "H": [], "L": [], "C": [], "V": []}
+    out = {"t": frame.index.values.astype("datetime64[s]").astype(np.int64).tolist()}
+    for f in ("O", "H", "L", "C", "V"):
+        out[f] = frame[f].to_numpy().tolist()
+    return out
+
+
+class ScannerApi:
+    """Các endpoint trên scanner_core; mọi việc chặn I/O chạy trong thread."""
+
+    def __init__(self, server: HttpServer, cache: Optional[Coalescer] = None):
+        self.server = server
+        self.cache = cache or Coalescer()
+        self._scan_slots = asyncio.Semaphore(API_SCAN_CONCURRENCY)
+        r = server.route
+        r("GET", "/health")(self.health)
+        r("GET", "/symbols")(self.symbols)
+        r("GET", "/scan/{name}")(self.scan)
+        r("GET", "/evaluate/{symbol}")(self.evaluate)
+        r("GET", "/quotes")(self.quotes)
+        r("GET", "/events")(self.events)
+        r("GET", "/chart/{symbol}")(self.chart)
+        r("GET", "/stats")(self.stats)
+
+    def _universe(self, floors: List[str]) -> List[str]:
+        return [s.code for s in core.fetch_all_symbols(floors or None)]
+
+    async def health(self, req: Request):
+        return json_response({"ok": True, "uptime": round(time.time() - self.server.stats["started"], 1),
+                              "session": in_session(vn_now())})
+
+    async def symbols(self, req: Request):
+        floors = _list(req.query.get("floors"))
+        return json_response({"symbols": await asyncio.to_thread(self._universe, floors)})
+
+    async def scan(self, req: Request):
+        name = req.params["name"]
+        if name not in SCAN_FUNCTIONS:
+            raise HttpError(404, f"Không có bộ lọc '{name}'")
+        timeframe = req.query.get("timeframe", "D").upper()
+        error = core.timeframe_error(name, timeframe)
+        if error:  # ví dụ khung 15 phút chỉ có 18 nến / phiên, bộ lọc cần 40-90
+            raise HttpError(400, error)
+        explicit = _list(req.query.get("symbols"))
+        floors = _list(req.query.get("floors"))
+        key = ("scan", name, timeframe, tuple(sorted(explicit)) if explicit else ("*", *sorted(floors)))
+
+        async def compute():
+            async with self._scan_slots:
+                symbols = explicit or await asyncio.to_thread(self._universe, floors)
+                t0 = time.perf_counter()
+                if timeframe != "D":
+                    rows = await asyncio.to_thread(core.scan_timeframe, name, symbols, timeframe)
+                elif not explicit and not floors:  # toàn thị trường: lưu làm kết quả gần nhất (warm start)
+                    rows = await asyncio.to_thread(core.run_scan, name, symbols)
+                else:
+                    rows = await asyncio.to_thread(SCAN_FUNCTIONS[name], symbols)
+                return {"rows": rows, "symbols": len(symbols), "seconds": round(time.perf_counter() - t0, 2)}
+
+        result, at, source = await self.cache.get(key, scan_ttl(), compute, fresh=req.query.get("fresh") == "1")
+        return json_response({"filter": name, "timeframe": timeframe, "scanned_at": at,
+                              "age": round(time.time() - at, 1), "source": source, **result})
+
+    async def evaluate(self, req: Request):
+        symbol = req.params["symbol"].upper()
+        filters = _list(req.query.get("filters"), upper=False) or list(SIGNAL_FILTERS)
+        bad = [f for f in filters if f not in SIGNAL_FILTERS]
+        if bad:
+            raise HttpError(400, f"Bộ lọc không hợp lệ: {', '.join(bad)}")
+        explain = req.query.get("explain") == "1"
+        result, at, source = await self.cache.get(
+            ("eval", symbol, tuple(filters), explain), API_EVAL_TTL,
+            lambda: asyncio.to_thread(core.evaluate_symbol, symbol, filters, explain))
+        if result.get("error") == "fetch_failed":
+            raise HttpError(503, f"Không tải được dữ liệu {symbol}, thử lại sau")
+        if result.get("error"):
+            raise HttpError(404, f"Không có dữ liệu {symbol}")
+        return json_response({**result, "evaluated_at": at, "source": source})
+
+    async def quotes(self, req: Request):
+        symbols = _list(req.query.get("symbols"))
+        if not symbols:
+            raise HttpError(400, "Thiếu ?symbols=")
+        quotes = {s: core.QUOTES.get(s) for s in symbols}  # đọc mảng trong bộ nhớ, không cần thread
+        return json_response({"quotes": {s: q for s, q in quotes.items() if q is not None},
+                              "missing": [s for s, q in quotes.items() if q is None]})
+
+    async def events(self, req: Request):
+        engine = core.get_signal_engine()
+        try:
+            since = int(req.query.get("since", 0))
+        except ValueError:
+            raise HttpError(400, "since phải là số")
+        symbols = set(_list(req.query.get("symbols")))
+        events = engine.events_since(since) if engine is not None else []
+        return json_response({"engine": engine is not None, "total": len(engine.events) if engine else 0,
+                              "events": [e.to_dict() for e in events if not symbols or e.symbol in symbols]})
+
+    async def chart(self, req: Request):
+        symbol = req.params["symbol"].upper()
+        timeframe = req.query.get("timeframe", "D").upper()
+        if timeframe not in core.TIMEFRAMES:
+            raise HttpError(400, f"Khung không hỗ trợ: {timeframe}")
+        try:
+            days = max(1, min(int(req.query.get("days", 120)), 2000))
+        except ValueError:
+            raise HttpError(400, "days phải là số")
+        payload, at, source = await self.cache.get(
+            ("chart", symbol, timeframe, days), API_CHART_TTL,
+            lambda: asyncio.to_thread(lambda: bars_payload(core.get_chart_data(symbol, days, timeframe))))
+        return json_response({"symbol": symbol, "timeframe": timeframe, "bars": payload,
+                              "fetched_at": at, "source": source})
+
+    async def stats(self, req: Request):
+        return json_response({"http": self.server.stats, "cache": self.cache.info(),
+                              "bar_cache": core.BAR_CACHE.stats(), "providers": core.MARKET_DATA.stats(),
+                              "quotes": core.QUOTES.staleness()})
+
+
+def build_server(host: str = API_HOST, port: int = API_PORT) -> Tuple[HttpServer, ScannerApi]:
+    server = HttpServer(host, port)
+    return server, ScannerApi(server)
+
+
+async def serve(host: str, port: int):
+    server, _ = build_server(host, port)
+    await server.start()
+    print(f"🌐 API scanner tại http://{server.host}:{server.port}")
+    await server.serve()
+    print("👋 API đã dừng")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="API HTTP nội bộ cho scanner")
+    ap.add_argument("--host", default=API_HOST)
+    ap.add_argument("--port", type=int, default=API_PORT)
+    args = ap.parse_args(argv)
+    if core.QUOTE_POLLER_ENABLED:
+        core.start_quote_poller()
+        if core.SIGNAL_ENGINE_ENABLED:  # front-end mỏng đọc sự kiện qua /events
+            core.start_signal_engine()
+    if core.WARM_START_ENABLED:
+        core.start_warm_start()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+HTTP/1.1 server nhỏ trên asyncio (chỉ thư viện chuẩn) cho API nội bộ và webhook Telegram
+- Route theo method + mẫu đường dẫn ("/scan/{name}"), handler là coroutine nhận Request
+- Keep-alive, giới hạn kích thước body, lỗi handler -> JSON {"error": ...}
+- Dừng êm: ngừng nhận kết nối, chờ request đang xử lý xong (tối đa `grace` giây)
+"""
+from __future__ import annotations
+import re, json, time, signal, asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+try:  # tuỳ chọn: serialize JSON nhanh hơn với danh sách kết quả lớn
+    import orjson as _orjson
+except ImportError:  # pragma: no cover
+    _orjson = None
+
+REASONS = {200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+           403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+           501: "Not Implemented", 503: "Service Unavailable"}
+MAX_HEADER = 16 * 1024
+
+
+class HttpError(Exception):
+    """Lỗi trả thẳng cho client với mã HTTP tương ứng."""
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body", "params", "peer")
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes, peer=None):
+        url = urlsplit(target)
+        self.method = method
+        self.path = unquote(url.path)
+        self.query = dict(parse_qsl(url.query))
+        self.headers = headers  # tên header viết thường
+        self.body = body
+        self.params: Dict[str, str] = {}
+        self.peer = peer
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HttpError(400, "JSON không hợp lệ")
+
+
+class Response:
+    __slots__ = ("status", "body", "content_type", "headers")
+
+    def __init__(self, body: bytes = b"", status: int = 200, content_type: str = "text/plain; charset=utf-8",
+                 headers: Optional[Dict[str, str]] = None):
+        self.status, self.body, self.content_type = status, body, content_type
+        self.headers = headers or {}
+
+
+def dumps(obj) -> bytes:
+    if _orjson is not None:
+        return _orjson.dumps(obj, option=_orjson.OPT_SERIALIZE_NUMPY | _orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode()
+
+
+def json_response(obj, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(dumps(obj), status, "application/json", headers)
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class HttpServer:
+    """Server asyncio: `route()` đăng ký handler, `serve()` chạy tới khi `shutdown()`."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8780, max_body: int = 1 << 20,
+                 keepalive: float = 15.0):
+        self.host, self.port = host, port
+        self.max_body, self.keepalive = max_body, keepalive
+        self.routes: List[Tuple[str, re.Pattern, Handler]] = []
+        self.on_shutdown: List[Callable[[], Awaitable[None]]] = []
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._conns: Dict[asyncio.Task, bool] = {}  # task kết nối -> đang xử lý request
+        self._closing = False
+        self._stopped: Optional[asyncio.Event] = None
+        self.stats = {"requests": 0, "errors": 0, "started": time.time()}
+
+    def route(self, method: str, pattern: str):
+        regex = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", pattern.rstrip("/") or "/") + "/?$")
+
+        def deco(fn: Handler) -> Handler:
+            self.routes.append((method.upper(), regex, fn))
+            return fn
+        return deco
+
+    def _match(self, req: Request) -> Handler:
+        allowed = False
+        for method, regex, fn in self.routes:
+            m = regex.match(req.path)
+            if m:
+                if method == req.method or (method == "GET" and req.method == "HEAD"):
+                    req.params = m.groupdict()
+                    return fn
+                allowed = True
+        raise HttpError(405 if allowed else 404)
+
+    async def _read_request(self, reader: asyncio.StreamReader, peer) -> Optional[Request]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Header quá lớn")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Request line không hợp lệ")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            raise HttpError(411, "Cần Content-Length")
+        length = int(headers.get("content-length") or 0)
+        if length > self.max_body:
+            raise HttpError(413)
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, headers, body, peer)
+
+    async def _write(self, writer: asyncio.StreamWriter, resp: Response, keep: bool, head_only: bool = False):
+        hdr = [f"HTTP/1.1 {resp.status} {REASONS.get(resp.status, '')}",
+               f"Content-Type: {resp.content_type}", f"Content-Length: {len(resp.body)}",
+               f"Connection: {'keep-alive' if keep else 'close'}"]
+        hdr += [f"{k}: {v}" for k, v in resp.headers.items()]
+        writer.write(("\r\n".join(hdr) + "\r\n\r\n").encode("latin-1") + (b"" if head_only else resp.body))
+        await writer.drain()
+
+    async def _handle(self, req: Request) -> Response:
+        try:
+            return await self._match(req)(req)
+        except HttpError as e:
+            return json_response({"error": str(e)}, e.status)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"❌ Lỗi xử lý {req.method} {req.path}: {e}")
+            return json_response({"error": str(e)}, 500)
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._conns[task] = False
+        peer = writer.get_extra_info("peername")
+        try:
+            while not self._closing:
+                try:
+                    req = await self._read_request(reader, peer)
+                except HttpError as e:
+                    await self._write(writer, json_response({"error": str(e)}, e.status), False)
+                    break
+                if req is None:
+                    break
+                self._conns[task] = True
+                self.stats["requests"] += 1
+                resp = await self._handle(req)
+                keep = (not self._closing and req.headers.get("connection", "").lower() != "close")
+                await self._write(writer, resp, keep, req.method == "HEAD")
+                self._conns[task] = False
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._conns.pop(task, None)
+            writer.close()
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._connection, self.host, self.port, limit=MAX_HEADER)
+        self.port = self._server.sockets[0].getsockname()[1]  # port=0 -> port thật
+        return self
+
+    async def shutdown(self, grace: float = 10.0):
+        """Ngừng nhận kết nối, chờ request đang xử lý, đóng kết nối rỗi rồi gọi on_shutdown."""
+        if self._closing:
+            return
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+        deadline = time.time() + grace
+        while any(self._conns.values()) and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        for task in list(self._conns):
+            task.cancel()
+        for fn in self.on_shutdown:
+            try:
+                await fn()
+            except Exception as e:
+                print(f"⚠️ Lỗi khi dừng: {e}")
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def serve(self, grace: float = 10.0):
+        """Chạy tới khi nhận SIGINT/SIGTERM (hoặc có nơi khác gọi shutdown())."""
+        if self._server is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.ensure_future(self.shutdown(grace)))
+            except (NotImplementedError, RuntimeError):  # Windows / không phải main thread
+                pass
+        await self._stopped.wait()
@@ -0,0 +1,309 @@
+"""
+Cache nến ngày: nến các phiên đã đóng cửa là bất biến
+- Nến đã chốt (trước hôm nay, hoặc cả hôm nay sau giờ đóng cửa) chỉ tải một lần,
+  sau đó chỉ tải bổ sung phần còn thiếu; lưu xuống đĩa để dùng lại sau khi restart
+- Trong giờ giao dịch: chỉ tải thêm nến 1 phút mới của phiên hiện tại (1 request nhỏ / mã)
+  vào bộ đệm vòng (minute_store.py), nến ngày tạm tính được dựng từ đó (live_bar.py)
+- Sau giờ đóng cửa: nến hôm nay được chốt vào phần bất biến, không gọi API nữa
+- Giờ/ngày giao dịch theo trading_calendar.py: cuối tuần, ngày lễ không tải bổ sung nến đã chốt,
+  lúc nghỉ trưa không tải lại nến phút
+"""
+from __future__ import annotations
+import os, time, pickle, threading, datetime as dt
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from live_bar import OHLCV, synthesize_bar, append_live_slot, patch_live_bar
+from minute_store import MinuteStore, MinuteRing
+from timeframes import MINUTE_TIMEFRAMES, PERIOD_TIMEFRAMES, resample_daily, resample_minutes, \
+    period_keys, merge_bar
+from providers import ProviderError
+from trading_calendar import CALENDAR, VN_TZ, vn_now, final_day, in_session  # noqa: F401 (re-export)
+
+BAR_CACHE_DIR = os.getenv("BAR_CACHE_DIR", ".cache/bars")  # rỗng = chỉ cache trong RAM
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", 5))  # gom các lần đọc sát nhau
+CLOSED_RETRY_SECONDS = float(os.getenv("CLOSED_RETRY_SECONDS", 300))  # chưa có nến phiên chốt -> thử lại sau
+
+# fetch(symbol, resolution, since_epoch, to_epoch) -> DataFrame O/H/L/C/V, index = date (UTC naive)
+Fetch = Callable[[str, str, int, int], pd.DataFrame]
+# (nến đã chốt, chốt tới ngày, epoch bắt đầu cửa sổ đã tải)
+ClosedEntry = Tuple[pd.DataFrame, dt.date, int]
+
+
+def day_start_epoch(day: dt.date) -> int:
+    """Epoch của 00:00 giờ Việt Nam ngày `day`."""
+    return int(dt.datetime.combine(day, dt.time(0), VN_TZ).timestamp())
+
+
+def first_bar(epoch: int) -> int:
+    """Mốc nến ngày đầu tiên >= epoch (nến ngày của DChart nằm ở 00:00 UTC): 2 cửa sổ có cùng mốc
+    này chứa cùng các nến, dù `since` lệch nhau vài giờ."""
+    return -(-epoch // 86400) * 86400
+
+
+def bar_days(frame: pd.DataFrame) -> pd.Index:
+    """Ngày giao dịch (giờ VN) của từng nến, index của frame là thời điểm UTC naive."""
+    return (frame.index + pd.Timedelta(hours=7)).date
+
+
+class BarCache:
+    """Nến ngày theo mã: phần đã chốt (bất biến) + nến phiên hiện tại (làm mới trong giờ giao dịch)."""
+
+    def __init__(self, fetch: Fetch, cache_dir: str = BAR_CACHE_DIR, intraday_resolution: str = "1"):
+        self.fetch = fetch
+        self.intraday_resolution = intraday_resolution
+        self.cache_dir = cache_dir
+        self._closed: Dict[str, ClosedEntry] = {}
+        self.minute_store = MinuteStore()  # nến 1 phút của phiên hiện tại, bộ đệm vòng / mã
+        self._work: Dict[Tuple[str, int], tuple] = {}  # (sym, lookback) -> (closed, ngày, có nến live, frame)
+        self._periods: Dict[Tuple[str, str, int], tuple] = {}  # (sym, W/M, lookback) -> (closed, ngày, có nến live, phần đã chốt của kỳ, frame)
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._retry_at: Dict[str, float] = {}  # mã tải nến đã chốt lỗi/thiếu -> lúc được thử lại
+        self._guard = threading.Lock()
+        self.requests = 0  # số request đã gọi (để đo hiệu quả cache)
+        self.quotes = None  # QuoteTable (quote_poller.py) nếu có poller chạy nền
+        self.panel = None   # MarketPanel (market_panel.py): nguồn nến đã chốt dùng chung giữa các process
+        self.quote_max_age = LIVE_REFRESH_SECONDS
+        self.fetch_lookback: Optional[Callable[[], int]] = None  # số ngày tối thiểu khi tải cả cửa sổ
+
+    def _lock(self, sym: str) -> threading.Lock:
+        with self._guard:
+            return self._locks[sym]
+
+    def _fetch(self, sym: str, since: int, to: int) -> pd.DataFrame:
+        self.requests += 1
+        return self.fetch(sym, "D", since, to)
+
+    # ---- Lưu đĩa ----
+    def _path(self, sym: str) -> str:
+        return os.path.join(self.cache_dir, f"{sym}_D.pkl")
+
+    def _load_disk(self, sym: str) -> Optional[ClosedEntry]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(sym), "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+
+    def _save_disk(self, sym: str, entry: ClosedEntry):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self._path(sym)}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(sym))
+
+    def _load_panel(self, sym: str) -> Optional[ClosedEntry]:
+        if self.panel is None:
+            return None
+        bars = self.panel.bars(sym)
+        if bars is None:
+            return None
+        return bars.to_frame(), self.panel.through, int(self.panel.days[0]) * 86400
+
+    def _seed(self, sym: str, since: int) -> Optional[ClosedEntry]:
+        """Nến đã chốt khi process chưa có trong RAM: file pickle riêng hoặc panel dùng chung,
+        ưu tiên bản đủ cửa sổ và chốt tới ngày gần nhất."""
+        found = [e for e in (self._load_disk(sym), self._load_panel(sym)) if e is not None]
+        covering = [e for e in found if first_bar(e[2]) <= first_bar(since)] or found
+        return max(covering, key=lambda e: e[1]) if covering else None
+
+    # ---- Phần đã chốt ----
+    def _closed_bars(self, sym: str, since: int, now: dt.datetime) -> pd.DataFrame:
+        """Nến đã chốt, chỉ tải bổ sung phần còn thiếu (đầu hoặc cuối cửa sổ).
+
+        Chỉ coi là chốt tới `target` (và lưu đĩa) khi nến cuối tải về đã tới ngày đó; tải lỗi hoặc
+        nguồn chưa có nến phiên vừa chốt thì giữ bản cũ, thử lại sau CLOSED_RETRY_SECONDS."""
+        target = final_day(now)
+        entry = self._closed.get(sym) or self._seed(sym, since)
+        covers = entry is not None and first_bar(entry[2]) <= first_bar(since) and not entry[0].empty
+        final = covers and entry[1] >= target and bar_days(entry[0].iloc[-1:])[0] >= target
+        if covers and (final or time.time() < self._retry_at.get(sym, 0.0)):
+            self._closed[sym] = entry
+            return entry[0]
+
+        now_epoch = int(now.timestamp())
+        try:
+            if not covers:
+                # Chưa có hoặc thiếu lịch sử phía trước (ví dụ chart cần 500 ngày): tải cả cửa sổ,
+                # ít nhất bằng fetch_lookback để cửa sổ ngắn (bộ lọc cần ít phiên) không làm tải lại
+                if self.fetch_lookback is not None:
+                    since = min(since, int((now - dt.timedelta(days=self.fetch_lookback())).timestamp()))
+                frame, covered = self._fetch(sym, since, now_epoch), since
+            else:
+                # Phiên mới đã chốt: chỉ tải các nến sau nến cuối đã có
+                frame, _, covered = entry
+                extra = self._fetch(sym, int(frame.index[-1].timestamp()) + 1, now_epoch)
+                if not extra.empty:
+                    frame = pd.concat([frame, extra[extra.index > frame.index[-1]]])
+        except ProviderError:
+            if entry is None or entry[0].empty:
+                raise
+            self._retry_at[sym] = time.time() + CLOSED_RETRY_SECONDS
+            return entry[0]  # bản cũ (thiếu phiên mới / thiếu phần đầu cửa sổ), lần sau tải lại
+        if not frame.empty:
+            frame = frame[bar_days(frame) <= target]
+        if frame.empty or bar_days(frame)[-1] < target:
+            # Nguồn chưa có nến phiên vừa chốt (hoặc mã tạm ngừng giao dịch): giữ phần đã có trong RAM,
+            # không đánh dấu đã chốt tới target
+            self._retry_at[sym] = time.time() + CLOSED_RETRY_SECONDS
+            if not frame.empty:
+                self._closed[sym] = (frame, bar_days(frame)[-1], covered)
+            return frame
+        self._retry_at.pop(sym, None)
+        entry = (frame, target, covered)
+        self._closed[sym] = entry
+        self._save_disk(sym, entry)
+        return frame
+
+    def closed(self, sym: str, lookback_days: int) -> pd.DataFrame:
+        """Chỉ phần nến đã chốt trong `lookback_days` ngày (dùng để dựng panel/snapshot)."""
+        now = vn_now()
+        since = int((now - dt.timedelta(days=lookback_days)).timestamp())
+        with self._lock(sym):
+            closed = self._closed_bars(sym, since, now)
+        return closed[closed.index >= pd.Timestamp(since, unit="s")] if not closed.empty else closed
+
+    def preload(self, symbols, lookback_days: int) -> int:
+        """Nạp sẵn nến đã chốt từ file pickle/panel vào RAM (không gọi API, dùng khi khởi động);
+        trả về số mã đã nạp."""
+        since = int((vn_now() - dt.timedelta(days=lookback_days)).timestamp())
+        n = 0
+        for sym in symbols:
+            if sym in self._closed:
+                continue
+            entry = self._seed(sym, since)
+            if entry is not None:
+                with self._lock(sym):
+                    self._closed.setdefault(sym, entry)
+                n += 1
+        return n
+
+    # ---- Nến phiên hiện tại ----
+    def minutes(self, sym: str, now: Optional[dt.datetime] = None) -> Optional[MinuteRing]:
+        """Nến 1 phút của phiên hiện tại trong bộ đệm vòng; chỉ tải phần mới từ phút cuối đã có
+        (phút cuối có thể còn đang chạy nên được tải lại và ghi đè)."""
+        now = now or vn_now()
+        if not in_session(now):
+            self.minute_store.drop(sym)
+            return None
+        ring = self.minute_store.ring(sym, now.date())
+        quiet = CALENDAR.quiet_since(now)  # nghỉ trưa: đã tải sau giờ nghỉ thì không còn gì mới
+        if ring.fetched_at and (time.time() - ring.fetched_at < LIVE_REFRESH_SECONDS
+                                or (quiet is not None and ring.fetched_at >= quiet)):
+            return ring
+        since = ring.last_time or day_start_epoch(now.date())
+        self.requests += 1
+        try:
+            new = self.fetch(sym, self.intraday_resolution, since, int(now.timestamp()))
+        except ProviderError:
+            return ring  # giữ nến phút đã có, fetched_at không đổi -> lần đọc sau tải lại
+        if not new.empty:
+            ring.extend_frame(new[bar_days(new) == now.date()])
+        ring.fetched_at = time.time()
+        return ring
+
+    def _working(self, sym: str, lookback_days: int, since: int, closed: pd.DataFrame,
+                 bar: Optional[dict], now: dt.datetime) -> pd.DataFrame:
+        """Chuỗi nến ngày + nến phiên hiện tại. Frame được dựng 1 lần mỗi ngày, các lần sau
+        chỉ vá dòng cuối tại chỗ."""
+        key = (sym, lookback_days)
+        work = self._work.get(key)
+        if (work is None or work[0] is not closed or work[1] != now.date()
+                or work[2] != (bar is not None)):
+            frame = closed[closed.index >= pd.Timestamp(since, unit="s")] if not closed.empty else closed
+            if bar is not None:
+                ts = pd.Timestamp(now.date())  # cùng quy ước với nến ngày của DChart (00:00 UTC)
+                frame = append_live_slot(frame, bar, ts)
+            self._work[key] = (closed, now.date(), bar is not None, frame)
+            return frame
+        frame = work[3]
+        if bar is not None:
+            patch_live_bar(frame, bar)
+        return frame
+
+    def daily(self, sym: str, lookback_days: int) -> pd.DataFrame:
+        """Nến ngày trong `lookback_days` ngày gần nhất; trong giờ giao dịch nến cuối là nến
+        phiên hiện tại dựng từ nến 1 phút đã cache."""
+        now = vn_now()
+        since = int((now - dt.timedelta(days=lookback_days)).timestamp())
+        with self._lock(sym):
+            closed = self._closed_bars(sym, since, now)
+            bar = self._current_bar(sym, now)
+            return self._working(sym, lookback_days, since, closed, bar, now)
+
+    def bars(self, sym: str, timeframe: str = "D", lookback_days: int = 130) -> pd.DataFrame:
+        """Nến theo khung bất kỳ, gộp tại chỗ từ dữ liệu đã cache (timeframes.py):
+        D = daily(), W/M gộp từ nến ngày, 1/5/15/60 phút gộp từ bộ đệm nến 1 phút."""
+        if timeframe == "D":
+            return self.daily(sym, lookback_days)
+        now = vn_now()
+        if timeframe == "1":
+            with self._lock(sym):
+                ring = self.minutes(sym, now)
+                return ring.to_frame() if ring is not None else pd.DataFrame(columns=list(OHLCV))
+        if timeframe in MINUTE_TIMEFRAMES:
+            with self._lock(sym):
+                return resample_minutes(self.minutes(sym, now), MINUTE_TIMEFRAMES[timeframe])
+        if timeframe not in PERIOD_TIMEFRAMES:
+            raise ValueError(f"Khung không hỗ trợ: {timeframe}")
+        since = int((now - dt.timedelta(days=lookback_days)).timestamp())
+        with self._lock(sym):
+            closed = self._closed_bars(sym, since, now)
+            bar = self._current_bar(sym, now)
+            return self._period_frame(sym, timeframe, lookback_days, since, closed, bar, now)
+
+    def _period_frame(self, sym: str, tf: str, lookback_days: int, since: int, closed: pd.DataFrame,
+                      bar: Optional[dict], now: dt.datetime) -> pd.DataFrame:
+        """Nến tuần/tháng: phần đã chốt gộp 1 lần mỗi ngày, các lần sau chỉ vá nến kỳ đang chạy."""
+        key = (sym, tf, lookback_days)
+        work = self._periods.get(key)
+        if (work is None or work[0] is not closed or work[1] != now.date()
+                or work[2] != (bar is not None)):
+            window = closed[closed.index >= pd.Timestamp(since, unit="s")] if not closed.empty else closed
+            frame = resample_daily(window, tf)
+            base = None
+            if bar is not None:
+                today = pd.DatetimeIndex([pd.Timestamp(now.date())])
+                if not frame.empty and period_keys(frame.index[-1:], tf)[0] == period_keys(today, tf)[0]:
+                    base = {c: frame[c].iloc[-1] for c in OHLCV}  # các phiên đã chốt của kỳ này
+                else:
+                    frame = append_live_slot(frame, bar, today[0])
+            self._periods[key] = (closed, now.date(), bar is not None, base, frame)
+        else:
+            frame, base = work[4], work[3]
+        if bar is not None:
+            patch_live_bar(frame, merge_bar(base, bar))
+        return frame
+
+    def _current_bar(self, sym: str, now: dt.datetime) -> Optional[dict]:
+        """Nến phiên hiện tại: ưu tiên bảng giá của quote poller nếu còn mới, nếu không thì
+        dựng từ nến 1 phút."""
+        if not in_session(now):
+            return None
+        if self.quotes is not None:
+            q = self.quotes.get(sym, max_age=self.quote_max_age)
+            if q is not None:
+                return {c: q[c] for c in OHLCV}
+        return synthesize_bar(self.minutes(sym, now))
+
+    def current_bar(self, sym: str) -> Optional[dict]:
+        """Nến phiên hiện tại (như nến cuối của daily()), không đụng tới phần đã chốt."""
+        now = vn_now()
+        with self._lock(sym):
+            return self._current_bar(sym, now)
+
+    def live_bar(self, sym: str) -> Optional[dict]:
+        """Nến phiên hiện tại dựng từ nến 1 phút (poller dùng khi không có đường bulk)."""
+        now = vn_now()
+        with self._lock(sym):
+            return synthesize_bar(self.minutes(sym, now)) if in_session(now) else None
+
+    def stats(self) -> dict:
+        return {"symbols": len(self._closed), "live": len(self.minute_store),
+                "minute_bytes": self.minute_store.nbytes, "requests": self.requests}
@@ -0,0 +1,138 @@
+"""
+Chuỗi nến dạng mảng numpy + parser nhanh cho JSON của DChart
+- Bars: t (epoch giây, int64) và O/H/L/C/V liền khối, chuyển sang DataFrame khi cần
+- Bars.compact: giá lưu float32 khi làm tròn lại được đúng giá gốc (giá VN tối đa 2 chữ số
+  thập phân), đọc ra luôn là float64 nên kết quả bộ lọc không đổi; KL giữ int64
+- parse_dchart: giải mã t/o/h/l/c/v thẳng vào mảng có kiểu (orjson nếu có),
+  chỉ lọc NaN / sắp xếp khi dữ liệu thật sự cần
+- Lợi ích nằm ở bước parse từng response (bench_scan.py parse) và bộ nhớ bundle; BarCache vẫn giữ
+  DataFrame (cắt theo ngày, concat, resample, pickle), scan dựng Bars từ đó (~0.3 ms / mã, ~2-3% thời
+  gian lọc) nên scan đầy đủ chỉ nhanh hơn vài % - phần lọc pandas mới là chi phí chính, xem snapshot
+  chỉ báo (indicator_snapshot.py) cho đường nhanh
+"""
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:  # tuỳ chọn: nhanh hơn json chuẩn ~3-5 lần với mảng số lớn
+    import orjson as _json
+    JSON_BACKEND = "orjson"
+except ImportError:  # pragma: no cover
+    import json as _json
+    JSON_BACKEND = "json"
+
+PRICE_DTYPE = np.float64
+FIELDS = ("O", "H", "L", "C", "V")
+PRICE_FIELDS = ("O", "H", "L", "C")
+COMPACT_DECIMALS = 4  # float32 (~7 chữ số) -> float64 làm tròn 4 chữ số = giá gốc
+
+
+class Bars:
+    """Chuỗi nến gọn: 6 mảng numpy cùng độ dài, tăng dần theo t.
+
+    bars["C"] trả về pd.Series (float64, index 0..n-1) như cột của DataFrame nên các hàm
+    apply_filters* nhận được cả Bars lẫn DataFrame."""
+
+    __slots__ = ("t", "O", "H", "L", "C", "V", "_frame", "_series")
+
+    def __init__(self, t: np.ndarray, o: np.ndarray, h: np.ndarray, l: np.ndarray,
+                 c: np.ndarray, v: np.ndarray):
+        self.t, self.O, self.H, self.L, self.C, self.V = t, o, h, l, c, v
+        self._frame: Optional[pd.DataFrame] = None
+        self._series: Optional[dict] = None
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, compact: bool = True) -> "Bars":
+        """Từ DataFrame O/H/L/C/V (index UTC naive); compact=True thì giá lưu float32 nếu an toàn."""
+        if frame is None or frame.empty:
+            return cls.empty_bars()
+        t = frame.index.values.astype("datetime64[s]").astype(np.int64)
+        prices = [frame[f].to_numpy(dtype=np.float64) for f in PRICE_FIELDS]
+        if compact:
+            prices = [_compact(a) for a in prices]
+        return cls(t, *prices, frame["V"].to_numpy(dtype=np.int64))
+
+    @classmethod
+    def empty_bars(cls) -> "Bars":
+        z = np.zeros(0, dtype=PRICE_DTYPE)
+        return cls(np.zeros(0, dtype=np.int64), z, z, z, z, np.zeros(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.t) == 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f).nbytes for f in ("t", *FIELDS))
+
+    def values(self, field: str) -> np.ndarray:
+        """Mảng của trường; giá float32 được đưa về float64 đúng giá gốc."""
+        a = getattr(self, field)
+        if a.dtype == np.float32:
+            return np.round(a.astype(np.float64), COMPACT_DECIMALS)
+        return np.asarray(a)  # np.memmap (market_panel) -> ndarray, vẫn không copy
+
+    def __getitem__(self, field: str) -> pd.Series:
+        if self._series is None:
+            self._series = {}
+        s = self._series.get(field)
+        if s is None:
+            if field not in FIELDS:
+                raise KeyError(field)
+            s = self._series[field] = pd.Series(self.values(field), name=field, copy=False)
+        return s
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame O/H/L/C/V, index 'date' UTC naive (quy ước của dchart_history); dựng 1 lần,
+        chỉ dùng cho chart/xuất dữ liệu."""
+        if self._frame is None:
+            index = pd.DatetimeIndex(self.t.astype("datetime64[s]"), name="date")
+            self._frame = pd.DataFrame({f: self.values(f) for f in FIELDS}, index=index, copy=False)
+        return self._frame
+
+
+def _compact(a: np.ndarray) -> np.ndarray:
+    """float32 nếu làm tròn lại được đúng từng giá trị, ngược lại giữ float64."""
+    a32 = a.astype(np.float32)
+    if np.array_equal(np.round(a32.astype(np.float64), COMPACT_DECIMALS), a, equal_nan=True):
+        return a32
+    return a
+
+
+def _column(values, dtype) -> np.ndarray:
+    try:
+        return np.asarray(values, dtype=dtype)
+    except (TypeError, ValueError):  # có null trong mảng số nguyên
+        return np.asarray([np.nan if x is None else x for x in values], dtype=np.float64)
+
+
+def parse_dchart(raw: bytes) -> Bars:
+    """JSON DChart ({"t": [...], "o": [...], ...}) -> Bars; rỗng nếu không có dữ liệu."""
+    js = _json.loads(raw)
+    if not js or not js.get("t"):
+        return Bars.empty_bars()
+    t = _column(js["t"], np.int64)
+    cols = [_column(js.get(k) or [], PRICE_DTYPE) for k in ("o", "h", "l", "c")]
+    v = _column(js.get("v") or [], np.int64)
+    if any(len(a) != len(t) for a in (*cols, v)):
+        raise ValueError("Độ dài các mảng t/o/h/l/c/v không khớp")
+    if v.dtype != np.int64 or t.dtype != np.int64:
+        keep = np.isfinite(v) & np.isfinite(t)
+        for a in cols:
+            keep &= np.isfinite(a)
+        t, v = t[keep].astype(np.int64), v[keep].astype(np.int64)
+        cols = [a[keep] for a in cols]
+    else:
+        bad = np.isnan(cols[0]) | np.isnan(cols[1]) | np.isnan(cols[2]) | np.isnan(cols[3])
+        if bad.any():
+            keep = ~bad
+            t, v, cols = t[keep], v[keep], [a[keep] for a in cols]
+    if len(t) > 1 and not (t[1:] >= t[:-1]).all():
+        order = np.argsort(t, kind="stable")
+        t, v, cols = t[order], v[order], [a[order] for a in cols]
+    return Bars(t, *cols, v)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmark scanner trên universe tổng hợp với mock API (mock_dchart.py)
+
+Run:
+  python bench_scan.py shard --symbols 5000 --filter mua1
+  python bench_scan.py hedge --symbols 300 --tail-rate 0.05 --tail-ms 3000
+  python bench_scan.py parse --repeat 2000
+  python bench_scan.py bars --symbols 5000
+  python bench_scan.py snapshot --symbols 2000 --sessions 20
+  python bench_scan.py imports --budget-ms 800
+"""
+from __future__ import annotations
+import os, sys, time, argparse, datetime as dt, multiprocessing as mp
+
+MOCK_PORT = int(os.getenv("MOCK_PORT", 8765))
+
+
+def start_mock(n_symbols: int, latency_ms: float = 0.0, tail_rate: float = 0.0, tail_ms: float = 0.0) -> mp.Process:
+    """Chạy mock API ở process riêng để không tranh GIL với scanner."""
+    import mock_dchart
+    proc = mp.Process(target=mock_dchart.serve, args=(MOCK_PORT, n_symbols, latency_ms, tail_rate, tail_ms),
+                      daemon=True)
+    proc.start()
+    time.sleep(1.0)
+    return proc
+
+
+def use_mock():
+    os.environ["DCHART_URL"] = f"http://127.0.0.1:{MOCK_PORT}/dchart/history"
+    os.environ["STOCKS_SOURCE"] = f"http://127.0.0.1:{MOCK_PORT}/v4/stocks"
+    os.environ["CAFEF_URL"] = f"http://127.0.0.1:{MOCK_PORT}/cafef/PriceHistory.ashx"
+
+
+def bench_shard(args):
+    """So sánh chế độ thread (1 process) và shard (nhiều process)."""
+    use_mock()
+    import mock_dchart
+    from scan_dispatch import SCANNERS, scan_sharded
+    import scanner_core  # noqa: F401  (đăng ký scanner với DCHART_URL trỏ vào mock)
+
+    symbols = [s["code"] for s in mock_dchart.synthetic_symbols(args.symbols)]
+    local = SCANNERS[args.filter][1]
+
+    t0 = time.time()
+    rows_thread = local(symbols)
+    t_thread = time.time() - t0
+
+    t0 = time.time()
+    rows_shard = scan_sharded(args.filter, symbols, args.processes)
+    t_shard = time.time() - t0
+    rows_shard2 = scan_sharded(args.filter, symbols, args.processes)
+
+    same_set = sorted(r["symbol"] for r in rows_thread) == [r["symbol"] for r in rows_shard]
+    print(f"\n📊 {args.symbols} mã, bộ lọc {args.filter}")
+    print(f"   thread : {t_thread:6.1f}s  ({len(rows_thread)} dòng)")
+    print(f"   shard  : {t_shard:6.1f}s  ({len(rows_shard)} dòng, {args.processes or 'auto'} process)")
+    print(f"   tăng tốc: x{t_thread / t_shard:.2f}")
+    # Giá 1 phút thay đổi theo thời gian nên so sánh thứ tự mã + tín hiệu
+    key = lambda rows: [(r["symbol"], tuple(v for v in r.values() if isinstance(v, bool))) for r in rows]
+    print(f"   khớp kết quả thread: {same_set} | tất định giữa 2 lần shard: {key(rows_shard) == key(rows_shard2)}")
+
+
+def bench_hedge(args):
+    """Độ trễ tải nến ngày khi một phần request DChart bị chậm: không hedge vs hedge sang CafeF."""
+    use_mock()
+    import numpy as np
+    import concurrent.futures as futures
+    import mock_dchart
+    from providers import MarketData, VndirectProvider, CafefProvider
+
+    symbols = [s["code"] for s in mock_dchart.synthetic_symbols(args.symbols)]
+    to = int(time.time())
+    since = to - 200 * 86400
+    print(f"\n📊 {len(symbols)} mã, {args.tail_rate:.0%} request DChart chậm thêm {args.tail_ms:.0f}ms")
+    for label, hedge_ms in (("không hedge", 0), (f"hedge {args.hedge_ms:.0f}ms", args.hedge_ms)):
+        md = MarketData([VndirectProvider(os.environ["DCHART_URL"]), CafefProvider(os.environ["CAFEF_URL"])],
+                        hedge_after_ms=hedge_ms)
+
+        def timed(sym):
+            t0 = time.time()
+            md.history(sym, "D", since, to)
+            return time.time() - t0
+
+        with futures.ThreadPoolExecutor(max_workers=16) as ex:
+            lat = np.array(list(ex.map(timed, symbols))) * 1000
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        print(f"   {label:14}: p50 {p50:6.0f}ms  p95 {p95:6.0f}ms  p99 {p99:6.0f}ms  max {lat.max():6.0f}ms  "
+              f"| hedge {md.stats()['hedges']}")
+
+
+def _legacy_parse(raw: bytes):
+    """Đường parse cũ của dchart_history (json -> list -> DataFrame -> rename/dropna/sort/set_index)."""
+    import json
+    import pandas as pd
+    js = json.loads(raw)
+    df = pd.DataFrame({k: js.get(k, []) for k in ("t", "o", "h", "l", "c", "v")})
+    df["date"] = pd.to_datetime(df["t"], unit="s").dt.tz_localize(None)
+    df = df.rename(columns={"o": "O", "h": "H", "l": "L", "c": "C", "v": "V"})
+    df = df[["date", "O", "H", "L", "C", "V"]].dropna().sort_values("date").reset_index(drop=True)
+    return df.set_index("date")
+
+
+def bench_parse(args):
+    """Thời gian parse 1 response DChart: đường cũ vs parse_dchart (Bars) vs Bars + to_frame()."""
+    import json
+    import mock_dchart
+    from bars import parse_dchart, JSON_BACKEND
+
+    now = int(time.time())
+    cases = {
+        "D 500 ngày": mock_dchart.synthetic_bars("S0001", "D", now - 700 * 86400, now),
+        "1 phút 5 ngày": mock_dchart.synthetic_bars("S0001", "1", now - 7 * 86400, now),
+    }
+    print(f"\n📊 Parse response DChart ({args.repeat} lần / cách, JSON: {JSON_BACKEND})")
+    for label, payload in cases.items():
+        raw = json.dumps(payload).encode()
+        assert (_legacy_parse(raw).to_numpy() == parse_dchart(raw).to_frame().to_numpy()).all()
+        timings = {}
+        for name, fn in (("cũ (DataFrame)", _legacy_parse), ("Bars", parse_dchart),
+                         ("Bars+to_frame", lambda r: parse_dchart(r).to_frame())):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                fn(raw)
+            timings[name] = (time.perf_counter() - t0) / args.repeat * 1e6
+        base = timings["cũ (DataFrame)"]
+        print(f"   {label} ({len(payload['t'])} nến, {len(raw) / 1024:.0f} KB):")
+        for name, us in timings.items():
+            print(f"      {name:15}: {us:8.1f} µs/response  (x{base / us:.1f})")
+
+
+def bench_bars(args):
+    """Phần CPU/bộ nhớ của scan 5.000 mã (không tính mạng): bundle giữ DataFrame vs Bars."""
+    import json, tracemalloc
+    import mock_dchart
+    from bars import Bars, parse_dchart
+    import scanner_core as core
+
+    now = int(time.time())
+    symbols = [s["code"] for s in mock_dchart.synthetic_symbols(args.symbols)]
+    frames = [parse_dchart(json.dumps(mock_dchart.synthetic_bars(s, "D", now - 130 * 86400, now)).encode()).to_frame()
+              for s in symbols]
+    filters = [core.apply_filters, core.apply_filters_sin, core.apply_filters_sin2, core.apply_filters_sin3]
+
+    def held(make):
+        for f in frames:  # bỏ qua cache nội bộ của pandas tạo ở lần gọi đầu
+            make(f)
+        tracemalloc.start()
+        kept = [make(f) for f in frames]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size
+
+    def scan(make):
+        t0 = time.perf_counter()
+        out = []
+        for f in frames:
+            daily = make(f)
+            out.append(tuple(v for fn in filters for v in fn(daily).values()))
+        return time.perf_counter() - t0, out
+
+    as_frame = lambda f: f.copy()  # dchart_history cũ trả về 1 DataFrame mới mỗi lần
+    mem_df, mem_bars = held(as_frame), held(Bars.from_frame)
+    t_df, sig_df = scan(as_frame)
+    t_bars, sig_bars = scan(Bars.from_frame)
+    t0 = time.perf_counter()
+    for f in frames:
+        Bars.from_frame(f)
+    t_conv = time.perf_counter() - t0
+    print(f"\n📊 {len(frames)} mã x {len(frames[0])} nến ngày, 4 bộ lọc")
+    print(f"   bộ nhớ giữ bundle: DataFrame {mem_df / 2**20:6.1f} MB | Bars {mem_bars / 2**20:6.1f} MB "
+          f"(x{mem_df / mem_bars:.1f})")
+    print(f"   thời gian lọc   : DataFrame {t_df:6.1f}s    | Bars {t_bars:6.1f}s    (x{t_df / t_bars:.2f})")
+    print(f"   DataFrame -> Bars: {t_conv * 1000 / len(frames):.2f} ms / mã ({t_conv / t_bars:.1%} thời gian lọc)")
+    print(f"   tín hiệu giống nhau: {sig_df == sig_bars}")
+
+
+def bench_snapshot(args):
+    """Đối chiếu snapshot chỉ báo + nến đang chạy với cách tính đầy đủ trên nhiều phiên."""
+    import json
+    import mock_dchart
+    from bars import Bars, parse_dchart
+    from bar_cache import bar_days
+    import indicator_snapshot as snap_mod
+    import scanner_core as core
+    from trading_calendar import CALENDAR
+
+    now = int(time.time())
+    symbols = [s["code"] for s in mock_dchart.synthetic_symbols(args.symbols)]
+    frames = {s: parse_dchart(json.dumps(mock_dchart.synthetic_bars(s, "D", now - 300 * 86400, now)).encode())
+              .to_frame() for s in symbols}
+    sessions = sorted(set(bar_days(frames[symbols[0]])))[-args.sessions:]
+    filters = {"mua1": core.apply_filters, "sin": core.apply_filters_sin,
+               "sin2": core.apply_filters_sin2, "sin3": core.apply_filters_sin3}
+    mismatches, positives, t_full, t_snap, t_build = 0, 0, 0.0, 0.0, 0.0
+    for session in sessions:
+        # cửa sổ như lookback_window() trong phiên đó: snapshot theo bộ lọc cần nhiều phiên nhất,
+        # lọc đầy đủ theo số phiên của từng bộ lọc (MUA 1 ngắn hơn mà phải ra cùng kết quả)
+        lookback = CALENDAR.window_days(core.DAILY_LOOKBACK_SESSIONS, session)
+        starts = {name: snap_mod.window_start(session, CALENDAR.window_days(
+            core.FILTER_SESSIONS[name] + core.LOOKBACK_MARGIN_SESSIONS, session)) for name in filters}
+        closed, live, full = {}, {}, {name: {} for name in filters}
+        for s, f in frames.items():
+            d = bar_days(f)
+            closed[s] = f[d < session]
+            today = f[d == session]
+            live[s] = {c: today[c].iloc[0] for c in ("O", "H", "L", "C", "V")} if len(today) else None
+            for name, start in starts.items():
+                full[name][s] = Bars.from_frame(f[(d >= start) & (d <= session)])
+        t0 = time.perf_counter()
+        snap = snap_mod.build_snapshot(closed, session, session - dt.timedelta(days=1), lookback)
+        t_build += time.perf_counter() - t0
+        for name, fn in filters.items():
+            min_bars = core.FILTER_MIN_BARS[name]
+            t0 = time.perf_counter()
+            expected = {s: fn(b) for s, b in full[name].items() if len(b) >= min_bars}
+            t_full += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            rows, _ = snap.evaluate(name, symbols, live, min_bars)
+            t_snap += time.perf_counter() - t0
+            got = {r["symbol"]: {k: r[k] for k in expected[r["symbol"]]} for r in rows}
+            for s, sig in expected.items():
+                if name != "mua1" and not any(sig.values()):
+                    mismatches += s in got
+                    continue
+                positives += sum(sig.values())
+                mismatches += got.get(s) != sig
+    n = len(sessions)
+    print(f"\n📊 {len(symbols)} mã x {n} phiên, 4 bộ lọc")
+    print(f"   dựng snapshot (job cuối ngày): {t_build / n * 1000:8.1f} ms / phiên")
+    print(f"   lọc đầy đủ                   : {t_full / n * 1000:8.1f} ms / phiên")
+    print(f"   snapshot + nến đang chạy     : {t_snap / n * 1000:8.1f} ms / phiên (x{t_full / t_snap:.0f})")
+    print(f"   tín hiệu dương: {positives} | khác biệt: {mismatches}")
+
+
+IMPORT_PROBE = ("import sys, time, threading; t = time.perf_counter(); import {mod}; "
+                "print(time.perf_counter() - t, threading.active_count(), "
+                "int(any(m in sys.modules for m in ('telegram', 'streamlit', 'plotly', 'dotenv'))))")
+
+
+def bench_imports(args):
+    """Thời gian import (process mới, không cache module) của lõi quét so với bot; vượt ngân sách -> exit 1."""
+    import subprocess, statistics
+    results = {}
+    for mod in args.modules.split(","):
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, "-c", IMPORT_PROBE.format(mod=mod)], capture_output=True,
+                                 text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            if out.returncode != 0:
+                print(f"   {mod:14s}: lỗi import ({out.stderr.strip().splitlines()[-1]})")
+                break
+            seconds, threads, heavy = out.stdout.split()
+            runs.append((float(seconds), int(threads), heavy == "1"))
+        if runs:
+            ms = statistics.median(r[0] for r in runs) * 1000
+            results[mod] = ms
+            print(f"   {mod:14s}: {ms:7.0f} ms (median {len(runs)} lần) | thread khi import: {runs[0][1]} | "
+                  f"kéo theo telegram/streamlit/plotly/dotenv: {'có' if runs[0][2] else 'không'}")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import scanner_core"], capture_output=True,
+                         text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in out.stderr.splitlines()[1:]:
+        parts = line.split("|")
+        if len(parts) == 3 and parts[0].strip().startswith("import time:"):
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    print("   module nặng nhất (cumulative µs):")
+    for us, name in sorted(rows, reverse=True)[1:8]:
+        print(f"     {us:9d} {name}")
+    core_ms = results.get("scanner_core")
+    if core_ms is not None and core_ms > args.budget_ms:
+        print(f"❌ scanner_core import {core_ms:.0f} ms > ngân sách {args.budget_ms:.0f} ms")
+        return 1
+    print(f"✅ scanner_core trong ngân sách {args.budget_ms:.0f} ms")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark scanner với mock API")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("shard", help="thread vs shard đa process")
+    p.add_argument("--symbols", type=int, default=5000)
+    p.add_argument("--filter", default="mua1", choices=["mua1", "sin", "sin2", "sin3"])
+    p.add_argument("--processes", type=int, default=0)
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.set_defaults(func=bench_shard)
+    h = sub.add_parser("hedge", help="tail latency có/không hedged request")
+    h.add_argument("--symbols", type=int, default=300)
+    h.add_argument("--tail-rate", type=float, default=0.05)
+    h.add_argument("--tail-ms", type=float, default=3000)
+    h.add_argument("--hedge-ms", type=float, default=300)
+    h.set_defaults(func=bench_hedge)
+    pa = sub.add_parser("parse", help="microbenchmark parse JSON DChart")
+    pa.add_argument("--repeat", type=int, default=2000)
+    pa.set_defaults(func=bench_parse)
+    b = sub.add_parser("bars", help="bộ nhớ/thời gian bundle DataFrame vs Bars")
+    b.add_argument("--symbols", type=int, default=5000)
+    b.set_defaults(func=bench_bars)
+    sn = sub.add_parser("snapshot", help="snapshot chỉ báo cuối ngày vs lọc đầy đủ")
+    sn.add_argument("--symbols", type=int, default=2000)
+    sn.add_argument("--sessions", type=int, default=20)
+    sn.set_defaults(func=bench_snapshot)
+    im = sub.add_parser("imports", help="thời gian import lõi quét (ngân sách)")
+    im.add_argument("--modules", default="scanner_core,app")
+    im.add_argument("--repeat", type=int, default=5)
+    im.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 800)))
+    im.set_defaults(func=bench_imports)
+    args = ap.parse_args(argv)
+
+    if args.func in (bench_parse, bench_bars, bench_snapshot, bench_imports):
+        return args.func(args)
+    mock = start_mock(getattr(args, "symbols", 5000), getattr(args, "latency_ms", 0.0),
+                      getattr(args, "tail_rate", 0.0), getattr(args, "tail_ms", 0.0))
+    try:
+        args.func(args)
+    finally:
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Bot API Telegram giả lập để chạy thử bot không cần mạng/token thật
+- Trả lời các method bot dùng (getMe, sendMessage, editMessageText, setWebhook, getUpdates, ...)
+  và ghi lại mọi tin bot gửi đi
+- Đẩy update giả (tin nhắn, nút bấm, inline query): có webhook thì POST thẳng vào webhook (kèm secret token),
+  không có thì xếp hàng cho getUpdates (long polling)
+- --flood: trả 429 (retry_after) như Telegram khi vượt ~30 tin/s toàn bot hoặc quá nhiều tin/chat
+- bench: gửi N lệnh từ N chat, đo thời gian từ lúc gửi tới tin trả lời đầu tiên
+
+Run:
+  python fake_telegram.py serve                       # http://127.0.0.1:8790
+  python fake_telegram.py serve --flood               # giới hạn tốc độ như Telegram (send_queue.py bench)
+  TELEGRAM_API_URL=http://127.0.0.1:8790 TELEGRAM_BOT_TOKEN=123:fake python app.py
+  python fake_telegram.py push "/start" --chat 42
+  python fake_telegram.py push VCB --inline
+  python fake_telegram.py bench --updates 200 --text /start
+"""
+from __future__ import annotations
+import os, sys, json, time, asyncio, argparse, itertools
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import requests
+
+from async_http import HttpServer, Request, json_response
+
+FAKE_TG_HOST = os.getenv("FAKE_TG_HOST", "127.0.0.1")
+FAKE_TG_PORT = int(os.getenv("FAKE_TG_PORT", 8790))
+FLOOD_GLOBAL_PER_SEC = 30  # giới hạn gửi của Bot API (xấp xỉ)
+FLOOD_CHAT_PER_SEC = 4     # chat riêng: vài tin liền được, dày hơn thì bị 429
+FLOOD_RETRY_AFTER = 2
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "Fake Scanner", "username": "fake_scanner_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": True}
+
+
+def _params(req: Request) -> dict:
+    """Tham số method: JSON body, form (PTB gửi urlencoded, giá trị phức tạp là chuỗi JSON) hoặc query."""
+    ctype = req.headers.get("content-type", "")
+    if "json" in ctype:
+        data = req.json() or {}
+    else:
+        data = dict(parse_qsl(req.body.decode())) if req.body else {}
+        for k, v in list(data.items()):
+            try:
+                data[k] = json.loads(v)
+            except ValueError:
+                pass
+    return {**req.query, **data}
+
+
+class FakeTelegram:
+    def __init__(self, server: HttpServer, flood: bool = False):
+        self.server = server
+        self.flood = flood
+        self._recent: deque = deque()                 # thời điểm các tin gửi trong 1 giây gần nhất
+        self._recent_chat: Dict[int, deque] = {}
+        self.blocked: Dict[int, float] = {}          # chat -> bị 429 tới lúc
+        self.webhook: Optional[dict] = None
+        self.updates: List[dict] = []            # hàng đợi cho getUpdates
+        self._new_update = asyncio.Event()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.sent: List[dict] = []               # tin bot gửi/sửa: {"method", "chat_id", "text", "ts", ...}
+        self.calls: Dict[str, int] = {}
+        server.route("POST", "/bot{token}/{method}")(self.method)
+        server.route("GET", "/bot{token}/{method}")(self.method)
+        server.route("POST", "/_push")(self.push)
+        server.route("GET", "/_sent")(self.get_sent)
+        server.route("POST", "/_reset")(self.reset)
+
+    # ---- Bot API ----
+
+    def _message(self, chat_id, text: str = "", **extra) -> dict:
+        return {"message_id": next(self.message_ids), "date": int(time.time()), "from": BOT_USER,
+                "chat": {"id": int(chat_id), "type": "private"}, "text": text, **extra}
+
+    async def method(self, req: Request):
+        name = req.params["method"]
+        p = _params(req)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        lname = name.lower()
+        if lname == "getme":
+            result = BOT_USER
+        elif lname == "setwebhook":
+            self.webhook = {"url": p.get("url", ""), "secret": p.get("secret_token") or ""}
+            if p.get("drop_pending_updates"):
+                self.updates.clear()
+            result = True
+        elif lname == "deletewebhook":
+            self.webhook = None
+            result = True
+        elif lname == "getwebhookinfo":
+            result = {"url": (self.webhook or {}).get("url", ""), "has_custom_certificate": False,
+                      "pending_update_count": len(self.updates)}
+        elif lname == "getupdates":
+            result = await self._get_updates(int(p.get("offset") or 0), float(p.get("timeout") or 0),
+                                             int(p.get("limit") or 100))
+        elif lname in ("sendmessage", "editmessagetext", "sendphoto", "senddocument"):
+            if self.flood and (wait := self._flood_wait(int(p.get("chat_id") or 0))):
+                self.calls["429"] = self.calls.get("429", 0) + 1
+                return json_response({"ok": False, "error_code": 429, "parameters": {"retry_after": wait},
+                                      "description": f"Too Many Requests: retry after {wait}"}, 429)
+            text = p.get("text") or p.get("caption") or ""
+            chat_id = p.get("chat_id") or 0
+            self.sent.append({"method": name, "chat_id": int(chat_id), "text": text, "ts": time.time(),
+                              "reply_markup": p.get("reply_markup"), "message_id": p.get("message_id")})
+            result = self._message(chat_id, text) if chat_id else True
+        else:  # answerCallbackQuery, answerInlineQuery, setMyCommands, sendChatAction, deleteMessage...
+            if lname.startswith("answer"):
+                self.sent.append({"method": name, "ts": time.time(), **{k: v for k, v in p.items()}})
+            result = True
+        return json_response({"ok": True, "result": result})
+
+    def _flood_wait(self, chat_id: int) -> int:
+        """Số giây phải chờ nếu tin này vượt giới hạn (0 = được gửi)."""
+        now = time.time()
+        if self.blocked.get(chat_id, 0) > now:
+            return max(1, round(self.blocked[chat_id] - now))
+        recent_chat = self._recent_chat.setdefault(chat_id, deque())
+        for q in (self._recent, recent_chat):
+            while q and q[0] < now - 1:
+                q.popleft()
+        if len(self._recent) >= FLOOD_GLOBAL_PER_SEC or len(recent_chat) >= FLOOD_CHAT_PER_SEC:
+            self.blocked[chat_id] = now + FLOOD_RETRY_AFTER
+            return FLOOD_RETRY_AFTER
+        self._recent.append(now)
+        recent_chat.append(now)
+        return 0
+
+    async def _get_updates(self, offset: int, timeout: float, limit: int) -> List[dict]:
+        if offset:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    # ---- điều khiển ----
+
+    def make_update(self, chat_id: int, text: str = "", callback_data: Optional[str] = None,
+                    inline_query: Optional[str] = None) -> dict:
+        user = {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+        chat = {"id": chat_id, "type": "private"}
+        uid = next(self.update_ids)
+        if inline_query is not None:
+            return {"update_id": uid, "inline_query": {"id": str(uid), "from": user, "query": inline_query,
+                                                       "offset": ""}}
+        if callback_data is not None:
+            msg = {"message_id": next(self.message_ids), "date": int(time.time()), "chat": chat,
+                   "from": BOT_USER, "text": "..."}
+            return {"update_id": uid, "callback_query": {"id": str(uid), "from": user, "chat_instance": str(chat_id),
+                                                         "data": callback_data, "message": msg}}
+        msg = {"message_id": next(self.message_ids), "date": int(time.time()), "chat": chat, "from": user,
+               "text": text}
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": uid, "message": msg}
+
+    async def deliver(self, update: dict) -> int:
+        """Webhook: POST vào bot (trả mã HTTP); không có webhook: xếp hàng cho getUpdates (trả 0)."""
+        if self.webhook:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook["secret"]} if self.webhook["secret"] else {}
+            r = await asyncio.to_thread(requests.post, self.webhook["url"], json=update, headers=headers, timeout=10)
+            return r.status_code
+        self.updates.append(update)
+        self._new_update.set()
+        return 0
+
+    async def push(self, req: Request):
+        p = req.json() or {}
+        updates = [self.make_update(int(u.get("chat_id", 1)), u.get("text", ""), u.get("callback_data"),
+                                    u.get("inline_query")) for u in (p.get("updates") or [p])]
+        codes = await asyncio.gather(*(self.deliver(u) for u in updates))
+        return json_response({"pushed": len(updates), "status": codes, "ts": time.time()})
+
+    async def get_sent(self, req: Request):
+        since = float(req.query.get("since", 0))
+        chat = req.query.get("chat_id")
+        rows = [m for m in self.sent if m["ts"] >= since and (chat is None or str(m.get("chat_id")) == chat)]
+        return json_response({"sent": rows, "calls": self.calls, "webhook": self.webhook})
+
+    async def reset(self, req: Request):
+        self.sent.clear()
+        self.calls.clear()
+        return json_response({"ok": True})
+
+
+async def serve(host: str, port: int, flood: bool = False):
+    server = HttpServer(host, port, max_body=50 << 20)
+    FakeTelegram(server, flood)
+    await server.start()
+    print(f"🤖 Fake Telegram Bot API tại http://{server.host}:{server.port} (TELEGRAM_API_URL)"
+          f"{' + giới hạn tốc độ' if flood else ''}")
+    await server.serve(grace=1)
+
+
+def bench(url: str, n: int, text: str, timeout: float) -> dict:
+    """N chat cùng gửi `text`, đo độ trễ tới tin trả lời đầu tiên của từng chat."""
+    requests.post(f"{url}/_reset", timeout=5)
+    chats = list(range(1, n + 1))
+    t0 = time.time()
+    requests.post(f"{url}/_push", json={"updates": [{"chat_id": c, "text": text} for c in chats]}, timeout=60)
+    first: Dict[int, float] = {}
+    while len(first) < n and time.time() - t0 < timeout:
+        for m in requests.get(f"{url}/_sent", params={"since": t0}, timeout=5).json()["sent"]:
+            if m.get("chat_id") in chats and m["chat_id"] not in first:
+                first[m["chat_id"]] = m["ts"] - t0
+        time.sleep(0.05)
+    lat = sorted(first.values())
+    pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1) if lat else None
+    return {"updates": n, "answered": len(lat), "p50_ms": pick(0.5), "p95_ms": pick(0.95),
+            "max_ms": pick(1.0)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bot API Telegram giả lập")
+    ap.add_argument("--url", default=f"http://{FAKE_TG_HOST}:{FAKE_TG_PORT}", help="URL fake (push/bench)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("--host", default=FAKE_TG_HOST)
+    s.add_argument("--port", type=int, default=FAKE_TG_PORT)
+    s.add_argument("--flood", action="store_true", help="Trả 429 khi gửi quá nhanh")
+    p = sub.add_parser("push", help="Gửi 1 tin nhắn/nút bấm giả tới bot")
+    p.add_argument("text", nargs="?", default="/start")
+    p.add_argument("--chat", type=int, default=1)
+    p.add_argument("--callback", default=None, help="callback_data thay vì tin nhắn")
+    p.add_argument("--inline", action="store_true", help="Gửi text dưới dạng inline query")
+    b = sub.add_parser("bench", help="Độ trễ từ update tới tin trả lời đầu tiên")
+    b.add_argument("--updates", type=int, default=100)
+    b.add_argument("--text", default="/start")
+    b.add_argument("--timeout", type=float, default=60)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        asyncio.run(serve(args.host, args.port, args.flood))
+    elif args.cmd == "push":
+        body = {"chat_id": args.chat, "text": args.text, "callback_data": args.callback,
+                "inline_query": args.text if args.inline else None}
+        print(requests.post(f"{args.url}/_push", json=body, timeout=30).json())
+    else:
+        print(bench(args.url, args.updates, args.text, args.timeout))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
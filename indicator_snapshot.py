@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Snapshot chỉ báo cuối ngày cho các bộ lọc MUA 1 / MUA SỊN
+- Job cuối ngày lưu cho từng mã: TAIL nến đã chốt cuối cùng (đủ cho MA/MAV/HHV/LLV/RSI)
+  và EMA34/EMA89 tại nến đã chốt cuối (phần "mồi" của EMA)
+- Snapshot dựng cho phiên kế tiếp, trên đúng cửa sổ nến mà daily_history() sẽ dùng trong
+  phiên đó, nên kết quả trùng với cách tính đầy đủ
+- Phiên sau chỉ gộp nến đang chạy: EMA cập nhật 1 bước, các cửa sổ trượt tính trên
+  TAIL + 1 cột, cả thị trường trong 1 lượt numpy
+- Phiên kế tiếp và cửa sổ nến (số phiên -> ngày lịch) lấy theo lịch giao dịch (trading_calendar.py)
+- Snapshot không khớp phiên (nghỉ lễ ngoài lịch, job chưa chạy) -> scan quay về cách tính đầy đủ
+
+Run:
+  python indicator_snapshot.py build     # sau giờ đóng cửa (cron), hoặc PANEL_WRITER=1 cho bot
+  python indicator_snapshot.py info
+"""
+from __future__ import annotations
+import os, sys, json, time, argparse, warnings, datetime as dt
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bar_cache import bar_days, final_day, vn_now
+from trading_calendar import CALENDAR
+
+SNAPSHOT_FILE = os.getenv("INDICATOR_SNAPSHOT", ".cache/indicator_snapshot.npz")
+TAIL = 60                # nến đã chốt giữ lại / mã (cửa sổ dài nhất: MA50, MAV50)
+EMA_SPANS = (34, 89)
+FIELDS = ("O", "H", "L", "C", "V")
+
+
+def window_start(session: dt.date, lookback_days: int) -> dt.date:
+    """Ngày đầu cửa sổ daily_history(lookback_days) trong giờ giao dịch của `session`:
+    since = now - lookback_days (sau 00:00 UTC) -> giữ nến từ ngày session - (lookback_days - 1)."""
+    return session - dt.timedelta(days=lookback_days - 1)
+
+
+def _ema_step(prev: np.ndarray, x: np.ndarray, span: int) -> np.ndarray:
+    """1 bước của ewm(span, adjust=False) đúng như cách pandas tính."""
+    alpha = 2.0 / (span + 1)
+    old = 1.0 - alpha
+    return (old * prev + alpha * x) / (old + alpha)
+
+
+class Snapshot:
+    """Trạng thái chỉ báo cuối ngày của cả thị trường (mảng [số mã x TAIL], canh phải)."""
+
+    def __init__(self, symbols: Sequence[str], session: dt.date, through: dt.date, lookback_days: int,
+                 count: np.ndarray, tails: Dict[str, np.ndarray], ema: Dict[int, np.ndarray],
+                 built: Optional[float] = None):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.session, self.through, self.lookback_days = session, through, lookback_days
+        self.count = count        # số nến đã chốt trong cửa sổ
+        self.tails = tails        # O/H/L/C/V float64, ô trống bên trái = NaN
+        self.ema = ema            # span -> EMA tại nến đã chốt cuối
+        self.built = built or time.time()
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def save(self, path: str = SNAPSHOT_FILE):
+        meta = {"session": self.session.isoformat(), "through": self.through.isoformat(),
+                "lookback_days": self.lookback_days, "built": self.built}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:  # np.savez tự thêm .npz nếu truyền tên file
+            np.savez(f, symbols=np.array(self.symbols, dtype=str), count=self.count,
+                     meta=np.array(json.dumps(meta)),
+                     **self.tails, **{f"ema{n}": a for n, a in self.ema.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_FILE) -> "Snapshot":
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            return cls([str(s) for s in z["symbols"]], dt.date.fromisoformat(meta["session"]),
+                       dt.date.fromisoformat(meta["through"]), meta["lookback_days"], z["count"],
+                       {f: z[f] for f in FIELDS}, {n: z[f"ema{n}"] for n in EMA_SPANS}, meta["built"])
+
+    def usable(self, now: dt.datetime, lookback_days: int) -> bool:
+        """Đúng phiên, đúng cửa sổ và phiên chưa chốt (sau 07:00 giờ VN ngày UTC mới trùng ngày VN)."""
+        return (self.session == now.date() and self.lookback_days == lookback_days
+                and now.astimezone(dt.timezone.utc).date() == now.date() and final_day(now) < now.date())
+
+    def info(self) -> dict:
+        return {"symbols": len(self), "session": self.session.isoformat(), "through": self.through.isoformat(),
+                "lookback_days": self.lookback_days, "age_seconds": round(time.time() - self.built)}
+
+    # ---- Gộp nến đang chạy ----
+    def _matrix(self, rows: np.ndarray, live: List[Optional[dict]]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """Ma trận [mã x TAIL+1]: TAIL nến đã chốt + nến đang chạy ở cột cuối; mã chưa có nến
+        đang chạy thì dịch phải 1 cột (cột cuối là nến đã chốt cuối như daily_history)."""
+        has_live = np.array([b is not None for b in live], dtype=bool)
+        X = {}
+        for f in FIELDS:
+            m = np.full((len(rows), TAIL + 1), np.nan)
+            m[has_live, :-1] = self.tails[f][rows[has_live]]
+            m[~has_live, 1:] = self.tails[f][rows[~has_live]]
+            if has_live.any():
+                m[has_live, -1] = [float(b[f]) if f != "V" else float(int(b[f])) for b in live if b is not None]
+            X[f] = m
+        return X, has_live
+
+    def signals(self, name: str, symbols: Sequence[str], live: Dict[str, Optional[dict]],
+                min_bars: int) -> Tuple[List[str], Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        """Tín hiệu bộ lọc `name` cho các mã (đều có trong snapshot) đủ `min_bars` nến:
+        (các mã đó, key tín hiệu -> mảng bool, giá hiện tại, giá phiên trước)."""
+        rows = np.array([self.index[s] for s in symbols], dtype=np.int64)
+        X, has_live = self._matrix(rows, [live.get(s) for s in symbols])
+        n = self.count[rows] + has_live
+        ok = n >= min_bars  # như fetch_symbol_bundle*: thiếu nến -> bỏ qua mã
+        ema = {}
+        for span in EMA_SPANS:  # chỉ gộp thêm nến đang chạy vào EMA của nến đã chốt cuối
+            prev = self.ema[span][rows]
+            ema[span] = np.where(has_live, _ema_step(prev, X["C"][:, -1], span), prev)[ok]
+        X = {f: a[ok] for f, a in X.items()}
+        return ([s for s, k in zip(symbols, ok) if k], FAST_FILTERS[name](X, ema),
+                X["C"][:, -1], X["C"][:, -2])
+
+    def evaluate(self, name: str, symbols: Sequence[str], live: Dict[str, Optional[dict]],
+                 min_bars: int) -> Tuple[List[dict], List[str]]:
+        """Chạy bộ lọc `name` cho các mã có trong snapshot.
+
+        Trả về (rows cùng dạng với scan_symbols*, các mã không có trong snapshot)."""
+        covered = [s for s in symbols if s in self.index]
+        missing = [s for s in symbols if s not in self.index]
+        if not covered:
+            return [], missing
+        covered, signals, price, prev = self.signals(name, covered, live, min_bars)
+        keep_all = name == "mua1"
+        out = []
+        for j, sym in enumerate(covered):
+            sig = {k: bool(v[j]) for k, v in signals.items()}
+            if not keep_all and not any(sig.values()):
+                continue
+            if prev[j] > 0:
+                pct = (price[j] / prev[j] - 1.0) * 100.0
+            else:
+                pct = 0.0 if keep_all else None
+            out.append({"symbol": sym, "price": float(price[j]),
+                        "pct": float(pct) if pct is not None else None, **sig})
+        return out, missing
+
+
+# =====================
+# Bộ lọc dạng vector (1 dòng / mã, cột cuối = phiên hiện tại) - cùng logic với apply_filters*
+# trong app.py; sửa điều kiện ở đó thì sửa cả ở đây (bench_scan.py snapshot để đối chiếu)
+# =====================
+
+def _at(a: np.ndarray, k: int = 0) -> np.ndarray:
+    """Giá trị k phiên trước phiên hiện tại (= series.shift(k).iloc[-1])."""
+    return a[:, a.shape[1] - 1 - k]
+
+
+def _win(a: np.ndarray, n: int, end: int = 0) -> np.ndarray:
+    """Cửa sổ n phiên kết thúc ở `end` phiên trước phiên hiện tại."""
+    w = a.shape[1]
+    return a[:, w - n - end:w - end]
+
+
+def _mean(a, n, end=0):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(_win(a, n, end), axis=1)
+
+
+def _max(a, n):
+    return np.nanmax(_win(a, n), axis=1)
+
+
+def _min(a, n):
+    return np.nanmin(_win(a, n), axis=1)
+
+
+def _rsi(c: np.ndarray, n: int = 14) -> np.ndarray:
+    delta = np.diff(_win(c, n + 1), axis=1)
+    ru = np.where(delta > 0, delta, 0.0).mean(axis=1)
+    rd = np.where(delta < 0, -delta, 0.0).mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100 - (100 / (1 + ru / np.where(rd == 0, np.nan, rd)))
+    return np.nan_to_num(out, nan=0.0)
+
+
+def fast_mua1(X: Dict[str, np.ndarray], ema: Dict[int, np.ndarray]) -> Dict[str, np.ndarray]:
+    C, H, L, O, V = (X[f] for f in ("C", "H", "L", "O", "V"))
+    c0, c1, c2, c3, c4 = (_at(C, k) for k in range(5))
+    v0 = _at(V)
+    MA30, RSI14 = _mean(C, 30), _rsi(C, 14)
+    MAV15, MAV50 = _mean(V, 15), _mean(V, 50)
+    LLV10 = _min(C, 10)
+    base = (c0 >= c1) & (c0 >= c2) & (c0 >= c3) & (c0 >= c4) & (c0 > MA30) & (c1 < 1.04 * c2)
+    breakout = (_max(C, 5) >= _max(C, 15)) & (c0 > 1.01 * c1)
+    liquid = ((c0 * v0) >= 1_000_000) & (c0 >= 5)
+    down4 = (c0 < c1) & (c1 < c2) & (c2 < c3) & (c3 < c4)
+    l5, l10 = _min(L, 5), _min(L, 10)
+    return {
+        "BuyBreak": base & breakout,
+        "BuyNormal": base & ~breakout,
+        "Sell": c0 <= _min(C, 8),
+        "Short": (down4 | (c0 <= 0.95 * _max(H, 20))) & liquid,
+        "Cover": ((c0 > 1.02 * _at(H, 1)) & (c0 >= _at(H, 2)) &
+                  ((v0 >= 1.3 * MAV15) | (v0 >= 1.3 * MAV50)) &
+                  (c0 > _at(O)) & (c0 > MA30) & liquid & (c0 < 1.15 * LLV10)),
+        "Sideway": (((_max(H, 5) - l5) / l5 <= 0.10) & ((_max(H, 10) - l10) / l10 <= 0.15) &
+                    (c0 >= 5) & (c0 <= 200) & ((c0 * v0) >= 1_000_000) & (MAV15 > 50_000) &
+                    (c0 > MA30) & (RSI14 >= 53) & (RSI14 <= 60) & (c0 >= 1.01 * c1)),
+    }
+
+
+def fast_sin(X, ema):
+    C, H, O, V = X["C"], X["H"], X["O"], X["V"]
+    c0, c1, c2 = _at(C), _at(C, 1), _at(C, 2)
+    pct_prev = (c1 / c2 - 1) * 100
+    return {"BuySin": ((_at(H) >= _at(H, 4) * 0.99) & (c0 > c1) & (c1 < _at(O, 1)) &
+                       (pct_prev >= -2) & (pct_prev < 0) & (_at(V, 1) < _mean(V, 20, end=1)) &
+                       (c0 > ema[34]))}
+
+
+def _above_trend(C, ema):
+    c0 = _at(C)
+    return (c0 > ema[34]) & (c0 > ema[89]) & (c0 > _mean(C, 50))
+
+
+def fast_sin2(X, ema):
+    C = X["C"]
+    c0, c1, c2 = _at(C), _at(C, 1), _at(C, 2)
+    pct, pct_prev = (c0 / c1 - 1) * 100, (c1 / c2 - 1) * 100
+    return {"BuySin2": ((c0 >= _at(C, 4)) & (c0 > c1) & (pct > 0) & (pct <= 3) &
+                        (pct_prev >= -3) & (pct_prev < 0) & _above_trend(C, ema))}
+
+
+def fast_sin3(X, ema):
+    C, L = X["C"], X["L"]
+    c0, c1, c2 = _at(C), _at(C, 1), _at(C, 2)
+    pct, pct_prev = (c0 / c1 - 1) * 100, (c1 / c2 - 1) * 100
+    return {"BuySin3": ((pct > 0) & (pct <= 3) & (_at(L) >= _min(L, 4)) &
+                        (pct_prev >= -3) & (pct_prev <= 3) & _above_trend(C, ema))}
+
+
+FAST_FILTERS: Dict[str, Callable] = {"mua1": fast_mua1, "sin": fast_sin, "sin2": fast_sin2, "sin3": fast_sin3}
+
+
+# =====================
+# Dựng snapshot (job cuối ngày)
+# =====================
+
+def build_snapshot(frames: Dict[str, pd.DataFrame], session: dt.date, through: dt.date,
+                   lookback_days: int) -> Snapshot:
+    """Snapshot cho `session` từ nến đã chốt (tới hết `through`) của từng mã."""
+    symbols = list(frames)
+    start = window_start(session, lookback_days)
+    count = np.zeros(len(symbols), dtype=np.int64)
+    tails = {f: np.full((len(symbols), TAIL), np.nan) for f in FIELDS}
+    ema = {n: np.full(len(symbols), np.nan) for n in EMA_SPANS}
+    for i, sym in enumerate(symbols):
+        frame = frames[sym]
+        if frame is None or frame.empty:
+            continue
+        days = bar_days(frame)
+        window = frame[(days >= start) & (days <= through)]
+        if window.empty:
+            continue
+        count[i] = len(window)
+        tail = window.iloc[-TAIL:]
+        for f in FIELDS:
+            tails[f][i, TAIL - len(tail):] = tail[f].to_numpy(dtype=np.float64)
+        close = window["C"].astype(np.float64)
+        for n in EMA_SPANS:  # như ema() của app.py: ewm(span, adjust=False) trên cả cửa sổ
+            ema[n][i] = close.ewm(span=n, adjust=False).mean().iloc[-1]
+    return Snapshot(symbols, session, through, lookback_days, count, tails, ema)
+
+
+def build_from_cache(bar_cache, symbols: Sequence[str], sessions: int,
+                     path: str = SNAPSHOT_FILE) -> dict:
+    """Dựng và lưu snapshot cho phiên kế tiếp từ phần nến đã chốt của BarCache; cửa sổ phủ
+    `sessions` phiên tính tới phiên đó (như daily_history() của phiên đó)."""
+    t0 = time.time()
+    now = vn_now()
+    through = final_day(now)
+    session = CALENDAR.next_session(through)
+    lookback_days = CALENDAR.window_days(sessions, session)
+    span = lookback_days + (session - now.date()).days + 1  # đủ phủ cửa sổ của phiên kế tiếp
+    frames = {}
+    for sym in symbols:
+        try:
+            frames[sym] = bar_cache.closed(sym, span)
+        except Exception as e:
+            print(f"⚠️ Bỏ qua {sym}: {e}")
+    snap = build_snapshot(frames, session, through, lookback_days)
+    snap.save(path)
+    return {**snap.info(), "seconds": round(time.time() - t0, 1), "bytes": os.path.getsize(path)}
+
+
+class SnapshotStore:
+    """Snapshot hiện có trên đĩa, tự nạp lại khi file được ghi mới (giống MarketPanel)."""
+
+    def __init__(self, path: str = SNAPSHOT_FILE):
+        self.path = path
+        self._stamp = None
+        self._snap: Optional[Snapshot] = None
+
+    def get(self) -> Optional[Snapshot]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            try:
+                self._snap = Snapshot.load(self.path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Không đọc được snapshot {self.path}: {e}")
+                self._snap = None
+            self._stamp = stamp
+        return self._snap
+
+    def usable(self, now: dt.datetime, lookback_days: int) -> Optional[Snapshot]:
+        snap = self.get()
+        return snap if snap is not None and snap.usable(now, lookback_days) else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Snapshot chỉ báo cuối ngày")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="Dựng snapshot cho phiên kế tiếp")
+    sub.add_parser("info", help="Thông tin snapshot hiện có")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "info":
+        snap = SnapshotStore().get()
+        print(snap.info() if snap is not None else {"path": SNAPSHOT_FILE, "available": False})
+        return
+    from scanner_core import BAR_CACHE, DAILY_LOOKBACK_SESSIONS, fetch_all_symbols
+    symbols = [s.code for s in fetch_all_symbols()]
+    print(f"🧮 Dựng snapshot chỉ báo {len(symbols)} mã -> {SNAPSHOT_FILE}")
+    print(f"✅ {build_from_cache(BAR_CACHE, symbols, DAILY_LOOKBACK_SESSIONS)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
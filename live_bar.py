@@ -0,0 +1,42 @@
+"""
+Nến ngày tạm tính của phiên hiện tại, dựng từ các nến 1 phút đã cache
+- synthesize_bar: O = mở cửa phút đầu, H/L = cao/thấp nhất, C = giá khớp gần nhất, V = tổng KL
+  (đọc thẳng view của bộ đệm vòng minute_store.MinuteRing, không dựng DataFrame)
+- patch_live_bar: ghi đè nến cuối của chuỗi nến ngày tại chỗ (không copy cả frame)
+"""
+from __future__ import annotations
+from typing import Optional
+
+import pandas as pd
+
+from minute_store import MinuteRing
+
+OHLCV = ("O", "H", "L", "C", "V")
+PRICE_DECIMALS = 4  # bộ đệm lưu giá float32 (~7 chữ số), làm tròn để khớp giá gốc của API
+
+
+def synthesize_bar(minutes: Optional[MinuteRing]) -> Optional[dict]:
+    """Gộp nến 1 phút của phiên hiện tại thành 1 nến ngày; None nếu chưa có giao dịch."""
+    if minutes is None or not len(minutes):
+        return None
+    return {
+        "O": round(float(minutes.view("O")[0]), PRICE_DECIMALS),
+        "H": round(float(minutes.view("H").max()), PRICE_DECIMALS),
+        "L": round(float(minutes.view("L").min()), PRICE_DECIMALS),
+        "C": round(float(minutes.view("C")[-1]), PRICE_DECIMALS),
+        "V": int(minutes.view("V").sum()),
+    }
+
+
+def append_live_slot(daily: pd.DataFrame, bar: dict, ts: pd.Timestamp) -> pd.DataFrame:
+    """Thêm 1 dòng cho phiên hiện tại (chỉ làm 1 lần mỗi ngày, các lần sau dùng patch_live_bar)."""
+    slot = pd.DataFrame([{c: bar[c] for c in OHLCV}], index=pd.DatetimeIndex([ts], name=daily.index.name))
+    if daily.empty:
+        return slot
+    return pd.concat([daily, slot.astype(daily.dtypes.to_dict())])
+
+
+def patch_live_bar(daily: pd.DataFrame, bar: dict):
+    """Cập nhật nến cuối (nến phiên hiện tại) tại chỗ bằng giá trị mới."""
+    for c in OHLCV:
+        daily.iat[-1, daily.columns.get_loc(c)] = bar[c]
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+File panel thị trường dùng chung giữa các process (bot, web app) qua np.memmap
+- Bố cục cố định: header nhỏ (JSON) + các mảng [số mã x số ngày] cho O/H/L/C (float32)
+  và V (int64); mỗi mã là 1 hàng liền nên đọc chuỗi nến của 1 mã là 1 view, không copy
+- 1 process ghi (sau giờ đóng cửa, hoặc cron), ghi ra file tạm rồi os.replace
+  nên process đang đọc vẫn dùng bản cũ tới khi tự nạp lại
+- Ô không có giao dịch (mã mới niêm yết, ngày tạm ngừng) = NaN
+
+Run:
+  python market_panel.py build --days 500     # dựng từ cache nến ngày (tải phần còn thiếu)
+  python market_panel.py info
+"""
+from __future__ import annotations
+import os, sys, json, time, struct, argparse, threading, datetime as dt
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from bars import Bars
+from bar_cache import final_day, vn_now
+
+PANEL_FILE = os.getenv("PANEL_FILE", ".cache/market_panel.bin")
+PANEL_DAYS = int(os.getenv("PANEL_DAYS", 500))  # số ngày lịch trong panel
+MAGIC = b"VNPANEL1"
+ALIGN = 4096
+PRICE_FIELDS = ("O", "H", "L", "C")
+DAY = 86400
+
+
+def _layout(n_sym: int, n_days: int, header_len: int) -> Dict[str, tuple]:
+    """Offset/dtype của từng mảng trong file (sau header, căn theo trang)."""
+    offset = -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+    out = {}
+    for f, dtype in [(f, np.float32) for f in PRICE_FIELDS] + [("V", np.int64)]:
+        out[f] = (offset, dtype)
+        offset += n_sym * n_days * np.dtype(dtype).itemsize
+    out["_end"] = (offset, None)
+    return out
+
+
+def write_panel(path: str, symbols: Sequence[str], days: np.ndarray, frames: Dict[str, pd.DataFrame],
+                through: dt.date):
+    """Ghi panel: days = ngày giao dịch (epoch-day của nến 00:00 UTC), frames = nến ngày theo mã."""
+    n_sym, n_days = len(symbols), len(days)
+    header = json.dumps({"symbols": list(symbols), "n_days": n_days,
+                         "first_day": int(days[0]) if n_days else 0,
+                         "day_steps": np.diff(days).astype(int).tolist() if n_days else [],
+                         "through": through.isoformat(), "written": time.time()}).encode()
+    layout = _layout(n_sym, n_days, len(header))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        f.truncate(layout["_end"][0])
+    pos = {int(d): i for i, d in enumerate(days)}
+    for field in (*PRICE_FIELDS, "V"):
+        offset, dtype = layout[field]
+        arr = np.memmap(tmp, dtype=dtype, mode="r+", offset=offset, shape=(n_sym, n_days))
+        arr[:] = np.nan if field != "V" else 0
+        for i, sym in enumerate(symbols):
+            frame = frames.get(sym)
+            if frame is None or frame.empty:
+                continue
+            cols = [pos.get(int(d)) for d in frame.index.values.astype("datetime64[D]").astype(np.int64)]
+            keep = np.array([c is not None for c in cols])
+            if keep.any():
+                arr[i, np.array([c for c in cols if c is not None])] = frame[field].to_numpy()[keep]
+        arr.flush()
+        del arr
+    try:
+        os.replace(tmp, path)
+    except PermissionError:  # Windows: không thay được file đang được process khác map
+        print(f"⚠️ {path} đang được mở ở process khác, bản mới nằm ở {tmp}")
+
+
+class MarketPanel:
+    """Đọc panel qua np.memmap (chỉ đọc); tự nạp lại khi file được ghi mới."""
+
+    def __init__(self, path: str = PANEL_FILE):
+        self.path = path
+        self._stamp = None
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.days = np.zeros(0, dtype=np.int64)
+        self.through: Optional[dt.date] = None
+        self.written = 0.0
+        self.arrays: Dict[str, np.memmap] = {}
+
+    def _maybe_reload(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return True
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return False
+            (n,) = struct.unpack("<I", f.read(4))
+            head = json.loads(f.read(n))
+        self.symbols = head["symbols"]
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        steps = np.asarray([0] + head["day_steps"], dtype=np.int64)[:head["n_days"]]
+        self.days = head["first_day"] + np.cumsum(steps)  # ngày giao dịch (epoch-day)
+        self.through = dt.date.fromisoformat(head["through"])
+        self.written = head["written"]
+        layout = _layout(len(self.symbols), len(self.days), n)
+        self.arrays = {f: np.memmap(self.path, dtype=layout[f][1], mode="r", offset=layout[f][0],
+                                    shape=(len(self.symbols), len(self.days)))
+                       for f in (*PRICE_FIELDS, "V")}
+        self._stamp = stamp
+        return True
+
+    @property
+    def available(self) -> bool:
+        return self._maybe_reload()
+
+    def bars(self, sym: str, since_epoch: Optional[int] = None) -> Optional[Bars]:
+        """Nến ngày đã chốt của 1 mã (view trên file nếu không có ô trống ở giữa)."""
+        if not self._maybe_reload() or sym not in self.index:
+            return None
+        i = self.index[sym]
+        t = self.days * DAY
+        start = int(np.searchsorted(t, since_epoch)) if since_epoch is not None else 0
+        c = self.arrays["C"][i, start:]
+        valid = ~np.isnan(c)
+        if not valid.any():
+            return Bars.empty_bars()
+        first = int(np.argmax(valid))
+        sl = slice(start + first, len(t))
+        cols = [self.arrays[f][i, sl] for f in (*PRICE_FIELDS, "V")]
+        t = t[sl]
+        if not valid[first:].all():  # ngày tạm ngừng giao dịch: bỏ ô trống (copy)
+            keep = valid[first:]
+            t, cols = t[keep], [a[keep] for a in cols]
+        return Bars(t, *cols)
+
+    def frame(self, sym: str, since_epoch: Optional[int] = None) -> pd.DataFrame:
+        b = self.bars(sym, since_epoch)
+        return b.to_frame() if b is not None else pd.DataFrame()
+
+    def info(self) -> dict:
+        if not self._maybe_reload():
+            return {"path": self.path, "available": False}
+        return {"path": self.path, "available": True, "symbols": len(self.symbols), "days": len(self.days),
+                "through": self.through.isoformat(), "bytes": os.path.getsize(self.path),
+                "age_seconds": round(time.time() - self.written)}
+
+
+def build_from_cache(bar_cache, symbols: Sequence[str], days: int, path: str = PANEL_FILE) -> dict:
+    """Dựng panel từ phần nến đã chốt của BarCache (chỉ tải các phần còn thiếu)."""
+    frames = {}
+    t0 = time.time()
+    for sym in symbols:
+        try:
+            frames[sym] = bar_cache.closed(sym, days)
+        except Exception as e:
+            print(f"⚠️ Bỏ qua {sym}: {e}")
+    all_days = np.unique(np.concatenate(
+        [f.index.values.astype("datetime64[D]").astype(np.int64) for f in frames.values() if not f.empty]
+        or [np.zeros(0, dtype=np.int64)]))
+    through = final_day(vn_now())
+    write_panel(path, list(symbols), all_days, frames, through)
+    return {"symbols": len(symbols), "days": len(all_days), "seconds": round(time.time() - t0, 1),
+            "bytes": os.path.getsize(path)}
+
+
+class PanelWriter(threading.Thread):
+    """Thread nền của process ghi: dựng lại panel 1 lần mỗi khi có phiên mới được chốt."""
+
+    def __init__(self, bar_cache, symbols: Callable[[], List[str]], panel: MarketPanel,
+                 days: int = PANEL_DAYS, check_every: float = 300,
+                 after_build: Optional[Callable[[], dict]] = None):
+        super().__init__(name="panel-writer", daemon=True)
+        self.bar_cache, self.symbols, self.panel = bar_cache, symbols, panel
+        self.days, self.check_every = days, check_every
+        self.after_build = after_build  # job cuối ngày chạy sau panel (snapshot chỉ báo)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            target = final_day(vn_now())
+            if not self.panel.available or self.panel.through < target:
+                try:
+                    print(f"🧱 Panel: {build_from_cache(self.bar_cache, self.symbols(), self.days, self.panel.path)}")
+                    if self.after_build is not None:
+                        print(f"🧮 Snapshot: {self.after_build()}")
+                except Exception as e:
+                    print(f"❌ Lỗi dựng panel: {e}")
+            self._stop_event.wait(self.check_every)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Panel thị trường dùng chung (np.memmap)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Dựng panel từ cache nến ngày")
+    b.add_argument("--days", type=int, default=PANEL_DAYS, help="Số ngày lịch")
+    sub.add_parser("info", help="Thông tin panel hiện có")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "info":
+        print(MarketPanel().info())
+        return
+    from scanner_core import BAR_CACHE, fetch_all_symbols
+    symbols = [s.code for s in fetch_all_symbols()]
+    print(f"🧱 Dựng panel {len(symbols)} mã x {args.days} ngày -> {PANEL_FILE}")
+    print(f"✅ {build_from_cache(BAR_CACHE, symbols, args.days)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
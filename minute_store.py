@@ -0,0 +1,130 @@
+"""
+Bộ đệm vòng cho nến 1 phút của phiên hiện tại, 1 bộ đệm / mã
+- Mỗi trường là 1 mảng numpy liên tục: thời gian/KL int64, giá float32
+- Mảng dài gấp đôi sức chứa, mỗi phần tử được ghi ở 2 vị trí (i và i + capacity)
+  nên N nến gần nhất luôn là 1 lát cắt liền -> đọc bằng view, không copy
+- Bộ nhớ cố định theo sức chứa; nến cũ nhất bị ghi đè khi đầy
+"""
+from __future__ import annotations
+import os, threading, datetime as dt
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+MINUTE_RING_SIZE = int(os.getenv("MINUTE_RING_SIZE", 300))  # 1 phiên ~ 270 phút khớp lệnh + ATC
+
+PRICE_FIELDS = ("O", "H", "L", "C")
+
+
+class MinuteRing:
+    """Nến 1 phút gần nhất của 1 mã trong bộ đệm vòng kích thước cố định."""
+
+    __slots__ = ("capacity", "t", "O", "H", "L", "C", "V", "head", "size", "day", "fetched_at")
+
+    def __init__(self, capacity: int = MINUTE_RING_SIZE):
+        self.capacity = capacity
+        self.t = np.zeros(2 * capacity, dtype=np.int64)   # epoch giây (UTC) của nến
+        for f in PRICE_FIELDS:
+            setattr(self, f, np.zeros(2 * capacity, dtype=np.float32))
+        self.V = np.zeros(2 * capacity, dtype=np.int64)
+        self.head = 0        # vị trí ghi tiếp theo trong [0, capacity)
+        self.size = 0
+        self.day: Optional[dt.date] = None
+        self.fetched_at = 0.0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f).nbytes for f in ("t", *PRICE_FIELDS, "V"))
+
+    def clear(self, day: Optional[dt.date] = None):
+        self.head = self.size = 0
+        self.day = day
+        self.fetched_at = 0.0
+
+    @property
+    def last_time(self) -> Optional[int]:
+        return int(self.t[self.head - 1 + self.capacity]) if self.size else None
+
+    def view(self, field: str, n: Optional[int] = None) -> np.ndarray:
+        """N giá trị gần nhất của trường (mặc định: toàn bộ), cũ -> mới, là view không copy."""
+        n = self.size if n is None else min(n, self.size)
+        end = self.head + self.capacity
+        return getattr(self, field)[end - n:end]
+
+    def extend(self, t: np.ndarray, o, h, l, c, v):
+        """Ghi thêm nến (t tăng dần). Nến trùng phút cuối (phút đang chạy được tải lại) thì ghi đè."""
+        t = np.asarray(t, dtype=np.int64)
+        last = self.last_time
+        if last is not None:
+            keep = t >= last
+            if not keep.all():
+                t, o, h, l, c, v = (np.asarray(a)[keep] for a in (t, o, h, l, c, v))
+            if len(t) and t[0] == last:  # lùi 1 ô để ghi đè phút cuối
+                self.head = (self.head - 1) % self.capacity
+                self.size -= 1
+        k = len(t)
+        if k == 0:
+            return
+        if k > self.capacity:
+            t, o, h, l, c, v = (np.asarray(a)[-self.capacity:] for a in (t, o, h, l, c, v))
+            k = self.capacity
+        idx = (self.head + np.arange(k)) % self.capacity
+        for name, vals in (("t", t), ("O", o), ("H", h), ("L", l), ("C", c), ("V", v)):
+            arr = getattr(self, name)
+            arr[idx] = vals
+            arr[idx + self.capacity] = vals
+        self.head = (self.head + k) % self.capacity
+        self.size = min(self.size + k, self.capacity)
+
+    def extend_frame(self, frame: pd.DataFrame):
+        """Ghi các nến từ DataFrame O/H/L/C/V (index = thời điểm UTC naive) của dchart_history."""
+        if frame is None or frame.empty:
+            return
+        t = frame.index.values.astype("datetime64[s]").astype(np.int64)  # index có thể là ns hoặc s
+        self.extend(t, frame["O"].to_numpy(), frame["H"].to_numpy(), frame["L"].to_numpy(),
+                    frame["C"].to_numpy(), frame["V"].to_numpy())
+
+    def to_frame(self) -> pd.DataFrame:
+        """Bản DataFrame (copy) theo cùng quy ước với dchart_history, dùng cho chart/debug."""
+        idx = pd.to_datetime(self.view("t"), unit="s")
+        data = {f: self.view(f).astype(np.float64) for f in PRICE_FIELDS}
+        data["V"] = self.view("V").copy()
+        return pd.DataFrame(data, index=pd.DatetimeIndex(idx, name="date"))
+
+
+class MinuteStore:
+    """Bộ đệm vòng nến 1 phút theo mã; bộ đệm được dùng lại (xoá) khi sang phiên mới."""
+
+    def __init__(self, capacity: int = MINUTE_RING_SIZE):
+        self.capacity = capacity
+        self._rings: Dict[str, MinuteRing] = {}
+        self._guard = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(1 for r in self._rings.values() if r.size)
+
+    def ring(self, sym: str, day: dt.date) -> MinuteRing:
+        """Bộ đệm của mã cho phiên `day` (tạo mới nếu chưa có, xoá nếu đang chứa phiên cũ)."""
+        r = self._rings.get(sym)
+        if r is None:
+            with self._guard:
+                r = self._rings.setdefault(sym, MinuteRing(self.capacity))
+        if r.day != day:
+            r.clear(day)
+        return r
+
+    def get(self, sym: str) -> Optional[MinuteRing]:
+        return self._rings.get(sym)
+
+    def drop(self, sym: str):
+        r = self._rings.get(sym)
+        if r is not None:
+            r.clear()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(r.nbytes for r in self._rings.values())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Mock VNDIRECT API cho benchmark/test (không gọi ra internet)
+- /dchart/history : nến D và 1 phút tổng hợp (tất định theo mã)
+- /v4/stocks      : universe tổng hợp, phân trang như API thật
+- /v4/stock_prices: giá trong ngày nhiều mã / request (đường bulk của quote poller)
+- CafeF PriceHistory.ashx: cùng chuỗi nến ngày theo định dạng CafeF (nguồn dự phòng)
+- --tail-rate/--tail-ms: một phần request DChart bị chậm, để đo hedged request
+
+Run:
+  python mock_dchart.py --port 8765 --symbols 5000
+  DCHART_URL=http://127.0.0.1:8765/dchart/history python app.py
+  STOCKS_SOURCE=http://127.0.0.1:8765/v4/stocks python symbol_registry.py --refresh
+  FINFO_PRICES_URL=http://127.0.0.1:8765/v4/stock_prices python app.py
+  CAFEF_URL=http://127.0.0.1:8765/cafef/PriceHistory.ashx python app.py
+"""
+from __future__ import annotations
+import json, time, zlib, random, argparse, datetime as dt
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+DAY = 86400
+FLOORS = ("HOSE", "HNX", "UPCOM")
+
+
+def synthetic_symbols(n: int) -> list:
+    """Danh sách mã giả lập, chia đều cho 3 sàn."""
+    return [{"code": f"S{i:04d}", "type": "STOCK", "floor": FLOORS[i % 3], "status": "LISTED"}
+            for i in range(n)]
+
+
+def _daily_close(seed: int, day: np.ndarray, noise: np.ndarray) -> np.ndarray:
+    idx = day.astype(np.float64)
+    base = 10 + seed % 90
+    return base * np.exp(0.25 * np.sin(idx / 40 + seed) + 0.08 * np.sin(idx / 9 + seed / 7) + 0.01 * noise)
+
+
+def synthetic_bars(symbol: str, resolution: str, since: int, to: int) -> dict:
+    """Chuỗi giá tổng hợp tất định theo (symbol, resolution) để kết quả lặp lại được."""
+    step = DAY if resolution == "D" else 60 * int(resolution)
+    start = since - since % step
+    t = np.arange(start, to + 1, step, dtype=np.int64)
+    # Bỏ thứ 7, chủ nhật (epoch 0 là thứ 5)
+    t = t[((t // DAY) + 3) % 7 < 5]
+    if resolution != "D":
+        # Chỉ trong giờ khớp lệnh 9:00-11:30, 13:00-15:00 giờ VN (UTC+7)
+        sec = (t + 7 * 3600) % DAY
+        t = t[((sec >= 9 * 3600) & (sec < 11.5 * 3600)) | ((sec >= 13 * 3600) & (sec < 15 * 3600))]
+    if len(t) == 0:
+        return {"s": "no_data", "t": [], "o": [], "h": [], "l": [], "c": [], "v": []}
+    seed = zlib.crc32(symbol.encode())
+    noise = lambda k: ((t * 2654435761 + seed * k) % 10007) / 10007.0 - 0.5
+    # Giá là hàm của thời điểm tuyệt đối của bar -> cùng một bar luôn có cùng giá trị;
+    # nến phút dao động quanh giá đóng cửa của ngày chứa nó
+    close = _daily_close(seed, t // DAY, noise(1))
+    if resolution != "D":
+        close = close * (1 + 0.01 * np.sin(t / 900.0) + 0.002 * noise(5))
+    spread = np.abs(noise(2)) * (0.02 if resolution == "D" else 0.002) * close
+    open_ = close * (1 + (0.01 if resolution == "D" else 0.001) * noise(3))
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    vol = (10_000 + (noise(4) + 0.5) * 2_000_000).astype(np.int64)
+    if resolution != "D":
+        vol = vol // 270
+    r2 = lambda a: np.round(a, 2).tolist()
+    return {"s": "ok", "t": t.tolist(), "o": r2(open_), "h": r2(high), "l": r2(low),
+            "c": r2(close), "v": vol.tolist()}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    universe: list = []
+    latency: float = 0.0
+    tail_rate: float = 0.0   # tỉ lệ request DChart bị chậm thêm tail_latency
+    tail_latency: float = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.latency:
+            time.sleep(self.latency)
+        if url.path.endswith("/dchart/history"):
+            if self.tail_rate and random.random() < self.tail_rate:
+                time.sleep(self.tail_latency)
+            now = int(time.time())
+            self._json(synthetic_bars(q.get("symbol", "X"), q.get("resolution", "D"),
+                                      int(q.get("from", now - 30 * DAY)), int(q.get("to", now))))
+        elif url.path.endswith("/v4/stocks"):
+            size, page = int(q.get("size", 100)), int(q.get("page", 1))
+            total = len(self.universe)
+            data = self.universe[(page - 1) * size: page * size]
+            self._json({"data": data, "currentPage": page, "size": size,
+                        "totalElements": total, "totalPages": max(1, -(-total // size))})
+        elif url.path.endswith("/v4/stock_prices"):
+            # "code:A,B~date:gte:YYYY-MM-DD" -> nến ngày tạm tính của các mã, gộp từ nến 1 phút
+            codes = q.get("q", "").split("~")[0].replace("code:", "").split(",")
+            now = int(time.time())
+            data = []
+            for code in filter(None, codes):
+                m = synthetic_bars(code, "1", now - now % DAY - 7 * 3600, now)
+                if m["t"]:
+                    data.append({"code": code, "open": m["o"][0], "high": max(m["h"]), "low": min(m["l"]),
+                                 "close": m["c"][-1], "nmVolume": sum(m["v"])})
+            self._json({"data": data, "currentPage": 1, "size": len(data), "totalElements": len(data)})
+        elif url.path.endswith("PriceHistory.ashx"):
+            parse = lambda d: int(dt.datetime.strptime(d, "%m/%d/%Y").replace(tzinfo=dt.timezone.utc).timestamp())
+            bars = synthetic_bars(q.get("Symbol", "X"), "D", parse(q["StartDate"]), parse(q["EndDate"]))
+            records = [{"Ngay": time.strftime("%d/%m/%Y", time.gmtime(t)), "GiaMoCua": o, "GiaCaoNhat": h,
+                        "GiaThapNhat": l, "GiaDongCua": c, "GiaDieuChinh": c, "KhoiLuongKhopLenh": v}
+                       for t, o, h, l, c, v in zip(bars["t"], bars["o"], bars["h"], bars["l"], bars["c"], bars["v"])]
+            self._json({"Success": True, "Data": {"TotalCount": len(records), "Data": records[::-1]}})
+        else:
+            self._json({"error": "not_found"}, 404)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(port: int = 8765, n_symbols: int = 5000, latency_ms: float = 0.0,
+          tail_rate: float = 0.0, tail_ms: float = 0.0):
+    MockHandler.universe = synthetic_symbols(n_symbols)
+    MockHandler.latency = latency_ms / 1000.0
+    MockHandler.tail_rate = tail_rate
+    MockHandler.tail_latency = tail_ms / 1000.0
+    srv = MockServer(("127.0.0.1", port), MockHandler)
+    print(f"🧪 Mock API chạy tại http://127.0.0.1:{port} ({n_symbols} mã)")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Mock VNDIRECT API")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--symbols", type=int, default=5000)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--tail-rate", type=float, default=0.0)
+    ap.add_argument("--tail-ms", type=float, default=0.0)
+    a = ap.parse_args()
+    serve(a.port, a.symbols, a.latency_ms, a.tail_rate, a.tail_ms)
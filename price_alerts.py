@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Cảnh báo giá theo ngưỡng, gắn vào bảng giá realtime (QuoteTable của quote poller)
+- Cảnh báo 1 lần: "HPG trên 30", "VCB dưới EMA34", "FPT trên MA50"; báo xong thì tự xoá
+- Chỉ mục theo mã: ngưỡng "trên" và "dưới" nằm trong 2 mảng đã sắp xếp, xếp sao cho các
+  cảnh báo bị chạm luôn ở cuối mảng -> mỗi quote mới chỉ bisect rồi cắt đuôi:
+  O(log n + số cảnh báo chạm), không vòng lặp quét từng cảnh báo
+- Ngưỡng theo đường trung bình quy về giá cố định trong phiên (nến cuối là nến đang chạy):
+    giá > EMA_n(hôm nay) <=> giá > EMA_n(phiên đã chốt gần nhất)
+    giá > MA_n(hôm nay)  <=> giá > trung bình n-1 phiên đã chốt gần nhất
+  nên chỉ tính 1 lần / phiên từ nến đã chốt, sang phiên mới thì tính lại
+- Lưu đĩa (ALERTS_FILE, ghi file tạm rồi os.replace) để giữ qua restart
+
+Run:
+  python price_alerts.py bench --alerts 100000 --symbols 300 --updates 200000
+"""
+from __future__ import annotations
+import os, re, sys, json, time, random, bisect, argparse, threading, datetime as dt
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from quote_poller import QUOTE_STALE_SECONDS
+from trading_calendar import final_day, vn_now
+
+ALERTS_FILE = os.getenv("ALERTS_FILE", ".cache/price_alerts.json")
+ALERTS_PER_CHAT = int(os.getenv("ALERTS_PER_CHAT", 50))
+ALERTS_SAVE_SECONDS = 2.0  # gộp nhiều lần thay đổi thành 1 lần ghi file
+REF_PATTERN = re.compile(r"^(EMA|MA)(\d{1,3})$")
+
+# reference(symbol, "EMA34") -> ngưỡng giá tương đương trong phiên (None = thiếu dữ liệu)
+Reference = Callable[[str, str], Optional[float]]
+
+
+@dataclass
+class Alert:
+    id: int
+    owner: str            # "tg:<chat_id>" (watchlist.chat_key)
+    symbol: str
+    direction: str        # "above" | "below"
+    level: Optional[float] = None   # ngưỡng giá cố định
+    ref: Optional[str] = None       # hoặc đường trung bình: "EMA34", "MA50"
+    threshold: float = 0.0          # ngưỡng giá đang dùng (= level hoặc giá trị ref của phiên)
+    created: float = 0.0
+
+    def describe(self) -> str:
+        side = "trên" if self.direction == "above" else "dưới"
+        target = self.ref + f" (≈ {self.threshold:,.2f})" if self.ref else f"{self.threshold:,.2f}"
+        return f"{self.symbol} {side} {target}"
+
+
+@dataclass
+class Hit:
+    alert: Alert
+    price: float
+    ts: float
+
+    def format_html(self) -> str:
+        icon = "📈" if self.alert.direction == "above" else "📉"
+        clock = time.strftime("%H:%M:%S", time.localtime(self.ts))
+        side = "vượt lên trên" if self.alert.direction == "above" else "xuống dưới"
+        target = self.alert.ref or f"{self.alert.threshold:,.2f}"
+        return (f"{icon} <b>{self.alert.symbol}</b> {side} <b>{target}</b> • giá {self.price:,.2f}"
+                f"{f' (ngưỡng {self.alert.threshold:,.2f})' if self.alert.ref else ''} <i>({clock})</i>")
+
+
+class _Side:
+    """Ngưỡng 1 chiều của 1 mã, sắp xếp theo key tăng dần; cảnh báo bị chạm luôn nằm ở đuôi.
+    above: key = -ngưỡng (chạm khi ngưỡng <= giá <=> key >= -giá)
+    below: key = ngưỡng  (chạm khi ngưỡng >= giá <=> key >= giá)"""
+
+    __slots__ = ("sign", "keys", "ids")
+
+    def __init__(self, sign: float):
+        self.sign = sign
+        self.keys: List[float] = []
+        self.ids: List[int] = []
+
+    def insert(self, threshold: float, alert_id: int):
+        i = bisect.bisect_right(self.keys, self.sign * threshold)
+        self.keys.insert(i, self.sign * threshold)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, threshold: float, alert_id: int) -> bool:
+        key = self.sign * threshold
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.ids[i] == alert_id:
+                del self.keys[i], self.ids[i]
+                return True
+            i += 1
+        return False
+
+    def pop_crossed(self, price: float) -> List[int]:
+        i = bisect.bisect_left(self.keys, self.sign * price)
+        if i == len(self.keys):
+            return []
+        hit = self.ids[i:]
+        del self.keys[i:], self.ids[i:]
+        return hit
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def _final_day() -> dt.date:
+    return final_day(vn_now())
+
+
+class PriceAlerts:
+    """Sổ cảnh báo theo mã; on_quotes() nghe QuoteTable, hit được phát cho subscriber."""
+
+    def __init__(self, reference: Optional[Reference] = None, path: str = ALERTS_FILE,
+                 per_owner: int = ALERTS_PER_CHAT, session_day: Callable[[], dt.date] = _final_day):
+        self.reference = reference
+        self.path = path
+        self.per_owner = per_owner
+        self.session_day = session_day
+        self.quotes = None
+        self.alerts: Dict[int, Alert] = {}
+        self._sides: Dict[Tuple[str, str], _Side] = {}
+        self._by_owner: Dict[str, set] = defaultdict(set)
+        self._ref_alerts: Dict[str, set] = defaultdict(set)   # mã -> id cảnh báo theo đường TB
+        self._ref_day: Dict[str, dt.date] = {}                # mã -> phiên đã tính ngưỡng TB
+        self._last: Dict[str, float] = {}                     # mã -> giá lần kiểm tra trước
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[Hit], None]] = []
+        self._save_timer: Optional[threading.Timer] = None
+        self._saved_at = 0.0
+        self.stats = {"checks": 0, "hits": 0, "check_seconds": 0.0}
+
+    # ---- vòng đời ----
+
+    def attach(self, quotes) -> "PriceAlerts":
+        """Nghe QuoteTable: mỗi lần poller ghi giá, chỉ các mã đổi giá được kiểm tra."""
+        self.quotes = quotes
+        quotes.subscribe(self.on_quotes)
+        return self
+
+    def subscribe(self, fn: Callable[[Hit], None]):
+        self._subscribers.append(fn)
+
+    # ---- quản lý cảnh báo ----
+
+    @staticmethod
+    def parse_target(text: str) -> Tuple[Optional[float], Optional[str]]:
+        """'30' / '30,5' -> (30.0, None); 'ema34' -> (None, 'EMA34'); sai -> ValueError."""
+        ref = text.strip().upper()
+        if REF_PATTERN.match(ref):
+            return None, ref
+        level = float(text.replace(",", "."))
+        if level <= 0:
+            raise ValueError("Ngưỡng giá phải > 0")
+        return level, None
+
+    def add(self, owner: str, symbol: str, direction: str, level: Optional[float] = None,
+            ref: Optional[str] = None) -> Tuple[Alert, Optional[Hit]]:
+        """Thêm cảnh báo; nếu giá hiện tại đã thoả thì báo luôn (trả về Hit, không lưu cảnh báo)."""
+        if direction not in ("above", "below"):
+            raise ValueError(f"Chiều không hợp lệ: {direction}")
+        if (level is None) == (ref is None):
+            raise ValueError("Cần đúng 1 trong level / ref")
+        if len(self._by_owner.get(owner, ())) >= self.per_owner:
+            raise ValueError(f"Tối đa {self.per_owner} cảnh báo")
+        threshold = level if level is not None else self._resolve(symbol, ref)
+        if threshold is None:
+            raise ValueError(f"Chưa đủ dữ liệu để tính {ref} cho {symbol}")
+        price = self._price(symbol)
+        with self._lock:
+            alert = Alert(self._next_id, owner, symbol, direction, level, ref, threshold, time.time())
+            self._next_id += 1
+            if price is not None and self._crossed(alert, price):
+                return alert, Hit(alert, price, time.time())
+            self._index(alert)
+            if ref:
+                self._ref_day.setdefault(symbol, self.session_day())
+        self._schedule_save()
+        return alert, None
+
+    def remove(self, owner: str, alert_id: int) -> bool:
+        with self._lock:
+            alert = self.alerts.get(alert_id)
+            if alert is None or alert.owner != owner:
+                return False
+            self._unindex(alert)
+        self._schedule_save()
+        return True
+
+    def clear(self, owner: str) -> int:
+        with self._lock:
+            ids = list(self._by_owner.get(owner, ()))
+            for i in ids:
+                self._unindex(self.alerts[i])
+        self._schedule_save()
+        return len(ids)
+
+    def list(self, owner: str) -> List[Alert]:
+        with self._lock:
+            return sorted((self.alerts[i] for i in self._by_owner.get(owner, ())), key=lambda a: a.id)
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    # ---- chỉ mục ----
+
+    def _side(self, symbol: str, direction: str) -> _Side:
+        side = self._sides.get((symbol, direction))
+        if side is None:
+            side = self._sides[(symbol, direction)] = _Side(-1.0 if direction == "above" else 1.0)
+        return side
+
+    def _index(self, alert: Alert):
+        self.alerts[alert.id] = alert
+        self._side(alert.symbol, alert.direction).insert(alert.threshold, alert.id)
+        self._by_owner[alert.owner].add(alert.id)
+        if alert.ref:
+            self._ref_alerts[alert.symbol].add(alert.id)
+
+    def _unindex(self, alert: Alert, in_side: bool = True):
+        if in_side:
+            self._side(alert.symbol, alert.direction).remove(alert.threshold, alert.id)
+        self.alerts.pop(alert.id, None)
+        self._by_owner[alert.owner].discard(alert.id)
+        if alert.ref:
+            self._ref_alerts[alert.symbol].discard(alert.id)
+
+    @staticmethod
+    def _crossed(alert: Alert, price: float) -> bool:
+        return price >= alert.threshold if alert.direction == "above" else price <= alert.threshold
+
+    def _price(self, symbol: str) -> Optional[float]:
+        if self.quotes is not None:
+            q = self.quotes.get(symbol, max_age=QUOTE_STALE_SECONDS)  # quote cũ (ngoài phiên) không tính
+            if q is not None:
+                return q["C"]
+        return self._last.get(symbol)
+
+    def _resolve(self, symbol: str, ref: str) -> Optional[float]:
+        return self.reference(symbol, ref) if self.reference is not None else None
+
+    def _roll_refs(self, symbol: str):
+        """Sang phiên mới: tính lại ngưỡng của các cảnh báo theo đường TB của mã (ngoài lock)."""
+        day = self.session_day()
+        if self._ref_day.get(symbol) == day:
+            return
+        with self._lock:
+            alerts = [self.alerts[i] for i in self._ref_alerts.get(symbol, ())]
+        new = {a.ref: self._resolve(symbol, a.ref) for a in alerts}
+        with self._lock:
+            for a in alerts:
+                if a.id in self.alerts and new[a.ref] is not None:
+                    self._side(symbol, a.direction).remove(a.threshold, a.id)
+                    a.threshold = new[a.ref]
+                    self._side(symbol, a.direction).insert(a.threshold, a.id)
+            self._ref_day[symbol] = day
+
+    # ---- kiểm tra giá ----
+
+    def check(self, symbol: str, price: float, ts: Optional[float] = None) -> List[Hit]:
+        """Các cảnh báo bị chạm bởi giá mới (đã xoá khỏi sổ)."""
+        if self._ref_alerts.get(symbol):
+            self._roll_refs(symbol)
+        t0 = time.perf_counter()
+        ts = ts or time.time()
+        hits: List[Hit] = []
+        with self._lock:
+            self._last[symbol] = price
+            for direction in ("above", "below"):
+                side = self._sides.get((symbol, direction))
+                if side is None or not side.keys:
+                    continue
+                for alert_id in side.pop_crossed(price):
+                    alert = self.alerts[alert_id]
+                    self._unindex(alert, in_side=False)
+                    hits.append(Hit(alert, price, ts))
+            self.stats["checks"] += 1
+            self.stats["hits"] += len(hits)
+            self.stats["check_seconds"] += time.perf_counter() - t0
+        return hits
+
+    def on_quotes(self, symbols: List[str]):
+        """Listener của QuoteTable (thread của poller)."""
+        hits: List[Hit] = []
+        for sym in symbols:
+            if (sym, "above") in self._sides or (sym, "below") in self._sides:
+                q = self.quotes.get(sym)
+                if q is not None:
+                    hits += self.check(sym, q["C"], q["updated"])
+        if hits:
+            self._schedule_save()
+        for hit in hits:
+            for fn in list(self._subscribers):
+                try:
+                    fn(hit)
+                except Exception as e:
+                    print(f"⚠️ Lỗi subscriber cảnh báo giá: {e}")
+
+    def info(self) -> dict:
+        checks = self.stats["checks"]
+        return {"alerts": len(self.alerts), "symbols": len({s for s, _ in self._sides}),
+                "checks": checks, "hits": self.stats["hits"],
+                "avg_check_us": round(self.stats["check_seconds"] / checks * 1e6, 2) if checks else None}
+
+    # ---- lưu đĩa ----
+
+    def _schedule_save(self):
+        if not self.path:
+            return
+        wait = self._saved_at + ALERTS_SAVE_SECONDS - time.time()
+        if wait <= 0:
+            self.save()
+        elif self._save_timer is None:
+            self._save_timer = threading.Timer(wait, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        self._save_timer = None
+        self._saved_at = time.time()
+        with self._lock:
+            data = {"next_id": self._next_id, "alerts": [asdict(a) for a in self.alerts.values()]}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Không lưu được cảnh báo giá: {e}")
+
+    def load(self) -> int:
+        """Nạp cảnh báo đã lưu; ngưỡng theo đường TB được tính lại ở lần kiểm tra đầu tiên."""
+        if not self.path:
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+        with self._lock:
+            for row in data.get("alerts", []):
+                alert = Alert(**row)
+                if alert.id not in self.alerts:
+                    self._index(alert)
+            self._next_id = max(self._next_id, int(data.get("next_id", 1)))
+        return len(self.alerts)
+
+
+# =====================
+# Benchmark
+# =====================
+
+def bench(n_alerts: int, n_symbols: int, n_updates: int, seed: int = 7) -> dict:
+    """Chỉ mục đã sắp xếp vs vòng lặp kiểm tra từng cảnh báo của mã, cùng dòng giá ngẫu nhiên."""
+    rnd = random.Random(seed)
+    symbols = [f"S{i:04d}" for i in range(n_symbols)]
+    base = {s: rnd.uniform(5, 150) for s in symbols}
+    book = PriceAlerts(path="", per_owner=n_alerts, session_day=lambda: dt.date.today())
+    naive: Dict[str, List[Alert]] = defaultdict(list)
+    for s in symbols:
+        book._last[s] = base[s]
+    t0 = time.perf_counter()
+    for i in range(n_alerts):
+        s = rnd.choice(symbols)
+        direction = rnd.choice(("above", "below"))
+        level = base[s] * (1 + rnd.uniform(0.005, 0.15) * (1 if direction == "above" else -1))
+        alert, _ = book.add(f"tg:{i % 5000}", s, direction, level=round(level, 2))
+        naive[s].append(alert)
+    add_seconds = time.perf_counter() - t0
+
+    ticks = []
+    price = dict(base)
+    for _ in range(n_updates):
+        s = rnd.choice(symbols)
+        price[s] = max(0.5, price[s] * (1 + rnd.gauss(0, 0.004)))
+        ticks.append((s, round(price[s], 2)))
+
+    t0 = time.perf_counter()
+    indexed_hits = 0
+    for s, p in ticks:
+        indexed_hits += len(book.check(s, p))
+    indexed_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    naive_hits = 0
+    for s, p in ticks:
+        keep = []
+        for a in naive[s]:
+            if PriceAlerts._crossed(a, p):
+                naive_hits += 1
+            else:
+                keep.append(a)
+        naive[s] = keep
+    naive_seconds = time.perf_counter() - t0
+    return {"alerts": n_alerts, "symbols": n_symbols, "updates": n_updates,
+            "add_us": round(add_seconds / n_alerts * 1e6, 2),
+            "indexed_us_per_update": round(indexed_seconds / n_updates * 1e6, 2),
+            "naive_us_per_update": round(naive_seconds / n_updates * 1e6, 2),
+            "speedup": round(naive_seconds / indexed_seconds, 1) if indexed_seconds else None,
+            "hits": indexed_hits, "hits_match": indexed_hits == naive_hits, "remaining": len(book)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cảnh báo giá theo ngưỡng")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="Chỉ mục ngưỡng vs kiểm tra từng cảnh báo")
+    b.add_argument("--alerts", type=int, default=100_000)
+    b.add_argument("--symbols", type=int, default=300)
+    b.add_argument("--updates", type=int, default=200_000)
+    sub.add_parser("show", help="Các cảnh báo đã lưu")
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        print(bench(args.alerts, args.symbols, args.updates))
+    else:
+        book = PriceAlerts()
+        book.load()
+        for owner in sorted(book._by_owner):
+            for a in book.list(owner):
+                print(f"#{a.id} {owner}: {a.describe()}")
+        print(book.info())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
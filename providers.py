@@ -0,0 +1,262 @@
+"""
+Lớp nguồn dữ liệu giá: mọi hàm tải lịch sử giá đi qua MarketData
+- Mỗi provider trả về cùng một dạng: DataFrame O/H/L/C/V (float/int), index = thời điểm
+  bắt đầu nến UTC naive (nến ngày 00:00), tăng dần - đúng quy ước của DChart
+- VNDIRECT DChart: mọi khung; CafeF PriceHistory: chỉ nến ngày (nguồn dự phòng), dùng giá
+  điều chỉnh như DChart để ghép được vào chuỗi nến đã cache
+- Tải không được sau MAX_ATTEMPTS lần -> raise ProviderError (không trả về frame rỗng), để cache
+  phân biệt "không có dữ liệu" với "tải lỗi" và thử lại lần sau
+- Theo dõi sức khoẻ từng provider (tỉ lệ lỗi, độ trễ EWMA); lỗi liên tiếp -> tạm ngắt
+- Hedged request: primary chưa trả lời sau HEDGE_AFTER_MS thì gửi thêm 1 request sang
+  provider kế tiếp, lấy kết quả nào về trước
+"""
+from __future__ import annotations
+import os, time, threading, datetime as dt
+import concurrent.futures as futures
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import pandas as pd
+import requests
+
+from bars import parse_dchart
+
+DCHART = os.getenv("DCHART_URL", "https://dchart-api.vndirect.com.vn/dchart/history")  # đổi sang mock_dchart.py khi benchmark
+CAFEF = os.getenv("CAFEF_URL", "https://s.cafef.vn/Ajax/PageNew/DataHistory/PriceHistory.ashx")
+MARKET_PROVIDERS = os.getenv("MARKET_PROVIDERS", "vndirect,cafef")  # thứ tự ưu tiên
+HEDGE_AFTER_MS = float(os.getenv("HEDGE_AFTER_MS", 1500))  # 0 = không hedge
+REQUEST_TIMEOUT = 45
+MAX_ATTEMPTS = 3
+RETRY_SLEEP = 2
+TRIP_AFTER_FAILURES = 5     # lỗi liên tiếp -> tạm ngắt provider
+TRIP_SECONDS = 60
+
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0 Safari/537.36"
+    ),
+    "Accept": "application/json, text/plain, */*",
+    "Connection": "keep-alive",
+}
+
+VN_TZ = dt.timezone(dt.timedelta(hours=7))
+EMPTY = pd.DataFrame(columns=["O", "H", "L", "C", "V"])
+
+
+class ProviderError(Exception):
+    """Provider không trả được dữ liệu (lỗi mạng, HTTP, sai định dạng)."""
+
+
+@dataclass
+class ProviderHealth:
+    ok: int = 0
+    failed: int = 0
+    hedged_wins: int = 0        # số lần thắng khi được gửi kèm (hedge)
+    consecutive_failures: int = 0
+    latency: float = 0.0        # EWMA giây
+    down_until: float = 0.0
+
+    def record(self, success: bool, seconds: float):
+        if success:
+            self.ok += 1
+            self.consecutive_failures = 0
+            self.latency = seconds if self.ok == 1 else 0.8 * self.latency + 0.2 * seconds
+        else:
+            self.failed += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= TRIP_AFTER_FAILURES:
+                self.down_until = time.time() + TRIP_SECONDS
+
+    @property
+    def healthy(self) -> bool:
+        return time.time() >= self.down_until
+
+    def to_dict(self) -> dict:
+        return {"ok": self.ok, "failed": self.failed, "hedged_wins": self.hedged_wins,
+                "latency_ms": round(self.latency * 1000, 1), "healthy": self.healthy}
+
+
+class Provider:
+    """Nguồn lịch sử giá; history() trả về DataFrame chuẩn hoá hoặc raise ProviderError."""
+
+    name = "base"
+    resolutions: Sequence[str] = ()
+
+    def supports(self, resolution: str) -> bool:
+        return resolution in self.resolutions
+
+    def history(self, symbol: str, resolution: str, since_epoch: int, to_epoch: int) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+def normalize(t, o, h, l, c, v) -> pd.DataFrame:
+    """Dạng chung của mọi provider: cột O/H/L/C/V, index 'date' UTC naive (t = epoch giây) tăng dần."""
+    df = pd.DataFrame({"O": o, "H": h, "L": l, "C": c, "V": v},
+                      index=pd.DatetimeIndex(pd.to_datetime(t, unit="s"), name="date"))
+    df = df.dropna()
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    return df
+
+
+class VndirectProvider(Provider):
+    name = "vndirect"
+    resolutions = ("1", "5", "15", "30", "60", "D", "W", "M")
+
+    def __init__(self, url: str = DCHART):
+        self.url = url
+
+    def history(self, symbol, resolution, since_epoch, to_epoch):
+        headers = {**BROWSER_HEADERS, "Referer": "https://dchart.vndirect.com.vn/",
+                   "Origin": "https://dchart.vndirect.com.vn"}
+        params = {"symbol": symbol, "resolution": resolution, "from": since_epoch, "to": to_epoch}
+        try:
+            r = requests.get(self.url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+            if r.status_code == 403:
+                raise ProviderError("403 Forbidden")
+            r.raise_for_status()
+            bars = parse_dchart(r.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise ProviderError(str(e)) from e
+        return bars.to_frame() if not bars.empty else EMPTY.copy()
+
+
+class CafefProvider(Provider):
+    """CafeF PriceHistory (trước đây chỉ dùng trong streamlit_app.get_cafef_data)."""
+
+    name = "cafef"
+    resolutions = ("D",)
+
+    def __init__(self, url: str = CAFEF):
+        self.url = url
+
+    def history(self, symbol, resolution, since_epoch, to_epoch):
+        start = dt.datetime.fromtimestamp(since_epoch, VN_TZ)
+        end = dt.datetime.fromtimestamp(to_epoch, VN_TZ)
+        days = max(1, (end - start).days)
+        params = {"Symbol": symbol, "StartDate": start.strftime("%m/%d/%Y"),
+                  "EndDate": end.strftime("%m/%d/%Y"), "PageIndex": 0, "PageSize": days * 2}
+        try:
+            r = requests.get(self.url, params=params, headers=BROWSER_HEADERS, timeout=REQUEST_TIMEOUT)
+            r.raise_for_status()
+            js = r.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise ProviderError(str(e)) from e
+        if not js.get("Success"):
+            raise ProviderError("CafeF Success=false")
+        records = ((js.get("Data") or {}).get("Data")) or []
+        rows = []
+        for rec in records:
+            try:
+                day = _cafef_epoch(rec["Ngay"])
+                # Giá đã điều chỉnh (cổ tức, chia tách) như DChart; O/H/L điều chỉnh cùng tỉ lệ
+                adj = rec["GiaDieuChinh"] / rec["GiaDongCua"] if rec["GiaDongCua"] else 1.0
+                rows.append((day, rec["GiaMoCua"] * adj, rec["GiaCaoNhat"] * adj, rec["GiaThapNhat"] * adj,
+                             rec["GiaDieuChinh"], rec["KhoiLuongKhopLenh"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not rows:
+            return EMPTY.copy()
+        t, o, h, l, c, v = zip(*rows)
+        df = normalize(t, o, h, l, c, v)
+        df["V"] = df["V"].astype("int64")
+        lo, hi = pd.Timestamp(since_epoch, unit="s"), pd.Timestamp(to_epoch, unit="s")
+        return df[(df.index >= lo) & (df.index <= hi)]
+
+
+def _cafef_epoch(s: str) -> int:
+    """Ngày CafeF (dd/mm/yyyy hoặc mm/dd/yyyy) -> epoch 00:00 UTC như nến ngày của DChart."""
+    for fmt in ("%d/%m/%Y", "%m/%d/%Y"):
+        try:
+            return int(dt.datetime.strptime(s, fmt).replace(tzinfo=dt.timezone.utc).timestamp())
+        except ValueError:
+            continue
+    raise ValueError(s)
+
+
+PROVIDER_TYPES = {"vndirect": VndirectProvider, "cafef": CafefProvider}
+
+
+class MarketData:
+    """Điểm vào duy nhất cho lịch sử giá: chọn provider theo sức khoẻ, hedge request chậm."""
+
+    def __init__(self, providers: List[Provider], hedge_after_ms: float = HEDGE_AFTER_MS, workers: int = 64):
+        self.providers = providers
+        self.health: Dict[str, ProviderHealth] = {p.name: ProviderHealth() for p in providers}
+        self.hedge_after = hedge_after_ms / 1000.0
+        self.hedges = 0
+        self._pool = futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="provider")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, names: str = MARKET_PROVIDERS) -> "MarketData":
+        return cls([PROVIDER_TYPES[n.strip()]() for n in names.split(",") if n.strip()])
+
+    def _candidates(self, resolution: str) -> List[Provider]:
+        able = [p for p in self.providers if p.supports(resolution)]
+        healthy = [p for p in able if self.health[p.name].healthy]
+        return healthy or able  # tất cả đang ngắt thì vẫn thử theo thứ tự cấu hình
+
+    def _call(self, p: Provider, args: tuple) -> pd.DataFrame:
+        t0 = time.time()
+        try:
+            df = p.history(*args)
+        except Exception:
+            with self._lock:
+                self.health[p.name].record(False, time.time() - t0)
+            raise
+        with self._lock:
+            self.health[p.name].record(True, time.time() - t0)
+        return df
+
+    def _hedged(self, providers: List[Provider], args: tuple) -> pd.DataFrame:
+        """Gửi tới provider đầu; quá ngưỡng chưa về (hoặc lỗi) thì gửi tiếp provider sau."""
+        pending: Dict[futures.Future, Provider] = {}
+        queue = list(providers)
+        errors = []
+        pending[self._pool.submit(self._call, queue.pop(0), args)] = providers[0]
+        while pending:
+            wait_for = self.hedge_after if (queue and self.hedge_after > 0) else None
+            done, _ = futures.wait(pending, timeout=wait_for, return_when=futures.FIRST_COMPLETED)
+            if not done:  # primary chậm -> hedge
+                p = queue.pop(0)
+                with self._lock:
+                    self.hedges += 1
+                pending[self._pool.submit(self._call, p, args)] = p
+                continue
+            for f in done:
+                p = pending.pop(f)
+                try:
+                    df = f.result()
+                except Exception as e:
+                    errors.append(f"{p.name}: {e}")
+                    if queue:
+                        nxt = queue.pop(0)
+                        pending[self._pool.submit(self._call, nxt, args)] = nxt
+                    continue
+                if p is not providers[0]:
+                    with self._lock:
+                        self.health[p.name].hedged_wins += 1
+                return df  # request còn lại (nếu có) chạy nốt trong nền, kết quả bị bỏ
+        raise ProviderError("; ".join(errors) or "không có provider")
+
+    def history(self, symbol: str, resolution: str, since_epoch: int, to_epoch: int) -> pd.DataFrame:
+        """Frame rỗng = nguồn trả lời nhưng không có nến; tải lỗi -> ProviderError."""
+        providers = self._candidates(resolution)
+        if not providers:
+            raise ProviderError(f"Không có nguồn dữ liệu hỗ trợ khung {resolution}")
+        args = (symbol, resolution, since_epoch, to_epoch)
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return self._hedged(providers, args)
+            except ProviderError as e:
+                print(f"⚠️ Lỗi khi tải {symbol} (lần {attempt + 1}/{MAX_ATTEMPTS}): {e}")
+                if attempt + 1 == MAX_ATTEMPTS:
+                    raise ProviderError(f"Không thể tải {symbol} sau {MAX_ATTEMPTS} lần thử: {e}") from e
+                time.sleep(RETRY_SLEEP)
+                providers = self._candidates(resolution)
+
+    def stats(self) -> dict:
+        return {"hedges": self.hedges, **{n: h.to_dict() for n, h in self.health.items()}}
@@ -0,0 +1,244 @@
+"""
+Bảng giá realtime dùng chung + poller chạy nền
+- QuoteTable: mảng numpy theo mã (O/H/L/giá khớp/KL trong ngày/thời điểm cập nhật)
+- QuotePoller: thread nền làm mới toàn bộ universe mỗi QUOTE_REFRESH_SECONDS giây,
+  dùng đường bulk rẻ nhất có được:
+    finfo  : VNDIRECT stock_prices, nhiều mã / request
+    dchart : từng mã, chỉ tải nến 1 phút mới (qua BarCache) rồi gộp thành nến ngày
+    auto   : thử finfo, lỗi thì tạm chuyển sang dchart
+- Scan, header chart và cảnh báo đọc giá từ bảng này thay vì tự gọi API
+"""
+from __future__ import annotations
+import os, time, threading
+import concurrent.futures as futures
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import requests
+
+QUOTE_REFRESH_SECONDS = float(os.getenv("QUOTE_REFRESH_SECONDS", 15))
+QUOTE_STALE_SECONDS = float(os.getenv("QUOTE_STALE_SECONDS", 60))
+QUOTE_SOURCE = os.getenv("QUOTE_SOURCE", "auto")  # auto | finfo | dchart
+QUOTES_FILE = os.getenv("QUOTES_FILE", ".cache/quotes.npz")  # bảng giá lưu sau mỗi chu kỳ (rỗng = không lưu)
+FINFO_PRICES = os.getenv("FINFO_PRICES_URL", "https://api-finfo.vndirect.com.vn/v4/stock_prices")
+FINFO_BATCH = 100          # số mã mỗi request bulk
+FINFO_RETRY_AFTER = 300    # bulk lỗi -> dùng dchart trong 5 phút rồi thử lại
+REQUEST_TIMEOUT = 15
+
+
+class QuoteTable:
+    """Bảng giá dạng mảng liên tục, 1 dòng / mã; ghi giữ khoá, đọc không cần khoá (giá trị float/int
+    đơn lẻ; mảng được nới trước rồi mới công bố index nên mã đã có trong index luôn có dòng)."""
+
+    def __init__(self, symbols: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self.index: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self.ohlc = np.full((0, 4), np.nan, dtype=np.float64)  # O, H, L, C
+        self.volume = np.zeros(0, dtype=np.int64)
+        self.updated = np.zeros(0, dtype=np.float64)           # epoch, 0 = chưa có
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self.ensure(symbols)
+
+    def ensure(self, symbols: Iterable[str]):
+        """Thêm mã mới vào bảng (mở rộng mảng một lần cho cả lô)."""
+        with self._lock:
+            new = [s for s in dict.fromkeys(symbols) if s not in self.index]
+            if not new:
+                return
+            n = len(self.symbols)
+            self.ohlc = np.vstack([self.ohlc, np.full((len(new), 4), np.nan)])
+            self.volume = np.concatenate([self.volume, np.zeros(len(new), dtype=np.int64)])
+            self.updated = np.concatenate([self.updated, np.zeros(len(new))])
+            self.symbols.extend(new)
+            for i, s in enumerate(new):  # công bố sau cùng: get() thấy mã thì mảng đã đủ dòng
+                self.index[s] = n + i
+
+    def update_many(self, quotes: Dict[str, dict], ts: Optional[float] = None) -> List[str]:
+        """Ghi nhiều quote ({sym: {O,H,L,C,V}}); trả về các mã có giá hoặc KL thay đổi."""
+        ts = ts or time.time()
+        self.ensure(quotes.keys())
+        changed = []
+        with self._lock:  # không ghi xen với ensure() (đang thay mảng) / load()
+            for sym, q in quotes.items():
+                i = self.index[sym]
+                if self.ohlc[i, 3] != q["C"] or self.volume[i] != q["V"]:
+                    changed.append(sym)
+                self.ohlc[i] = (q["O"], q["H"], q["L"], q["C"])
+                self.volume[i] = q["V"]
+                self.updated[i] = ts
+        if changed:  # listener chạy ngoài khoá
+            for fn in list(self._listeners):
+                try:
+                    fn(changed)
+                except Exception as e:
+                    print(f"⚠️ Lỗi listener bảng giá: {e}")
+        return changed
+
+    def subscribe(self, fn: Callable[[List[str]], None]):
+        """Đăng ký callback nhận danh sách mã vừa đổi giá."""
+        self._listeners.append(fn)
+
+    def get(self, sym: str, max_age: Optional[float] = None) -> Optional[dict]:
+        """Quote của 1 mã (kèm tuổi dữ liệu); None nếu chưa có hoặc cũ hơn max_age."""
+        i = self.index.get(sym)
+        if i is None or self.updated[i] == 0:
+            return None
+        age = float(time.time() - self.updated[i])
+        if max_age is not None and age > max_age:
+            return None
+        o, h, l, c = self.ohlc[i]
+        return {"O": float(o), "H": float(h), "L": float(l), "C": float(c),
+                "V": int(self.volume[i]), "updated": float(self.updated[i]), "age": age}
+
+    def staleness(self, max_age: float = QUOTE_STALE_SECONDS) -> dict:
+        """Thống kê độ tươi của bảng giá."""
+        have = self.updated > 0
+        age = time.time() - self.updated[have]
+        return {
+            "symbols": len(self.symbols),
+            "fresh": int((age <= max_age).sum()),
+            "stale": int((age > max_age).sum()),
+            "missing": int((~have).sum()),
+            "oldest_age": float(age.max()) if len(age) else None,
+        }
+
+    def save(self, path: str = QUOTES_FILE):
+        """Lưu bảng giá (kèm thời điểm cập nhật) để process sau nạp lại khi khởi động."""
+        if not path:
+            return
+        with self._lock:
+            symbols, ohlc, volume, updated = list(self.symbols), self.ohlc.copy(), self.volume.copy(), \
+                self.updated.copy()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, symbols=np.array(symbols, dtype=str), ohlc=ohlc, volume=volume, updated=updated)
+        os.replace(tmp, path)
+
+    def load(self, path: str = QUOTES_FILE) -> int:
+        """Nạp bảng giá đã lưu, giữ nguyên thời điểm cập nhật (quote cũ không qua được max_age);
+        không gọi listener. Trả về số mã có quote."""
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                symbols = [str(s) for s in z["symbols"]]
+                ohlc, volume, updated = z["ohlc"], z["volume"], z["updated"]
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return 0
+        self.ensure(symbols)
+        with self._lock:
+            rows = np.array([self.index[s] for s in symbols], dtype=np.int64)
+            newer = updated > self.updated[rows]  # không đè quote mới hơn đã có
+            self.ohlc[rows[newer]] = ohlc[newer]
+            self.volume[rows[newer]] = volume[newer]
+            self.updated[rows[newer]] = updated[newer]
+        return int((updated > 0).sum())
+
+    def stale_symbols(self, max_age: float = QUOTE_STALE_SECONDS) -> List[str]:
+        age = time.time() - self.updated
+        return [self.symbols[i] for i in np.flatnonzero((self.updated == 0) | (age > max_age))]
+
+
+# =====================
+# Nguồn giá
+# =====================
+
+def fetch_finfo_quotes(symbols: List[str]) -> Dict[str, dict]:
+    """Bulk: giá trong ngày của nhiều mã / request từ VNDIRECT stock_prices."""
+    out: Dict[str, dict] = {}
+    headers = {"User-Agent": "Mozilla/5.0", "Accept": "application/json"}
+    today = time.strftime("%Y-%m-%d", time.gmtime(time.time() + 7 * 3600))  # ngày theo giờ VN
+    for i in range(0, len(symbols), FINFO_BATCH):
+        batch = symbols[i:i + FINFO_BATCH]
+        params = {"q": f"code:{','.join(batch)}~date:gte:{today}", "size": len(batch) * 2, "sort": "date"}
+        r = requests.get(FINFO_PRICES, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        for row in r.json().get("data") or []:
+            if row.get("close") is None:
+                continue
+            out[row["code"]] = {
+                "O": float(row.get("open") or row["close"]),
+                "H": float(row.get("high") or row["close"]),
+                "L": float(row.get("low") or row["close"]),
+                "C": float(row["close"]),
+                "V": int(row.get("nmVolume") or 0),
+            }
+    return out
+
+
+def fetch_dchart_quotes(symbols: List[str], bar_cache, workers: int = 16) -> Dict[str, dict]:
+    """Từng mã: nến 1 phút mới qua BarCache (request nhỏ, tăng dần) rồi gộp thành nến ngày."""
+    out: Dict[str, dict] = {}
+
+    def one(sym: str):
+        bar = bar_cache.live_bar(sym)
+        if bar is not None:
+            out[sym] = bar
+
+    with futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(one, symbols))
+    return out
+
+
+class QuotePoller(threading.Thread):
+    """Thread nền làm mới QuoteTable cho cả universe theo chu kỳ cố định."""
+
+    def __init__(self, table: QuoteTable, symbols: Callable[[], List[str]], bar_cache=None,
+                 interval: float = QUOTE_REFRESH_SECONDS, source: str = QUOTE_SOURCE,
+                 market_open: Callable[[], bool] = lambda: True, persist_path: str = QUOTES_FILE):
+        super().__init__(name="quote-poller", daemon=True)
+        self.table = table
+        self.symbols = symbols
+        self.bar_cache = bar_cache
+        self.interval = interval
+        self.source = source
+        self.market_open = market_open
+        self.persist_path = persist_path
+        self._stop_event = threading.Event()
+        self._finfo_down_until = 0.0
+        self.cycles = 0
+        self.last_cycle_seconds = 0.0
+        self.last_source = ""
+
+    def stop(self):
+        self._stop_event.set()
+
+    def poll_once(self) -> List[str]:
+        syms = self.symbols()
+        self.table.ensure(syms)
+        quotes: Dict[str, dict] = {}
+        use_finfo = self.source == "finfo" or (self.source == "auto" and time.time() >= self._finfo_down_until)
+        if use_finfo:
+            try:
+                quotes = fetch_finfo_quotes(syms)
+                self.last_source = "finfo"
+            except Exception as e:
+                print(f"⚠️ Bulk quote lỗi ({e}), chuyển sang dchart")
+                self._finfo_down_until = time.time() + FINFO_RETRY_AFTER
+        if not quotes and self.bar_cache is not None and self.source != "finfo":
+            quotes = fetch_dchart_quotes(syms, self.bar_cache)
+            self.last_source = "dchart"
+        return self.table.update_many(quotes)
+
+    def run(self):
+        print(f"📡 Quote poller: {self.interval:.0f}s/lần, nguồn {self.source}")
+        while not self._stop_event.is_set():
+            t0 = time.time()
+            if self.market_open():
+                try:
+                    changed = self.poll_once()
+                    self.cycles += 1
+                    self.table.save(self.persist_path)
+                    st = self.table.staleness()
+                    if st["stale"] or st["missing"]:
+                        print(f"⚠️ Bảng giá: {st['fresh']} mới, {st['stale']} cũ, {st['missing']} chưa có "
+                              f"({len(changed)} mã đổi giá, nguồn {self.last_source})")
+                except Exception as e:
+                    print(f"❌ Lỗi quote poller: {e}")
+            self.last_cycle_seconds = time.time() - t0
+            self._stop_event.wait(max(0.0, self.interval - self.last_cycle_seconds))
+
+    def status(self) -> dict:
+        return {"interval": self.interval, "source": self.last_source or self.source,
+                "cycles": self.cycles, "last_cycle_seconds": round(self.last_cycle_seconds, 2),
+                **self.table.staleness()}
@@ -0,0 +1,136 @@
+"""
+Kết quả scan dạng trang cho Telegram: render 1 lần, xem bằng nút inline (sửa 1 tin nhắn)
+- Mỗi kết quả (bộ lọc + thời điểm quét) được lưu phía server, chia nhóm tín hiệu và trang;
+  mọi trang được render sẵn (HTML + bàn phím) nên chuyển trang không render/quét lại
+- callback_data dạng "pg:<id>:<nhóm>:<trang>" (dưới giới hạn 64 byte của Telegram)
+- Giữ tối đa RESULT_PAGES_MAX kết quả gần nhất, cũ hơn thì báo hết hạn
+"""
+from __future__ import annotations
+import os, time, hashlib, threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", 20))   # mã mỗi trang
+RESULT_PAGES_MAX = int(os.getenv("RESULT_PAGES_MAX", 200))  # số kết quả giữ trong bộ nhớ
+PAGE_TEXT_LIMIT = 4000  # dưới 4096 của Telegram
+CALLBACK_PREFIX = "pg"
+NOOP = f"{CALLBACK_PREFIX}:noop"
+
+
+class Group:
+    """Nhóm tín hiệu: nhãn nút + tiêu đề + các dòng (1 dòng hoặc vài dòng / mã)."""
+
+    __slots__ = ("key", "label", "title", "items")
+
+    def __init__(self, key: str, label: str, title: str, items: List[str]):
+        self.key, self.label, self.title, self.items = key, label, title, items
+
+
+class PagedResult:
+    """Các trang đã render của 1 kết quả scan."""
+
+    def __init__(self, rid: str, header: str, groups: List[Group], footer: str, page_size: int):
+        self.rid = rid
+        self.created = time.time()
+        self.groups = [g for g in groups if g.items]
+        self.pages: List[List[Tuple[str, Optional[InlineKeyboardMarkup]]]] = []
+        for gi, g in enumerate(self.groups):
+            chunks = _paginate(g.items, page_size, PAGE_TEXT_LIMIT - len(header) - len(footer) - len(g.title) - 64)
+            self.pages.append([self._render(header, g, gi, pi, len(chunks), chunk, footer)
+                               for pi, chunk in enumerate(chunks)])
+
+    @property
+    def empty(self) -> bool:
+        return not self.groups
+
+    def page(self, group: int = 0, page: int = 0) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        group = min(max(group, 0), len(self.pages) - 1)
+        pages = self.pages[group]
+        return pages[min(max(page, 0), len(pages) - 1)]
+
+    def _render(self, header: str, g: Group, gi: int, pi: int, n_pages: int, chunk: List[str],
+                footer: str) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        page_note = f" <i>(trang {pi + 1}/{n_pages})</i>" if n_pages > 1 else ""
+        text = "\n".join([header, "", f"{g.title} — <b>{len(g.items)}</b> mã{page_note}", "─" * 20, *chunk,
+                          "", footer])
+        rows = []
+        if len(self.groups) > 1:  # nút chọn nhóm, 3 nút / hàng
+            buttons = [InlineKeyboardButton(("• " if i == gi else "") + f"{grp.label} ({len(grp.items)})",
+                                            callback_data=f"{CALLBACK_PREFIX}:{self.rid}:{i}:0")
+                       for i, grp in enumerate(self.groups)]
+            rows += [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+        if n_pages > 1:
+            rows.append([
+                InlineKeyboardButton("◀️ Trước", callback_data=f"{CALLBACK_PREFIX}:{self.rid}:{gi}:{pi - 1}")
+                if pi > 0 else InlineKeyboardButton("·", callback_data=NOOP),
+                InlineKeyboardButton(f"{pi + 1}/{n_pages}", callback_data=NOOP),
+                InlineKeyboardButton("Sau ▶️", callback_data=f"{CALLBACK_PREFIX}:{self.rid}:{gi}:{pi + 1}")
+                if pi < n_pages - 1 else InlineKeyboardButton("·", callback_data=NOOP),
+            ])
+        return text, InlineKeyboardMarkup(rows) if rows else None
+
+
+def _paginate(items: Sequence[str], size: int, max_chars: int) -> List[List[str]]:
+    """Chia theo số mã và theo độ dài (dòng dài như nhóm 'Khác' không làm tràn tin)."""
+    pages, cur, chars = [], [], 0
+    for item in items:
+        if cur and (len(cur) >= size or chars + len(item) + 1 > max_chars):
+            pages.append(cur)
+            cur, chars = [], 0
+        cur.append(item)
+        chars += len(item) + 1
+    return pages + [cur] if cur else pages or [[]]
+
+
+class ResultPages:
+    """Kho kết quả đã render (LRU); cùng 1 kết quả (bộ lọc + thời điểm quét) chỉ render 1 lần."""
+
+    def __init__(self, max_results: int = RESULT_PAGES_MAX, page_size: int = RESULT_PAGE_SIZE):
+        self.max_results, self.page_size = max_results, page_size
+        self._results: "OrderedDict[str, PagedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"rendered": 0, "reused": 0, "views": 0, "expired": 0}
+
+    @staticmethod
+    def result_id(name: str, scanned_at: float, variant: str = "") -> str:
+        return hashlib.blake2s(f"{name}|{scanned_at:.6f}|{variant}".encode(), digest_size=6).hexdigest()
+
+    def put(self, name: str, scanned_at: float, render: Callable[[], Tuple[str, List[Group], str]],
+            variant: str = "") -> PagedResult:
+        """render() -> (header, groups, footer), chỉ gọi khi kết quả chưa có trong kho."""
+        rid = self.result_id(name, scanned_at, variant)
+        with self._lock:
+            hit = self._results.get(rid)
+            if hit is not None:
+                self._results.move_to_end(rid)
+                self.stats["reused"] += 1
+                return hit
+        header, groups, footer = render()
+        result = PagedResult(rid, header, groups, footer, self.page_size)
+        with self._lock:
+            self._results[rid] = result
+            self.stats["rendered"] += 1
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
+
+    def lookup(self, data: str) -> Optional[Tuple[PagedResult, int, int]]:
+        """callback_data -> (kết quả, nhóm, trang); None nếu là nút trống, dữ liệu sai dạng
+        (callback_data do client gửi lên) hoặc kết quả đã hết hạn."""
+        parts = (data or "").split(":")
+        if len(parts) != 4 or parts[0] != CALLBACK_PREFIX:
+            return None
+        try:
+            group, page = int(parts[2]), int(parts[3])
+        except ValueError:
+            return None
+        with self._lock:
+            result = self._results.get(parts[1])
+            if result is None:
+                self.stats["expired"] += 1
+                return None
+            self._results.move_to_end(parts[1])
+            self.stats["views"] += 1
+        return result, group, page
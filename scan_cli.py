@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Quét từ dòng lệnh (cron, job batch), không qua Telegram/Streamlit
+- Chạy 1 hoặc nhiều bộ lọc (mua1, sin, sin2, sin3) trên cả universe hoặc danh sách mã
+- Ghi kết quả JSON Lines / CSV / Parquet (ra file hoặc stdout); log đi stderr
+- Điều khiển số luồng, chế độ quét, deadline toàn lượt, cache nến / snapshot
+- --timing: thời gian từng bộ lọc + số request; --profile: dump cProfile
+
+Run:
+  python scan_cli.py                                   # 4 bộ lọc, JSONL ra stdout
+  python scan_cli.py -f mua1,sin3 --floors HOSE -o out/scan.parquet --only-signals
+  python scan_cli.py -f sin --symbols FPT,VNM,HPG --format csv --timing
+  python scan_cli.py --deadline 120 --workers 50 --profile scan.prof
+"""
+from __future__ import annotations
+import os, sys, csv, json, time, argparse, threading, contextlib
+from typing import Dict, List, Optional
+
+FILTERS = ("mua1", "sin", "sin2", "sin3")
+FORMATS = ("jsonl", "csv", "parquet")
+EXIT_DEADLINE = 2  # có bộ lọc chưa xong khi hết deadline
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Quét cổ phiếu từ dòng lệnh")
+    ap.add_argument("-f", "--filters", default=",".join(FILTERS), help=f"Các bộ lọc, ví dụ mua1,sin3 ({', '.join(FILTERS)})")
+    ap.add_argument("--symbols", default="", help="Danh sách mã, ví dụ FPT,VNM (mặc định: universe)")
+    ap.add_argument("--symbols-file", default="", help="File mã, mỗi dòng 1 mã")
+    ap.add_argument("--floors", default="", help="Chỉ lấy các sàn này, ví dụ HOSE,HNX")
+    ap.add_argument("--limit", type=int, default=0, help="Chỉ quét N mã đầu (thử nhanh)")
+    ap.add_argument("-o", "--output", default="-", help="File kết quả, - = stdout")
+    ap.add_argument("--format", choices=FORMATS, default=None, help="Mặc định theo đuôi file, stdout = jsonl")
+    ap.add_argument("--only-signals", action="store_true", help="Bỏ các dòng không có tín hiệu nào (mua1)")
+    ap.add_argument("--workers", type=int, default=None, help="Số luồng tải/lọc mỗi bộ lọc (MAX_WORKERS)")
+    ap.add_argument("--mode", choices=("thread", "shard", "queue"), default=None, help="SCAN_MODE")
+    ap.add_argument("--parallel-filters", action="store_true", help="Chạy các bộ lọc đồng thời")
+    ap.add_argument("--deadline", type=float, default=0, help="Giây tối đa cho cả lượt (0 = không giới hạn)")
+    ap.add_argument("--no-cache", action="store_true", help="Tắt cache nến (tải lại toàn bộ cửa sổ)")
+    ap.add_argument("--cache-dir", default=None, help="Thư mục cache nến đã chốt (BAR_CACHE_DIR)")
+    ap.add_argument("--no-snapshot", action="store_true", help="Không quét từ snapshot chỉ báo cuối ngày")
+    ap.add_argument("--store", action="store_true", help="Lưu làm kết quả gần nhất (bot trả ngay sau restart)")
+    ap.add_argument("--timing", action="store_true", help="In thời gian từng bước ra stderr")
+    ap.add_argument("--profile", default="", help="Ghi cProfile ra file (.prof) và in top hàm ra stderr")
+    ap.add_argument("--profile-top", type=int, default=25)
+    args = ap.parse_args(argv)
+    args.filters = [f.strip() for f in args.filters.split(",") if f.strip()]
+    bad = [f for f in args.filters if f not in FILTERS]
+    if bad:
+        ap.error(f"bộ lọc không hợp lệ: {', '.join(bad)}")
+    if args.format is None:
+        ext = os.path.splitext(args.output)[1].lower().lstrip(".")
+        args.format = ext if ext in FORMATS else "jsonl"
+    if args.format == "parquet" and args.output == "-":
+        ap.error("parquet cần --output là file")
+    return args
+
+
+def apply_env(args: argparse.Namespace):
+    """Cấu hình đọc lúc import scanner_core -> đặt env trước khi import."""
+    if args.no_cache:
+        os.environ["BAR_CACHE"] = "0"
+    if args.cache_dir is not None:
+        os.environ["BAR_CACHE_DIR"] = args.cache_dir
+    if args.no_snapshot:
+        os.environ["SNAPSHOT_SCAN"] = "0"
+    if args.workers:
+        os.environ["MAX_WORKERS"] = str(args.workers)
+
+
+def resolve_symbols(core, args: argparse.Namespace) -> List[str]:
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    elif args.symbols_file:
+        with open(args.symbols_file, "r", encoding="utf-8") as f:
+            symbols = [line.strip().upper() for line in f if line.strip() and not line.startswith("#")]
+    else:
+        symbols = [s.code for s in core.fetch_all_symbols(args.floors.split(",") if args.floors else None)]
+    return symbols[:args.limit] if args.limit else symbols
+
+
+def run_filters(core, names: List[str], symbols: List[str], mode: Optional[str], parallel: bool,
+                deadline: float, store: bool) -> Dict[str, dict]:
+    """Chạy các bộ lọc trong thread daemon; hết deadline thì trả về phần đã xong."""
+    results: Dict[str, dict] = {n: {"status": "pending"} for n in names}
+
+    def one(name: str):
+        t0 = time.perf_counter()
+        req0 = core.BAR_CACHE.requests
+        try:
+            rows = core.SCAN_FUNCTIONS[name](symbols, mode)
+            if store and rows:
+                core.SCAN_RESULTS.put(name, rows, len(symbols))  # như run_scan
+            results[name] = {"status": "ok", "rows": rows}
+        except Exception as e:
+            results[name] = {"status": "error", "error": str(e), "rows": []}
+        results[name]["seconds"] = round(time.perf_counter() - t0, 3)
+        results[name]["requests"] = core.BAR_CACHE.requests - req0  # gần đúng khi chạy song song
+
+    end = time.time() + deadline if deadline > 0 else None
+    threads = []
+    for name in names:
+        t = threading.Thread(target=one, args=(name,), name=f"scan-{name}", daemon=True)
+        threads.append(t)
+        t.start()
+        if not parallel:
+            t.join(None if end is None else max(0.0, end - time.time()))
+            if t.is_alive():
+                break
+    for t in threads:
+        t.join(None if end is None else max(0.0, end - time.time()))
+    for name, res in results.items():
+        if res["status"] == "pending":
+            res.update(status="deadline", rows=[])
+    return results
+
+
+class ThreadProfiler:
+    """cProfile cho mọi thread (luồng quét + thread pool fetch), gộp lại khi in/dump.
+
+    cProfile chỉ đo thread gọi enable(); threading.setprofile gắn 1 Profile riêng cho
+    mỗi thread tạo ra sau start()."""
+
+    def __init__(self):
+        import cProfile
+        self._new = cProfile.Profile
+        self._lock = threading.Lock()
+        self.profiles = []
+
+    def _hook(self, *_):
+        sys.setprofile(None)
+        p = self._new()
+        with self._lock:
+            self.profiles.append(p)
+        p.enable()
+
+    def start(self):
+        threading.setprofile(self._hook)
+        self._hook()
+
+    def stop(self):
+        threading.setprofile(None)
+        for p in self.profiles:
+            p.disable()
+
+    def report(self, path: str, top: int):
+        import pstats
+        stats = pstats.Stats(*self.profiles, stream=sys.stderr)
+        stats.dump_stats(path)
+        print(f"🧪 cProfile {len(self.profiles)} thread -> {path} (xem: python -m pstats {path})", file=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(top)
+
+
+def has_signal(row: dict) -> bool:
+    return any(v is True for k, v in row.items() if k not in ("symbol", "price", "pct"))
+
+
+def write_rows(rows: List[dict], fmt: str, output: str, stdout):
+    if fmt == "parquet":
+        import pandas as pd
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        try:
+            pd.DataFrame(rows).to_parquet(output, index=False)
+        except ImportError as e:
+            raise SystemExit(f"❌ Ghi parquet cần pyarrow hoặc fastparquet: {e}")
+        return
+    if output != "-":
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with (open(output, "w", encoding="utf-8", newline="") if output != "-" else contextlib.nullcontext(stdout)) as f:
+        if fmt == "jsonl":
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        else:
+            columns = list(dict.fromkeys(k for r in rows for k in r))
+            w = csv.DictWriter(f, fieldnames=columns)
+            w.writeheader()
+            w.writerows(rows)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    apply_env(args)
+    stdout = sys.stdout
+    timing = {}
+    t_start = time.perf_counter()
+    profiler = ThreadProfiler() if args.profile else None
+    with contextlib.redirect_stdout(sys.stderr):  # log của scanner không lẫn vào kết quả
+        t0 = time.perf_counter()
+        import scanner_core as core
+        timing["import"] = round(time.perf_counter() - t0, 3)
+        if profiler is not None:  # bỏ qua thời gian import (xem bench_scan.py imports)
+            profiler.start()
+        t0 = time.perf_counter()
+        symbols = resolve_symbols(core, args)
+        timing["symbols"] = round(time.perf_counter() - t0, 3)
+        print(f"🔎 {', '.join(args.filters)} trên {len(symbols)} mã"
+              f"{f' (deadline {args.deadline:.0f}s)' if args.deadline else ''}")
+        results = run_filters(core, args.filters, symbols, args.mode, args.parallel_filters,
+                              args.deadline, args.store)
+    if profiler is not None:
+        profiler.stop()
+
+    rows = []
+    for name in args.filters:
+        for r in results[name].get("rows", []):
+            if args.only_signals and not has_signal(r):
+                continue
+            rows.append({"filter": name, **r})
+    t0 = time.perf_counter()
+    write_rows(rows, args.format, args.output, stdout)
+    timing["write"] = round(time.perf_counter() - t0, 3)
+    timing["total"] = round(time.perf_counter() - t_start, 3)
+
+    missed = [n for n in args.filters if results[n]["status"] != "ok"]
+    for n in missed:
+        print(f"⚠️ {n}: {results[n]['status']} {results[n].get('error', '')}".rstrip(), file=sys.stderr)
+    if args.timing:
+        report = {"timing": timing, "symbols": len(symbols), "rows": len(rows),
+                  "filters": {n: {k: v for k, v in r.items() if k != "rows"} | {"rows": len(r.get("rows", []))}
+                              for n, r in results.items()},
+                  "bar_cache": core.BAR_CACHE.stats(), "providers": core.MARKET_DATA.stats()}
+        print(json.dumps(report, ensure_ascii=False, indent=2), file=sys.stderr)
+    if profiler is not None:
+        profiler.report(args.profile, args.profile_top)
+
+    sys.stdout.flush()
+    if any(results[n]["status"] == "deadline" for n in args.filters):
+        sys.stderr.flush()
+        os._exit(EXIT_DEADLINE)  # thread quét còn chạy: không chờ pool của scanner
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Chọn chế độ chạy cho các hàm scan_symbols*:
+- thread : 1 process, ThreadPoolExecutor (mặc định, như cũ)
+- shard  : coordinator chia danh sách mã cho nhiều process, mỗi process có
+           thread pool fetch riêng; kết quả gộp tất định theo thứ tự đầu vào
+- queue  : submit job vào hàng đợi SQLite (work_queue.py), worker ở process/host
+           khác thực hiện quét; hàm scan chỉ còn là thin client
+
+Cấu hình qua env: SCAN_MODE, SCAN_PROCESSES, SHARD_MIN_SYMBOLS
+"""
+from __future__ import annotations
+import os, sys, time, functools, importlib
+import concurrent.futures as futures
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCAN_MODE = os.getenv("SCAN_MODE", "thread")
+SCAN_PROCESSES = int(os.getenv("SCAN_PROCESSES", os.cpu_count() or 2))
+SHARD_MIN_SYMBOLS = int(os.getenv("SHARD_MIN_SYMBOLS", 1000))  # dưới ngưỡng này chạy thread cho nhanh
+
+# name -> (module, hàm scan local chưa bọc)
+SCANNERS: Dict[str, Tuple[str, Callable[[List[str]], List[dict]]]] = {}
+
+
+def _module_name(fn: Callable) -> str:
+    """Tên module import được từ process con (khi chạy `python app.py` module là __main__)."""
+    mod = fn.__module__
+    if mod == "__main__":
+        main_file = getattr(sys.modules["__main__"], "__file__", "") or ""
+        mod = os.path.splitext(os.path.basename(main_file))[0]
+    return mod
+
+
+def scanner(name: str):
+    """Đăng ký hàm scan dưới tên `name` và định tuyến theo SCAN_MODE.
+
+    Hàm gốc vẫn gọi được qua `.local(symbols)` (worker dùng để tránh đệ quy).
+    """
+    def deco(fn: Callable[[List[str]], List[dict]]):
+        SCANNERS[name] = (_module_name(fn), fn)
+
+        @functools.wraps(fn)
+        def wrapper(symbols: List[str], mode: Optional[str] = None) -> List[dict]:
+            mode = mode or SCAN_MODE
+            if mode == "shard" and len(symbols) >= SHARD_MIN_SYMBOLS:
+                return scan_sharded(name, symbols)
+            if mode == "queue":
+                from work_queue import scan_via_queue  # import muộn: work_queue import module này
+                return scan_via_queue(name, symbols)
+            return fn(symbols)
+
+        wrapper.local = fn
+        wrapper.scan_name = name
+        return wrapper
+    return deco
+
+
+def local_scanner(name: str, module: Optional[str] = None) -> Callable[[List[str]], List[dict]]:
+    """Lấy hàm scan gốc theo tên, import module đăng ký nếu process chưa có.
+
+    Process con (fork hoặc spawn) có thể chưa import module chứa scanner,
+    ví dụ khi process cha chạy `python app.py` (module là __main__).
+    """
+    module = module or (SCANNERS[name][0] if name in SCANNERS else None)
+    if module and module not in sys.modules:
+        importlib.import_module(module)
+    if name not in SCANNERS:
+        raise KeyError(f"Không có scanner '{name}'")
+    return SCANNERS[name][1]
+
+
+def _run_shard(module: str, name: str, symbols: List[str]) -> List[dict]:
+    """Chạy trong process con: quét một shard bằng thread pool riêng của process."""
+    return local_scanner(name, module)(symbols)
+
+
+def merge_rows(symbols: List[str], parts: List[List[dict]]) -> List[dict]:
+    """Gộp kết quả các shard theo đúng thứ tự mã đầu vào (tất định)."""
+    order = {s: i for i, s in enumerate(symbols)}
+    rows = [r for part in parts for r in part]
+    rows.sort(key=lambda r: order.get(r.get("symbol"), len(order)))
+    return rows
+
+
+def scan_sharded(name: str, symbols: List[str], processes: int = 0) -> List[dict]:
+    """Chia `symbols` theo kiểu xen kẽ (cân bằng sàn) cho nhiều process rồi gộp.
+
+    Shard lỗi (process con chết, lỗi import...) được quét lại trong process này bằng thread pool;
+    vẫn lỗi thì raise, không trả về kết quả thiếu mã."""
+    module, local = SCANNERS[name]
+    n = max(1, min(processes or SCAN_PROCESSES, len(symbols)))
+    shards = [symbols[i::n] for i in range(n)]
+    t0 = time.time()
+    parts: List[List[dict]] = []
+    failed: List[int] = []
+    with futures.ProcessPoolExecutor(max_workers=n) as ex:
+        jobs = [ex.submit(_run_shard, module, name, shard) for shard in shards]
+        for i, job in enumerate(jobs):
+            try:
+                parts.append(job.result())
+            except Exception as e:
+                print(f"❌ Shard {i + 1}/{n} lỗi, quét lại trong process chính: {e}")
+                failed.append(i)
+    for i in failed:
+        parts.append(local(shards[i]))  # lỗi ở đây lan ra người gọi
+    rows = merge_rows(symbols, parts)
+    print(f"✅ Quét {len(symbols)} mã bằng {n} process trong {time.time() - t0:.1f}s ({len(rows)} dòng)")
+    return rows
@@ -0,0 +1,1241 @@
+"""
+Lõi quét cổ phiếu: tải dữ liệu, chỉ báo, bộ lọc MUA 1 / MUA SỊN, hàm scan, dữ liệu chart
+- Không phụ thuộc Telegram/Streamlit/dotenv; plotly chỉ import khi vẽ chart
+- Import không có tác dụng phụ: không gọi mạng, không đọc file, không chạy thread
+  (poller, engine tín hiệu, warm start chỉ chạy khi gọi start_*)
+- Dùng chung cho bot (app.py), web app, job CLI và worker (SCAN_MODE=shard/queue)
+
+Đo thời gian import: python bench_scan.py imports
+"""
+from __future__ import annotations
+import os, time, datetime as dt
+BOOT_TIME = time.time()  # mốc đo thời gian khởi động -> câu trả lời đầu tiên (warm_start.py)
+import concurrent.futures as futures
+from typing import List, Dict, Tuple, Optional, Union
+
+import pandas as pd
+import numpy as np
+
+from symbol_registry import REGISTRY, SymbolInfo
+from scan_dispatch import scanner
+from bar_cache import BarCache, vn_now
+from trading_calendar import CALENDAR
+from timeframes import TIMEFRAMES, TIMEFRAME_LABELS, MINUTE_TIMEFRAMES, resample_daily, lookback_days, max_bars
+from quote_poller import QuoteTable, QuotePoller
+from providers import MarketData, ProviderError
+from bars import Bars
+from market_panel import MarketPanel
+import indicator_snapshot
+from warm_start import ScanResultStore, BootClock, warm_start
+from signal_engine import SignalEngine
+from watchlist import WatchlistStore, SharedEvaluations
+from price_alerts import PriceAlerts, REF_PATTERN
+
+# API công khai của lõi (cũng là phần app.py re-export cho `from app import ...` cũ)
+__all__ = [
+    # cấu hình
+    "MAX_WORKERS", "FILTER_SESSIONS", "LOOKBACK_MARGIN_SESSIONS", "DAILY_LOOKBACK_SESSIONS", "INTRADAY_MINUTES",
+    "REQUEST_TIMEOUT", "QUOTE_POLLER_ENABLED", "SIGNAL_ENGINE_ENABLED", "PANEL_WRITER_ENABLED",
+    "SNAPSHOT_SCAN_ENABLED", "WARM_START_ENABLED", "BAR_CACHE_ENABLED", "SCAN_FLOORS", "BOOT_TIME",
+    # dữ liệu dùng chung trong process
+    "MARKET_DATA", "BAR_CACHE", "QUOTES", "PANEL", "SNAPSHOTS", "SCAN_RESULTS", "WATCHLISTS", "EVALUATIONS",
+    "BOOT_CLOCK", "ALERTS", "SIGNAL_FILTERS", "FILTER_EXPLAIN", "FILTER_MIN_BARS", "SCAN_FUNCTIONS",
+    # chỉ báo, dữ liệu, bộ lọc, scan
+    "sma", "hhv", "llv", "rsi", "ema", "fetch_all_symbols", "dchart_history", "lookback_window", "daily_history",
+    "bars_history", "snapshot_rows", "fetch_symbol_bundle", "fetch_symbol_bundle_sin", "fetch_symbol_bundle_sin2",
+    "fetch_symbol_bundle_sin3", "apply_filters", "apply_filters_sin", "apply_filters_sin2", "apply_filters_sin3",
+    "explain_filters", "explain_filters_sin", "explain_filters_sin2", "explain_filters_sin3", "scan_symbols",
+    "scan_symbols_sin", "scan_symbols_sin2", "scan_symbols_sin3", "run_scan", "stale_results",
+    "timeframe_error", "supported_timeframes", "scan_timeframe", "evaluate_symbol", "evaluate_watchlist",
+    "watchlist_rows", "alert_reference",
+    # dịch vụ nền
+    "start_quote_poller", "start_warm_start", "start_price_alerts", "get_signal_engine", "start_signal_engine",
+    # chart
+    "fetch_extended_history", "create_candlestick_chart", "get_chart_data",
+]
+
+# =====================
+# Config
+# =====================
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 30))
+# Số phiên nến ngày chỉ báo của từng bộ lọc cần (gồm phiên đang chạy): MUA 1 chỉ dùng cửa sổ trượt
+# (dài nhất MAV50) nên 50 phiên cho kết quả y hệt; EMA phụ thuộc điểm đầu cửa sổ nên các bộ lọc có
+# EMA34/EMA89 dùng chung 90 phiên (cùng cửa sổ với snapshot chỉ báo)
+FILTER_SESSIONS = {"mua1": 50, "sin": 90, "sin2": 90, "sin3": 90}
+LOOKBACK_MARGIN_SESSIONS = 5  # dự phòng mã tạm ngừng giao dịch / ngày nghỉ chưa có trong lịch
+DAILY_LOOKBACK_SESSIONS = max(FILTER_SESSIONS.values()) + LOOKBACK_MARGIN_SESSIONS
+INTRADAY_MINUTES = 1        # resolution for realtime price (dựng nến ngày phiên hiện tại)
+REQUEST_TIMEOUT = 45
+QUOTE_POLLER_ENABLED = os.getenv("QUOTE_POLLER", "1") != "0"  # poller giá nền khi chạy bot
+SIGNAL_ENGINE_ENABLED = os.getenv("SIGNAL_ENGINE", "1") != "0"  # đẩy tín hiệu realtime (/theodoi)
+PANEL_WRITER_ENABLED = os.getenv("PANEL_WRITER", "0") == "1"  # process này ghi panel dùng chung
+SNAPSHOT_SCAN_ENABLED = os.getenv("SNAPSHOT_SCAN", "1") != "0"  # scan từ snapshot chỉ báo cuối ngày
+WARM_START_ENABLED = os.getenv("WARM_START", "1") != "0"  # trả kết quả đã lưu ngay sau restart
+BAR_CACHE_ENABLED = os.getenv("BAR_CACHE", "1") != "0"  # 0 = luôn tải lại toàn bộ cửa sổ
+
+SCAN_FLOORS = os.getenv("SCAN_FLOORS", "")  # ví dụ "HOSE,HNX"; rỗng = toàn thị trường
+
+# VNDIRECT endpoints (DCHART_URL / CAFEF_URL / MARKET_PROVIDERS đọc trong providers.py)
+
+BarsLike = Union[Bars, pd.DataFrame]  # bộ lọc chỉ đọc daily["O".."V"] và len(daily)
+
+# =====================
+# Math helpers
+# =====================
+def sma(series: pd.Series, n: int) -> pd.Series:
+    return series.rolling(n, min_periods=1).mean()
+
+def hhv(series: pd.Series, n: int) -> pd.Series:
+    return series.rolling(n, min_periods=1).max()
+
+def llv(series: pd.Series, n: int) -> pd.Series:
+    return series.rolling(n, min_periods=1).min()
+
+def rsi(close: pd.Series, n: int = 14) -> pd.Series:
+    delta = close.diff()
+    up = np.where(delta > 0, delta, 0.0)
+    down = np.where(delta < 0, -delta, 0.0)
+    ru = pd.Series(up, index=close.index).rolling(n, min_periods=1).mean()
+    rd = pd.Series(down, index=close.index).rolling(n, min_periods=1).mean()
+    rs = ru / rd.replace(0, np.nan)
+    out = 100 - (100 / (1 + rs))
+    return out.fillna(0)
+
+def ema(series: pd.Series, n: int) -> pd.Series:
+    """Exponential Moving Average"""
+    return series.ewm(span=n, adjust=False).mean()
+
+# =====================
+# Data fetchers
+# =====================
+
+def fetch_all_symbols(floors=None) -> List[SymbolInfo]:
+    """Universe mã từ symbol registry (memoize, chỉ đọc lại khi file thay đổi).
+
+    floors: lọc theo sàn, ví dụ ["HOSE", "HNX"]; mặc định lấy theo SCAN_FLOORS.
+    """
+    return REGISTRY.symbols(floors if floors is not None else (SCAN_FLOORS or None))
+
+
+MARKET_DATA = MarketData.from_env()
+
+
+def dchart_history(symbol: str, resolution: str, since_epoch: int, to_epoch: int) -> pd.DataFrame:
+    """
+    Lấy dữ liệu lịch sử giá qua lớp provider (providers.py): VNDIRECT DChart là nguồn chính,
+    CafeF dự phòng cho nến ngày; request chậm được hedge sang nguồn phụ, lỗi thì thử lại.
+    Kết quả luôn cùng dạng O/H/L/C/V, index = date (UTC naive).
+    """
+    return MARKET_DATA.history(symbol, resolution, since_epoch, to_epoch)
+
+
+BAR_CACHE = BarCache(dchart_history, intraday_resolution=str(INTRADAY_MINUTES))
+QUOTES = QuoteTable()
+BAR_CACHE.quotes = QUOTES
+PANEL = MarketPanel()  # panel nến đã chốt dùng chung giữa bot và web app (np.memmap)
+BAR_CACHE.panel = PANEL
+SNAPSHOTS = indicator_snapshot.SnapshotStore()  # snapshot chỉ báo do job cuối ngày dựng
+_QUOTE_POLLER = None
+
+
+def start_quote_poller() -> QuotePoller:
+    """Chạy poller giá nền (1 lần / process); scan, chart và cảnh báo đọc giá từ QUOTES."""
+    global _QUOTE_POLLER
+    if _QUOTE_POLLER is None:
+        _QUOTE_POLLER = QuotePoller(
+            QUOTES,
+            symbols=lambda: [s.code for s in fetch_all_symbols()],
+            bar_cache=BAR_CACHE,
+            market_open=lambda: CALENDAR.trading(vn_now()),  # không poll lúc nghỉ trưa / ngày lễ
+        )
+        # Quote từ poller coi là còn mới trong 2 chu kỳ -> scan không tự gọi API lấy giá
+        BAR_CACHE.quote_max_age = _QUOTE_POLLER.interval * 2
+        _QUOTE_POLLER.start()
+    return _QUOTE_POLLER
+
+
+def lookback_window(filter_name: Optional[str] = None) -> int:
+    """Số ngày lịch để cửa sổ nến ngày hôm nay phủ đúng số phiên bộ lọc cần (mặc định: bộ lọc cần nhiều nhất)."""
+    sessions = FILTER_SESSIONS[filter_name] + LOOKBACK_MARGIN_SESSIONS if filter_name else DAILY_LOOKBACK_SESSIONS
+    return CALENDAR.window_days(sessions, vn_now().date())
+
+
+BAR_CACHE.fetch_lookback = lookback_window  # tải lần đầu đủ cửa sổ lớn nhất, bộ lọc cần ít phiên hơn dùng lại
+
+
+def daily_history(sym: str, lookback_days: Optional[int] = None) -> pd.DataFrame:
+    """Nến ngày: phần đã chốt lấy từ cache, trong giờ giao dịch nến cuối được dựng từ nến 1 phút."""
+    lookback_days = lookback_days or lookback_window()
+    if BAR_CACHE_ENABLED:
+        return BAR_CACHE.daily(sym, lookback_days)
+    now = int(time.time())
+    day_from = int((dt.datetime.utcnow() - dt.timedelta(days=lookback_days)).timestamp())
+    return dchart_history(sym, "D", day_from, now)
+
+
+def bars_history(sym: str, timeframe: str = "D", bars: int = 100) -> pd.DataFrame:
+    """Nến theo khung D/W/M hoặc 1/5/15/60 phút, gộp tại chỗ từ cache (không gọi thêm API)."""
+    span = lookback_days(timeframe, bars) if timeframe in ("W", "M") else lookback_window()
+    if BAR_CACHE_ENABLED:
+        return BAR_CACHE.bars(sym, timeframe, span)
+    if timeframe == "D":
+        return daily_history(sym, span)
+    now = int(time.time())
+    if timeframe == "1" or timeframe in MINUTE_TIMEFRAMES:
+        return dchart_history(sym, timeframe, now - 86400, now)
+    return resample_daily(daily_history(sym, span), timeframe)
+
+
+def snapshot_rows(filter_name: str, symbols: List[str]) -> Tuple[List[dict], List[str]]:
+    """Quét nhanh từ snapshot chỉ báo cuối ngày: chỉ gộp nến đang chạy, không dựng lại chuỗi nến.
+
+    Trả về (rows, các mã còn phải quét đầy đủ); snapshot không dùng được thì trả về ([], symbols)."""
+    if not (SNAPSHOT_SCAN_ENABLED and BAR_CACHE_ENABLED):
+        return [], symbols
+    snap = SNAPSHOTS.usable(vn_now(), lookback_window())
+    if snap is None:
+        return [], symbols
+    try:
+        covered = [s for s in symbols if s in snap.index]
+        with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            live = dict(zip(covered, ex.map(BAR_CACHE.current_bar, covered)))  # có poller: không gọi API
+        return snap.evaluate(filter_name, covered, live, FILTER_MIN_BARS[filter_name])[0], \
+            [s for s in symbols if s not in snap.index]
+    except Exception as e:
+        print(f"⚠️ Lỗi quét từ snapshot ({filter_name}), quét đầy đủ: {e}")
+        return [], symbols
+
+
+def fetch_symbol_bundle(sym: str) -> dict:
+    """Fetches DAILY bars (closed bars cached, today's bar refreshed live) for a symbol."""
+    # Daily history for indicators; nến cuối là nến phiên hiện tại dựng từ nến 1 phút
+    # mảng gọn, không giữ DataFrame trong bundle
+    daily = Bars.from_frame(daily_history(sym, lookback_window("mua1")))
+    if daily.empty or len(daily) < 40:
+        return {"symbol": sym, "error": "no_daily"}
+    last_price = float(daily["C"].iloc[-1])
+    # yesterday close for pct change
+    if len(daily) >= 2:
+        prev_close = float(daily["C"].iloc[-2])
+    else:
+        prev_close = float(daily["C"].iloc[-1])
+    pct = None
+    if prev_close and prev_close > 0:
+        pct = (last_price / prev_close - 1.0) * 100.0
+    else:
+        pct = 0.0
+    return {"symbol": sym, "daily": daily, "price": last_price, "pct": pct}
+
+# =====================
+# Filters (mua 1)
+# =====================
+
+def apply_filters(daily: BarsLike) -> Dict[str, bool]:
+    C,H,L,O,V = [daily[x] for x in ["C","H","L","O","V"]]
+    MA30 = sma(C, 30)
+    RSI14 = rsi(C, 14)
+    HHV5, HHV15 = hhv(C,5), hhv(C,15)
+    LLV10 = llv(C,10)
+    MAV15, MAV50 = sma(V,15), sma(V,50)
+
+    # Điều kiện nền tăng (theo bộ lọc chuẩn MUA 1)
+    base = (
+        (C >= C.shift(1)) & (C >= C.shift(2)) & (C >= C.shift(3)) & (C >= C.shift(4)) &  # Giá hiện tại ≥ TẤT CẢ 4 phiên trước
+        (C > MA30) &         # Giá > MA30
+        (C.shift(1) < 1.04 * C.shift(2))  # Ngày hôm qua không tăng quá 4%
+    )
+    # Điều kiện phá đỉnh ngắn hạn
+    breakout = (HHV5 >= HHV15) & (C > 1.01 * C.shift(1))
+
+    # 1. Mua Breakout = Nền tăng + Phá đỉnh
+    mua_break = bool(base.iloc[-1] and breakout.iloc[-1])
+    
+    # 2. Mua Thường = Nền tăng + Không phá đỉnh
+    mua_thuong = bool(base.iloc[-1] and (not breakout.iloc[-1]))
+
+    # 3. Bán (Sell): Giá đóng cửa ≤ đáy của 8 phiên liên tiếp
+    LLV8 = llv(C, 8)
+    ban = bool((C <= LLV8).iloc[-1])
+
+    # 4. Short: Giá giảm liên tục 4 ngày HOẶC giá ≤ 95% đỉnh gần nhất + điều kiện kỹ thuật
+    giam_lien_tuc_4_ngay = (
+        (C < C.shift(1)) & (C.shift(1) < C.shift(2)) & 
+        (C.shift(2) < C.shift(3)) & (C.shift(3) < C.shift(4))
+    )
+    gia_duoi_95_dinh = C <= 0.95 * hhv(H, 20)  # đỉnh 20 phiên gần nhất
+    short = bool((
+        (giam_lien_tuc_4_ngay | gia_duoi_95_dinh) & 
+        ((C * V) >= 1_000_000) & (C >= 5)
+    ).iloc[-1])
+
+    # 5. Cover: Phục hồi sau nhịp giảm với thanh khoản tốt
+    cover = bool((
+        (C > 1.02 * H.shift(1)) & (C >= H.shift(2)) &
+        ((V >= 1.3 * MAV15) | (V >= 1.3 * MAV50)) &
+        (C > O) & (C > MA30) & ((C * V) >= 1_000_000) & (C >= 5) &
+        (C < 1.15 * LLV10)  # Không quá nóng
+    ).iloc[-1])
+
+    # 6. Sideway: Thị trường đi ngang chặt, chuẩn bị bứt phá
+    bien_do_5_ngay = (hhv(H, 5) - llv(L, 5)) / llv(L, 5)
+    bien_do_10_ngay = (hhv(H, 10) - llv(L, 10)) / llv(L, 10)
+    sideway = bool((
+        (bien_do_5_ngay <= 0.10) & (bien_do_10_ngay <= 0.15) &  # Biên độ hẹp
+        (C >= 5) & (C <= 200) &  # Vùng giá hợp lý
+        ((C * V) >= 1_000_000) & (MAV15 > 50_000) &  # Thanh khoản tốt
+        (C > MA30) &  # Trên MA30
+        (RSI14 >= 53) & (RSI14 <= 60) &  # RSI trong vùng trung tính tích cực
+        (C >= 1.01 * C.shift(1))  # Hôm nay tăng nhẹ
+    ).iloc[-1])
+
+    return {
+        "BuyBreak": mua_break,
+        "BuyNormal": mua_thuong,
+        "Sell": ban,
+        "Short": short,
+        "Cover": cover,
+        "Sideway": sideway,
+    }
+
+# =====================
+# Bộ Lọc MUA SỊN (Hoàn toàn mới - độc lập)
+# =====================
+
+def apply_filters_sin(daily: BarsLike) -> Dict[str, bool]:
+    """
+    Bộ lọc MUA SỊN - Logic riêng theo yêu cầu user:
+    
+    Phiên hiện tại:
+    - Giá cao nhất trong phiên >= giá cao nhất 4 phiên trước * 99%
+    - Tại thời điểm quét, giá dương (không âm)
+    
+    Phiên trước:
+    - Nến đỏ (C < O), giảm không quá 2%
+    - Volume < Volume MA20
+    
+    Điều kiện chung:
+    - Nằm trên EMA 34
+    """
+    if len(daily) < 40:  # Cần đủ dữ liệu
+        return {"BuySin": False}
+    
+    C, H, L, O, V = [daily[x] for x in ["C", "H", "L", "O", "V"]]
+    
+    # Tính toán các chỉ báo cần thiết
+    EMA34 = ema(C, 34)
+    VOL_MA20 = sma(V, 20)
+    
+    # === ĐIỀU KIỆN PHIÊN HIỆN TẠI (phiên cuối - index -1) ===
+    # 1. Giá cao nhất hiện tại >= giá cao nhất 4 phiên trước * 99%
+    h_current = H.iloc[-1]  # Giá cao nhất phiên hiện tại
+    h_4_sessions_ago = H.iloc[-5]  # Giá cao nhất 4 phiên trước
+    condition_high = h_current >= (h_4_sessions_ago * 0.99)
+    
+    # 2. Giá hiện tại dương (so với phiên trước)
+    c_current = C.iloc[-1]  # Giá đóng cửa hiện tại
+    c_previous = C.iloc[-2]  # Giá đóng cửa phiên trước
+    condition_positive = c_current > c_previous
+    
+    # === ĐIỀU KIỆN PHIÊN TRƯỚC (index -2) ===
+    # 3. Nến đỏ (C < O) phiên trước
+    c_prev = C.iloc[-2]
+    o_prev = O.iloc[-2] 
+    condition_red_candle = c_prev < o_prev
+    
+    # 4. Giảm không quá 2% phiên trước
+    c_before_prev = C.iloc[-3]  # Giá đóng cửa 2 phiên trước
+    pct_change_prev = (c_prev / c_before_prev - 1) * 100
+    condition_down_max_2pct = -2 <= pct_change_prev < 0
+    
+    # 5. Volume phiên trước < Volume MA20
+    v_prev = V.iloc[-2]
+    vol_ma20_prev = VOL_MA20.iloc[-2]
+    condition_low_volume = v_prev < vol_ma20_prev
+    
+    # === ĐIỀU KIỆN CHUNG ===
+    # 6. Giá hiện tại nằm trên EMA 34
+    ema34_current = EMA34.iloc[-1]
+    condition_above_ema34 = c_current > ema34_current
+    
+    # === KẾT HỢP TẤT CẢ ĐIỀU KIỆN ===
+    mua_sin = bool(
+        condition_high and          # H hiện tại >= H[-4] * 99%
+        condition_positive and      # Giá hiện tại dương
+        condition_red_candle and    # Nến đỏ phiên trước
+        condition_down_max_2pct and # Giảm không quá 2% phiên trước
+        condition_low_volume and    # Volume thấp phiên trước
+        condition_above_ema34       # Nằm trên EMA34
+    )
+    
+    return {
+        "BuySin": mua_sin,
+        # Debug thông tin (có thể bỏ comment để debug)
+        # "debug_high": condition_high,
+        # "debug_positive": condition_positive, 
+        # "debug_red": condition_red_candle,
+        # "debug_down2pct": condition_down_max_2pct,
+        # "debug_lowvol": condition_low_volume,
+        # "debug_ema34": condition_above_ema34,
+    }
+
+# =====================
+# Bộ Lọc MUA SỊN 2 (Hoàn toàn mới - độc lập)
+# =====================
+
+def apply_filters_sin2(daily: BarsLike) -> Dict[str, bool]:
+    """
+    Bộ lọc MUA SỊN 2 - Logic theo yêu cầu user:
+    
+    Phiên hiện tại:
+    - Không thấp hơn 4 phiên trước
+    - Giá hiện tại dương (tăng)
+    - Giá tăng không quá 3%
+    
+    Phiên trước:
+    - Giảm không quá 3%
+    
+    Điều kiện chung:
+    - Giá nằm trên EMA 34 và EMA 89 và MA 50
+    """
+    if len(daily) < 90:  # Cần đủ dữ liệu cho EMA 89
+        return {"BuySin2": False}
+    
+    C, H, L, O, V = [daily[x] for x in ["C", "H", "L", "O", "V"]]
+    
+    # Tính toán các chỉ báo cần thiết
+    EMA34 = ema(C, 34)
+    EMA89 = ema(C, 89)
+    MA50 = sma(C, 50)
+    
+    # === ĐIỀU KIỆN PHIÊN HIỆN TẠI (phiên cuối - index -1) ===
+    c_current = C.iloc[-1]  # Giá đóng cửa hiện tại
+    c_4_sessions_ago = C.iloc[-5]  # Giá đóng cửa 4 phiên trước
+    c_previous = C.iloc[-2]  # Giá đóng cửa phiên trước
+    
+    # 1. Không thấp hơn 4 phiên trước
+    condition_not_lower_than_4sessions = c_current >= c_4_sessions_ago
+    
+    # 2. Giá hiện tại dương (tăng so với phiên trước)
+    condition_positive_current = c_current > c_previous
+    
+    # 3. Giá tăng không quá 3%
+    pct_change_current = (c_current / c_previous - 1) * 100
+    condition_increase_max_3pct = 0 < pct_change_current <= 3
+    
+    # === ĐIỀU KIỆN PHIÊN TRƯỚC (index -2) ===
+    c_prev = C.iloc[-2]
+    c_before_prev = C.iloc[-3]  # Giá đóng cửa 2 phiên trước
+    
+    # 4. Giảm không quá 3% phiên trước
+    pct_change_prev = (c_prev / c_before_prev - 1) * 100
+    condition_decrease_max_3pct = -3 <= pct_change_prev < 0
+    
+    # === ĐIỀU KIỆN CHUNG ===
+    # 7. Giá hiện tại nằm trên EMA 34, EMA 89 và MA 50
+    ema34_current = EMA34.iloc[-1]
+    ema89_current = EMA89.iloc[-1]
+    ma50_current = MA50.iloc[-1]
+    
+    condition_above_ema34 = c_current > ema34_current
+    condition_above_ema89 = c_current > ema89_current
+    condition_above_ma50 = c_current > ma50_current
+    
+    # === KẾT HỢP TẤT CẢ ĐIỀU KIỆN ===
+    mua_sin2 = bool(
+        condition_not_lower_than_4sessions and  # Không thấp hơn 4 phiên trước
+        condition_positive_current and          # Giá hiện tại dương
+        condition_increase_max_3pct and         # Tăng không quá 3%
+        condition_decrease_max_3pct and         # Giảm không quá 3% phiên trước
+        condition_above_ema34 and               # Nằm trên EMA34
+        condition_above_ema89 and               # Nằm trên EMA89
+        condition_above_ma50                    # Nằm trên MA50
+    )
+    
+    return {
+        "BuySin2": mua_sin2,
+        # Debug thông tin (có thể bỏ comment để debug)
+        # "debug_not_lower_4": condition_not_lower_than_4sessions,
+        # "debug_positive": condition_positive_current,
+        # "debug_increase_3pct": condition_increase_max_3pct,
+        # "debug_decrease_3pct": condition_decrease_max_3pct,
+        # "debug_ema34": condition_above_ema34,
+        # "debug_ema89": condition_above_ema89,
+        # "debug_ma50": condition_above_ma50,
+    }
+
+def apply_filters_sin3(daily: BarsLike) -> Dict[str, bool]:
+    """
+    Bộ lọc MUA SỊN 3 - Logic mới theo yêu cầu:
+    
+    Phiên hiện tại:
+    - Giá dương, tăng không quá 3%
+    - Giá không thấp hơn giá thấp nhất 4 phiên gần nhất
+    
+    Phiên trước:
+    - Giá đóng cửa giảm không quá 3%, tăng không quá 3%
+    
+    Điều kiện chung:
+    - Giá nằm trên EMA34, EMA89 và MA50
+    """
+    if len(daily) < 90:  # Cần đủ dữ liệu cho EMA89
+        return {"BuySin3": False}
+    
+    C, H, L, O, V = [daily[x] for x in ["C", "H", "L", "O", "V"]]
+    
+    # Tính toán các chỉ báo cần thiết
+    EMA34 = ema(C, 34)
+    EMA89 = ema(C, 89)
+    MA50 = sma(C, 50)
+    
+    # === ĐIỀU KIỆN PHIÊN HIỆN TẠI (phiên cuối - index -1) ===
+    c_current = C.iloc[-1]  # Giá đóng cửa hiện tại
+    c_previous = C.iloc[-2]  # Giá đóng cửa phiên trước
+    l_current = L.iloc[-1]  # Giá thấp nhất hiện tại
+    
+    # 1. Giá dương, tăng không quá 3%
+    pct_change_current = (c_current / c_previous - 1) * 100
+    condition_positive_max_3pct = 0 < pct_change_current <= 3
+    
+    # 2. Giá không thấp hơn giá thấp nhất 4 phiên gần nhất
+    l_recent_4 = L.iloc[-4:].min()  # Giá thấp nhất trong 4 phiên gần nhất
+    condition_above_low_4sessions = l_current >= l_recent_4
+    
+    # === ĐIỀU KIỆN PHIÊN TRƯỚC (index -2) ===
+    c_prev = C.iloc[-2]  # Giá đóng cửa phiên trước
+    c_before_prev = C.iloc[-3]  # Giá đóng cửa 2 phiên trước
+    
+    # 3. Giá đóng cửa phiên trước: giảm không quá 3%, tăng không quá 3%
+    pct_change_prev = (c_prev / c_before_prev - 1) * 100
+    condition_prev_range_3pct = -3 <= pct_change_prev <= 3
+    
+    # === ĐIỀU KIỆN CHUNG ===
+    # 4. Giá hiện tại nằm trên EMA34, EMA89 và MA50
+    ema34_current = EMA34.iloc[-1]
+    ema89_current = EMA89.iloc[-1] 
+    ma50_current = MA50.iloc[-1]
+    
+    condition_above_ema34 = c_current > ema34_current
+    condition_above_ema89 = c_current > ema89_current
+    condition_above_ma50 = c_current > ma50_current
+    
+    # === KẾT HỢP TẤT CẢ ĐIỀU KIỆN ===
+    mua_sin3 = bool(
+        condition_positive_max_3pct and        # Tăng dương không quá 3%
+        condition_above_low_4sessions and      # Không thấp hơn thấp nhất 4 phiên
+        condition_prev_range_3pct and          # Phiên trước trong khoảng ±3%
+        condition_above_ema34 and              # Trên EMA34
+        condition_above_ema89 and              # Trên EMA89
+        condition_above_ma50                   # Trên MA50
+    )
+    
+    return {
+        "BuySin3": mua_sin3,
+        # Debug thông tin (có thể bỏ comment để debug)
+        # "debug_positive_max_3pct": condition_positive_max_3pct,
+        # "debug_above_low_4sessions": condition_above_low_4sessions,
+        # "debug_prev_range_3pct": condition_prev_range_3pct,
+        # "debug_above_ema34": condition_above_ema34,
+        # "debug_above_ema89": condition_above_ema89,
+        # "debug_above_ma50": condition_above_ma50,
+    }
+
+# =====================
+# Giải thích từng điều kiện (/check): cùng công thức với apply_filters*, trả về
+# [(tín hiệu, mô tả kèm giá trị, đạt?)]; kết luận cuối vẫn lấy từ apply_filters*
+# =====================
+
+Condition = Tuple[str, str, bool]
+
+
+def _last(series: pd.Series, k: int = 0) -> float:
+    return float(series.iloc[-1 - k])
+
+
+def _pct(a: float, b: float) -> float:
+    return (a / b - 1) * 100 if b else 0.0
+
+
+def explain_filters(daily: BarsLike) -> List[Condition]:
+    C, H, L, O, V = [daily[x] for x in ["C", "H", "L", "O", "V"]]
+    c0, c1, c2, o0, v0 = _last(C), _last(C, 1), _last(C, 2), _last(O), _last(V)
+    prev4 = max(_last(C, k) for k in range(1, 5))
+    ma30, rsi14 = _last(sma(C, 30)), _last(rsi(C, 14))
+    hhv5, hhv15 = _last(hhv(C, 5)), _last(hhv(C, 15))
+    mav15, mav50 = _last(sma(V, 15)), _last(sma(V, 50))
+    base = [
+        (f"Giá {c0:,.2f} ≥ cả 4 phiên trước (cao nhất {prev4:,.2f})", c0 >= prev4),
+        (f"Giá > MA30 ({ma30:,.2f})", c0 > ma30),
+        (f"Phiên trước tăng < 4% ({_pct(c1, c2):+.2f}%)", c1 < 1.04 * c2),
+    ]
+    breakout = [(f"HHV5 {hhv5:,.2f} ≥ HHV15 {hhv15:,.2f}", hhv5 >= hhv15),
+                (f"Tăng > 1% ({_pct(c0, c1):+.2f}%)", c0 > 1.01 * c1)]
+    base_ok, breakout_ok = all(ok for _, ok in base), all(ok for _, ok in breakout)
+    llv8, hhv20 = _last(llv(C, 8)), _last(hhv(H, 20))
+    falling = all(_last(C, k) < _last(C, k + 1) for k in range(4))
+    llv10, value = _last(llv(C, 10)), c0 * v0
+    lo5, lo10 = _last(llv(L, 5)), _last(llv(L, 10))
+    range5, range10 = (_last(hhv(H, 5)) - lo5) / lo5, (_last(hhv(H, 10)) - lo10) / lo10
+    rows = [("BuyBreak", label, ok) for label, ok in base + breakout]
+    rows += [("BuyNormal", "Nền tăng (như Mua Break)", base_ok),
+             ("BuyNormal", "Không phá đỉnh", not breakout_ok),
+             ("Sell", f"Giá ≤ đáy 8 phiên ({llv8:,.2f})", c0 <= llv8),
+             ("Short", f"Giảm 4 phiên liên tiếp hoặc ≤ 95% đỉnh 20 phiên ({0.95 * hhv20:,.2f})",
+              falling or c0 <= 0.95 * hhv20),
+             ("Short", f"Giá x KL ≥ 1 triệu ({value:,.0f})", value >= 1_000_000),
+             ("Short", "Giá ≥ 5", c0 >= 5),
+             ("Cover", f"Giá > 102% đỉnh phiên trước ({1.02 * _last(H, 1):,.2f})", c0 > 1.02 * _last(H, 1)),
+             ("Cover", f"Giá ≥ đỉnh 2 phiên trước ({_last(H, 2):,.2f})", c0 >= _last(H, 2)),
+             ("Cover", f"KL {v0:,.0f} ≥ 1.3 x MAV15 ({mav15:,.0f}) hoặc MAV50 ({mav50:,.0f})",
+              v0 >= 1.3 * mav15 or v0 >= 1.3 * mav50),
+             ("Cover", f"Nến xanh (mở cửa {o0:,.2f})", c0 > o0),
+             ("Cover", f"Giá > MA30 ({ma30:,.2f})", c0 > ma30),
+             ("Cover", "Giá x KL ≥ 1 triệu, giá ≥ 5", value >= 1_000_000 and c0 >= 5),
+             ("Cover", f"Chưa quá nóng: < 115% đáy 10 phiên ({1.15 * llv10:,.2f})", c0 < 1.15 * llv10),
+             ("Sideway", f"Biên độ 5 phiên ≤ 10% ({range5 * 100:.1f}%)", range5 <= 0.10),
+             ("Sideway", f"Biên độ 10 phiên ≤ 15% ({range10 * 100:.1f}%)", range10 <= 0.15),
+             ("Sideway", "Giá trong 5-200", 5 <= c0 <= 200),
+             ("Sideway", f"Giá x KL ≥ 1 triệu, MAV15 > 50.000 ({mav15:,.0f})",
+              value >= 1_000_000 and mav15 > 50_000),
+             ("Sideway", f"Giá > MA30 ({ma30:,.2f})", c0 > ma30),
+             ("Sideway", f"RSI14 trong 53-60 ({rsi14:.1f})", 53 <= rsi14 <= 60),
+             ("Sideway", f"Tăng ≥ 1% ({_pct(c0, c1):+.2f}%)", c0 >= 1.01 * c1)]
+    return [(sig, label, bool(ok)) for sig, label, ok in rows]
+
+
+def explain_filters_sin(daily: BarsLike) -> List[Condition]:
+    C, H, O, V = [daily[x] for x in ["C", "H", "O", "V"]]
+    c0, c1, c2 = _last(C), _last(C, 1), _last(C, 2)
+    h0, h4 = _last(H), _last(H, 4)
+    ema34, vol_ma20 = _last(ema(C, 34)), _last(sma(V, 20), 1)
+    prev_pct = _pct(c1, c2)
+    rows = [(f"Đỉnh phiên {h0:,.2f} ≥ 99% đỉnh 4 phiên trước ({0.99 * h4:,.2f})", h0 >= h4 * 0.99),
+            (f"Giá tăng so với phiên trước ({_pct(c0, c1):+.2f}%)", c0 > c1),
+            (f"Phiên trước nến đỏ (mở {_last(O, 1):,.2f}, đóng {c1:,.2f})", c1 < _last(O, 1)),
+            (f"Phiên trước giảm không quá 2% ({prev_pct:+.2f}%)", -2 <= prev_pct < 0),
+            (f"KL phiên trước {_last(V, 1):,.0f} < MA20 ({vol_ma20:,.0f})", _last(V, 1) < vol_ma20),
+            (f"Giá > EMA34 ({ema34:,.2f})", c0 > ema34)]
+    return [("BuySin", label, bool(ok)) for label, ok in rows]
+
+
+def _trend_conditions(C: pd.Series) -> List[Tuple[str, bool]]:
+    c0, ema34, ema89, ma50 = _last(C), _last(ema(C, 34)), _last(ema(C, 89)), _last(sma(C, 50))
+    return [(f"Giá > EMA34 ({ema34:,.2f})", c0 > ema34), (f"Giá > EMA89 ({ema89:,.2f})", c0 > ema89),
+            (f"Giá > MA50 ({ma50:,.2f})", c0 > ma50)]
+
+
+def explain_filters_sin2(daily: BarsLike) -> List[Condition]:
+    C = daily["C"]
+    c0, c1, c2, c4 = _last(C), _last(C, 1), _last(C, 2), _last(C, 4)
+    pct0, pct1 = _pct(c0, c1), _pct(c1, c2)
+    rows = [(f"Giá ≥ 4 phiên trước ({c4:,.2f})", c0 >= c4),
+            (f"Giá tăng so với phiên trước ({pct0:+.2f}%)", c0 > c1),
+            ("Tăng không quá 3%", 0 < pct0 <= 3),
+            (f"Phiên trước giảm không quá 3% ({pct1:+.2f}%)", -3 <= pct1 < 0)] + _trend_conditions(C)
+    return [("BuySin2", label, bool(ok)) for label, ok in rows]
+
+
+def explain_filters_sin3(daily: BarsLike) -> List[Condition]:
+    C, L = daily["C"], daily["L"]
+    c0, c1, c2 = _last(C), _last(C, 1), _last(C, 2)
+    pct0, pct1 = _pct(c0, c1), _pct(c1, c2)
+    low4 = float(L.iloc[-4:].min())
+    rows = [(f"Tăng trong 0-3% ({pct0:+.2f}%)", 0 < pct0 <= 3),
+            (f"Đáy phiên {_last(L):,.2f} ≥ đáy 4 phiên gần nhất ({low4:,.2f})", _last(L) >= low4),
+            (f"Phiên trước trong ±3% ({pct1:+.2f}%)", -3 <= pct1 <= 3)] + _trend_conditions(C)
+    return [("BuySin3", label, bool(ok)) for label, ok in rows]
+
+
+def fetch_symbol_bundle_sin2(sym: str) -> dict:
+    """Fetch data cho bộ lọc Mua Sịn 2 (tương tự fetch_symbol_bundle)"""
+    # Daily history for indicators (nến đã chốt lấy từ cache)
+    daily = Bars.from_frame(daily_history(sym, lookback_window("sin2")))
+    if daily.empty or len(daily) < 90:  # Cần nhiều data hơn cho EMA 89
+        return {"symbol": sym, "error": "no_daily"}
+    
+    # Giá realtime = giá đóng cửa của nến phiên hiện tại
+    last_price = float(daily["C"].iloc[-1])
+    
+    # yesterday close for pct change
+    if len(daily) >= 2:
+        prev_close = float(daily["C"].iloc[-2])
+    else:
+        prev_close = float(daily["C"].iloc[-1])
+    pct = None
+    if prev_close and prev_close > 0:
+        pct = (last_price / prev_close - 1) * 100
+    
+    # Apply filters
+    filters_result = apply_filters_sin2(daily)
+    
+    return {
+        "symbol": sym,
+        "price": last_price,
+        "pct": pct,
+        **filters_result
+    }
+
+def fetch_symbol_bundle_sin3(sym: str) -> dict:
+    """Fetch data cho bộ lọc Mua Sịn 3 (tương tự fetch_symbol_bundle)"""
+    # Daily history for indicators (nến đã chốt lấy từ cache)
+    daily = Bars.from_frame(daily_history(sym, lookback_window("sin3")))
+    if daily.empty or len(daily) < 90:  # Cần đủ data cho EMA89
+        return {"symbol": sym, "error": "no_daily"}
+    
+    # Giá realtime = giá đóng cửa của nến phiên hiện tại
+    last_price = float(daily["C"].iloc[-1])
+    
+    # yesterday close for pct change
+    if len(daily) >= 2:
+        prev_close = float(daily["C"].iloc[-2])
+    else:
+        prev_close = float(daily["C"].iloc[-1])
+    pct = None
+    if prev_close and prev_close > 0:
+        pct = (last_price / prev_close - 1) * 100
+    
+    # Apply filters
+    filters_result = apply_filters_sin3(daily)
+    
+    return {
+        "symbol": sym,
+        "price": last_price,
+        "pct": pct,
+        **filters_result
+    }
+
+def fetch_symbol_bundle_sin(sym: str) -> dict:
+    """Fetch data cho bộ lọc Mua Sịn (tương tự fetch_symbol_bundle)"""
+    # Daily history for indicators (nến đã chốt lấy từ cache)
+    daily = Bars.from_frame(daily_history(sym, lookback_window("sin")))
+    if daily.empty or len(daily) < 40:
+        return {"symbol": sym, "error": "no_daily"}
+    
+    # Giá realtime = giá đóng cửa của nến phiên hiện tại
+    last_price = float(daily["C"].iloc[-1])
+    
+    # yesterday close for pct change
+    if len(daily) >= 2:
+        prev_close = float(daily["C"].iloc[-2])
+    else:
+        prev_close = float(daily["C"].iloc[-1])
+    pct = None
+    if prev_close and prev_close > 0:
+        pct = (last_price / prev_close - 1.0) * 100.0
+    else:
+        pct = 0.0
+    
+    return {"symbol": sym, "daily": daily, "price": last_price, "pct": pct}
+
+@scanner("sin")
+def scan_symbols_sin(symbols: List[str]) -> List[dict]:
+    """Quét thị trường với bộ lọc MUA SỊN"""
+    rows, symbols = snapshot_rows("sin", symbols)
+    try:
+        with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            future_to_symbol = {ex.submit(fetch_symbol_bundle_sin, symbol): symbol for symbol in symbols}
+            
+            for future in futures.as_completed(future_to_symbol, timeout=30):
+                symbol = future_to_symbol[future]
+                try:
+                    bundle = future.result(timeout=5)
+                    if "error" in bundle:
+                        continue
+                    
+                    # Áp dụng bộ lọc MUA SỊN
+                    signals = apply_filters_sin(bundle["daily"])
+                    
+                    # Chỉ giữ những mã có tín hiệu
+                    if any(signals.values()):
+                        row = {
+                            "symbol": bundle["symbol"],
+                            "price": bundle["price"],
+                            "pct": bundle["pct"],
+                            **signals
+                        }
+                        rows.append(row)
+                        
+                except Exception as e:
+                    print(f"❌ Error processing {symbol}: {e}")
+                    continue
+                    
+    except futures.TimeoutError:
+        print("⚠️ Timeout scanning batch")
+    except Exception as e:
+        print(f"❌ Error in scan_symbols_sin: {e}")
+    
+    return rows
+
+@scanner("sin2")
+def scan_symbols_sin2(symbols: List[str]) -> List[dict]:
+    """Quét thị trường với bộ lọc MUA SỊN 2"""
+    rows, symbols = snapshot_rows("sin2", symbols)
+    try:
+        with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            future_to_symbol = {ex.submit(fetch_symbol_bundle_sin2, symbol): symbol for symbol in symbols}
+            
+            for future in futures.as_completed(future_to_symbol, timeout=30):
+                symbol = future_to_symbol[future]
+                try:
+                    bundle = future.result(timeout=5)
+                    if "error" in bundle:
+                        continue
+                    
+                    # Chỉ giữ những mã có tín hiệu BuySin2
+                    if bundle.get("BuySin2", False):
+                        row = {
+                            "symbol": bundle["symbol"],
+                            "price": bundle["price"],
+                            "pct": bundle["pct"],
+                            "BuySin2": bundle["BuySin2"]
+                        }
+                        rows.append(row)
+                        
+                except Exception as e:
+                    print(f"❌ Error processing {symbol}: {e}")
+                    continue
+                    
+    except futures.TimeoutError:
+        print("⚠️ Timeout scanning batch sin2")
+    except Exception as e:
+        print(f"❌ Error in scan_symbols_sin2: {e}")
+    
+    return rows
+
+@scanner("sin3")
+def scan_symbols_sin3(symbols: List[str]) -> List[dict]:
+    """Quét thị trường với bộ lọc MUA SỊN 3"""
+    rows, symbols = snapshot_rows("sin3", symbols)
+    try:
+        with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            future_to_symbol = {ex.submit(fetch_symbol_bundle_sin3, symbol): symbol for symbol in symbols}
+            
+            for future in futures.as_completed(future_to_symbol, timeout=30):
+                symbol = future_to_symbol[future]
+                try:
+                    bundle = future.result(timeout=5)
+                    if "error" in bundle:
+                        continue
+                    
+                    # Chỉ giữ những mã có tín hiệu BuySin3
+                    if bundle.get("BuySin3", False):
+                        row = {
+                            "symbol": bundle["symbol"],
+                            "price": bundle["price"],
+                            "pct": bundle["pct"],
+                            "BuySin3": bundle["BuySin3"]
+                        }
+                        rows.append(row)
+                        
+                except Exception as e:
+                    print(f"❌ Error processing {symbol}: {e}")
+                    continue
+                    
+    except futures.TimeoutError:
+        print("⚠️ Timeout scanning batch sin3")
+    except Exception as e:
+        print(f"❌ Error in scan_symbols_sin3: {e}")
+    
+    return rows
+
+# =====================
+# Orchestrator (Bộ lọc gốc)
+# =====================
+
+@scanner("mua1")
+def scan_symbols(symbols: List[str]) -> List[dict]:
+    rows, symbols = snapshot_rows("mua1", symbols)  # mã có trong snapshot: xong ngay
+    try:
+        with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            # Sử dụng submit thay vì map để có thể set timeout
+            future_to_symbol = {ex.submit(fetch_symbol_bundle, symbol): symbol for symbol in symbols}
+            
+            for future in futures.as_completed(future_to_symbol, timeout=REQUEST_TIMEOUT * 2):
+                try:
+                    res = future.result(timeout=REQUEST_TIMEOUT)
+                    sym = res.get("symbol")
+                    if res.get("error"):
+                        continue
+                    daily: Bars = res["daily"]
+                    sigs = apply_filters(daily)
+                    rows.append({
+                        "symbol": sym,
+                        "price": float(res["price"]),
+                        "pct": float(res["pct"]),
+                        **sigs
+                    })
+                except futures.TimeoutError:
+                    symbol = future_to_symbol[future]
+                    print(f"⚠️ Timeout cho symbol {symbol}")
+                    continue
+                except Exception as e:
+                    symbol = future_to_symbol[future]
+                    print(f"⚠️ Lỗi xử lý symbol {symbol}: {e}")
+                    continue
+                    
+    except (KeyboardInterrupt, futures.TimeoutError) as e:
+        print(f"⚠️ Quá trình quét bị gián đoạn: {e}")
+        # Trả về kết quả đã có được
+        return rows
+    except Exception as e:
+        print(f"❌ Lỗi không mong muốn trong scan_symbols: {e}")
+        return rows
+
+    return rows
+
+# =====================
+# Tín hiệu realtime (signal_engine.py)
+# =====================
+
+SIGNAL_FILTERS = {
+    "mua1": apply_filters,
+    "sin": apply_filters_sin,
+    "sin2": apply_filters_sin2,
+    "sin3": apply_filters_sin3,
+}
+FILTER_EXPLAIN = {
+    "mua1": explain_filters,
+    "sin": explain_filters_sin,
+    "sin2": explain_filters_sin2,
+    "sin3": explain_filters_sin3,
+}
+FILTER_MIN_BARS = {"mua1": 40, "sin": 40, "sin2": 90, "sin3": 90}  # như các fetch_symbol_bundle*
+_SIGNAL_ENGINE = None
+SCAN_FUNCTIONS = {"mua1": scan_symbols, "sin": scan_symbols_sin, "sin2": scan_symbols_sin2,
+                  "sin3": scan_symbols_sin3}
+SCAN_RESULTS = ScanResultStore()  # kết quả scan gần nhất, lưu đĩa để trả lời ngay sau restart
+WATCHLISTS = WatchlistStore()     # danh sách theo dõi của từng chat / người dùng web
+EVALUATIONS = SharedEvaluations()  # 1 lượt đánh giá / mã / WATCHLIST_TTL, dùng chung mọi danh sách
+BOOT_CLOCK = BootClock(BOOT_TIME)
+
+
+def run_scan(filter_name: str, symbols: List[str]) -> List[dict]:
+    """Chạy scanner theo tên và lưu kết quả làm bản "gần nhất" cho lần khởi động sau."""
+    rows = SCAN_FUNCTIONS[filter_name](symbols)
+    if rows:
+        SCAN_RESULTS.put(filter_name, rows, len(symbols))
+    return rows
+
+
+def stale_results(filter_name: str) -> Optional[dict]:
+    """Kết quả lưu từ process trước (chưa có scan mới nào kể từ khi khởi động)."""
+    return SCAN_RESULTS.stale(filter_name, BOOT_TIME) if WARM_START_ENABLED else None
+
+
+def start_warm_start():
+    """Nạp bảng giá + nến đã lưu rồi chạy lại các scan ở nền ngay khi khởi động."""
+    universe = lambda: [s.code for s in fetch_all_symbols()]
+    return warm_start(
+        BOOT_CLOCK,
+        load_quotes=lambda: QUOTES.load(),
+        preload_bars=lambda: BAR_CACHE.preload(universe(), lookback_window()),
+        refresh={name: (lambda name=name: run_scan(name, universe())) for name in ("mua1", "sin", "sin3")},
+    )
+
+
+def timeframe_error(filter_name: str, timeframe: str) -> Optional[str]:
+    """Lý do bộ lọc không chạy được trên khung `timeframe` (None = chạy được): khung phút chỉ có
+    nến của phiên hiện tại, có thể không đủ số nến tối thiểu của bộ lọc."""
+    if timeframe not in TIMEFRAMES:
+        return f"Khung không hỗ trợ: {timeframe}"
+    cap, need = max_bars(timeframe), FILTER_MIN_BARS[filter_name]
+    if cap is not None and cap < need:
+        return (f"Khung {TIMEFRAME_LABELS[timeframe]} chỉ có tối đa {cap} nến (nến phút của phiên hiện tại), "
+                f"bộ lọc {filter_name} cần {need} nến")
+    return None
+
+
+def supported_timeframes(filter_name: str) -> List[str]:
+    """Các khung bộ lọc chạy được (để front-end chỉ hiện khung hợp lệ)."""
+    return [tf for tf in TIMEFRAMES if timeframe_error(filter_name, tf) is None]
+
+
+def scan_timeframe(filter_name: str, symbols: List[str], timeframe: str = "D") -> List[dict]:
+    """Chạy 1 bộ lọc trên khung bất kỳ (W/M gộp từ nến ngày, 1/5 phút từ nến 1 phút);
+    trả về các mã có ít nhất 1 tín hiệu. Khung không đủ nến cho bộ lọc -> ValueError."""
+    error = timeframe_error(filter_name, timeframe)
+    if error:
+        raise ValueError(error)
+    apply = SIGNAL_FILTERS[filter_name]
+    min_bars = FILTER_MIN_BARS[filter_name]
+
+    def one(sym: str) -> Optional[dict]:
+        try:
+            bars = bars_history(sym, timeframe, bars=min_bars + 10)
+            if bars.empty or len(bars) < min_bars:
+                return None
+            last, prev = float(bars["C"].iloc[-1]), float(bars["C"].iloc[-2])
+            signals = apply(bars)
+        except Exception as e:
+            print(f"⚠️ Lỗi xử lý symbol {sym}: {e}")
+            return None
+        if not any(signals.values()):
+            return None
+        return {"symbol": sym, "price": last, "pct": (last / prev - 1) * 100 if prev > 0 else 0.0,
+                "timeframe": timeframe, **signals}
+
+    with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        return [row for row in ex.map(one, symbols) if row]
+
+
+def evaluate_symbol(symbol: str, filter_names: Optional[List[str]] = None, explain: bool = False) -> dict:
+    """Chạy các bộ lọc trên 1 mã (tải nến ngày 1 lần: nến đã chốt từ cache + nến phiên hiện tại
+    từ bảng giá); bộ lọc thiếu dữ liệu trả về None. explain=True: kèm từng điều kiện đạt/không đạt."""
+    try:
+        daily = Bars.from_frame(daily_history(symbol))
+    except ProviderError as e:
+        print(f"⚠️ Không tải được {symbol}: {e}")
+        return {"symbol": symbol, "error": "fetch_failed"}
+    if daily.empty:
+        return {"symbol": symbol, "error": "no_daily"}
+    last = float(daily["C"].iloc[-1])
+    prev = float(daily["C"].iloc[-2]) if len(daily) >= 2 else last
+    signals, conditions = {}, {}
+    for name in filter_names or list(SIGNAL_FILTERS):
+        enough = len(daily) >= FILTER_MIN_BARS[name]
+        signals[name] = SIGNAL_FILTERS[name](daily) if enough else None
+        if explain:
+            conditions[name] = FILTER_EXPLAIN[name](daily) if enough else None
+    result = {"symbol": symbol, "price": last, "pct": (last / prev - 1) * 100 if prev > 0 else 0.0,
+              "bars": len(daily), "signals": signals}
+    if explain:
+        result["conditions"] = conditions
+    return result
+
+
+def evaluate_watchlist(symbols: List[str]) -> List[dict]:
+    """evaluate_symbol cho từng mã của danh sách theo dõi; mã vừa được danh sách khác đánh giá
+    (trong WATCHLIST_TTL) dùng lại kết quả, mã đang được đánh giá thì chờ chung."""
+    def one(sym: str) -> dict:
+        try:
+            return EVALUATIONS.get(sym, lambda: evaluate_symbol(sym))
+        except Exception as e:
+            print(f"⚠️ Lỗi xử lý symbol {sym}: {e}")
+            return {"symbol": sym, "error": str(e)}
+
+    with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        return list(ex.map(one, symbols))
+
+
+def watchlist_rows(filter_name: str, symbols: List[str]) -> List[dict]:
+    """Như SCAN_FUNCTIONS[filter_name](symbols) nhưng đi qua evaluate_watchlist (dùng chung giữa các danh sách)."""
+    rows = []
+    for r in evaluate_watchlist(symbols):
+        sig = None if r.get("error") else r["signals"].get(filter_name)
+        if sig is not None and (filter_name == "mua1" or any(sig.values())):  # mua1 trả cả mã không tín hiệu
+            rows.append({"symbol": r["symbol"], "price": r["price"], "pct": r["pct"], **sig})
+    return rows
+
+
+def alert_reference(symbol: str, ref: str) -> Optional[float]:
+    """Ngưỡng giá tương đương của EMA_n / MA_n trong phiên hiện tại, tính từ nến đã chốt
+    (cùng cửa sổ với bộ lọc để EMA khớp giá trị bộ lọc nhìn thấy)."""
+    m = REF_PATTERN.match(ref)
+    if m is None:
+        return None
+    kind, n = m.group(1), int(m.group(2))
+    sessions = max(DAILY_LOOKBACK_SESSIONS, n * 2)
+    try:
+        C = BAR_CACHE.closed(symbol, CALENDAR.window_days(sessions, vn_now().date()))["C"]
+    except ProviderError:
+        return None
+    if len(C) < n or n < 2:
+        return None
+    return float(ema(C, n).iloc[-1]) if kind == "EMA" else float(C.iloc[-(n - 1):].mean())
+
+
+ALERTS = PriceAlerts(reference=alert_reference)  # cảnh báo giá theo ngưỡng, kiểm tra theo quote poller
+
+
+def start_price_alerts() -> PriceAlerts:
+    """Nạp cảnh báo đã lưu và nghe bảng giá của quote poller (1 lần / process)."""
+    if ALERTS.quotes is None:
+        ALERTS.load()
+        ALERTS.attach(QUOTES)
+    return ALERTS
+
+
+def get_signal_engine() -> Optional[SignalEngine]:
+    """Engine tín hiệu nếu đã chạy trong process này."""
+    return _SIGNAL_ENGINE
+
+
+def start_signal_engine() -> SignalEngine:
+    """Engine tín hiệu nghe bảng giá của quote poller (1 lần / process)."""
+    global _SIGNAL_ENGINE
+    if _SIGNAL_ENGINE is None:
+        _SIGNAL_ENGINE = SignalEngine(BAR_CACHE.closed, BAR_CACHE.current_bar, lookback_window,
+                                      FILTER_MIN_BARS).attach(QUOTES).start()
+    return _SIGNAL_ENGINE
+
+# =====================
+# Chart Functions for Web App
+# =====================
+
+def fetch_extended_history(symbol: str, max_days: int = 500) -> pd.DataFrame:
+    """
+    Fetch extended historical data for charting (up to max_days)
+    Falls back to maximum available data if less than max_days
+    """
+    # Tính từ max_days ngày trước (thêm buffer cho weekends/holidays)
+    days_with_buffer = max_days + 50
+    
+    try:
+        # Fetch daily data (qua cache nến đã chốt)
+        daily = daily_history(symbol, days_with_buffer)
+        
+        if daily.empty:
+            return pd.DataFrame()
+        
+        # Giới hạn về max_days nếu có quá nhiều data
+        if len(daily) > max_days:
+            daily = daily.tail(max_days)
+            
+        return daily
+        
+    except Exception as e:
+        print(f"❌ Error fetching extended history for {symbol}: {e}")
+        return pd.DataFrame()
+
+def create_candlestick_chart(symbol: str, data: pd.DataFrame):
+    """
+    Create interactive candlestick chart with technical indicators
+    - Candlestick + Volume
+    - MA20, MA50, EMA34, EMA89
+    - RSI subplot
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    if data.empty:
+        return None
+    
+    # Tính các technical indicators
+    C = data['C']
+    H = data['H'] 
+    L = data['L']
+    O = data['O']
+    V = data['V']
+    
+    # Moving Averages
+    MA20 = sma(C, 20)
+    MA50 = sma(C, 50)
+    EMA34 = ema(C, 34)
+    EMA89 = ema(C, 89)
+    
+    # RSI
+    RSI14 = rsi(C, 14)
+    
+    # Volume MA
+    VOL_MA20 = sma(V, 20)
+    
+    # Tạo subplots: [Candlestick + MA], [Volume], [RSI]
+    fig = make_subplots(
+        rows=3, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.05,
+        subplot_titles=(f'{symbol} - Candlestick Chart', 'Volume', 'RSI (14)'),
+        row_heights=[0.6, 0.2, 0.2]
+    )
+    
+    # Candlestick
+    fig.add_trace(
+        go.Candlestick(
+            x=data.index,
+            open=O,
+            high=H,
+            low=L,
+            close=C,
+            name=symbol,
+            showlegend=False
+        ),
+        row=1, col=1
+    )
+    
+    # Moving Averages
+    fig.add_trace(
+        go.Scatter(x=data.index, y=MA20, name='MA20', 
+                  line=dict(color='blue', width=1)),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(x=data.index, y=MA50, name='MA50', 
+                  line=dict(color='orange', width=1)),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(x=data.index, y=EMA34, name='EMA34', 
+                  line=dict(color='red', width=1)),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(x=data.index, y=EMA89, name='EMA89', 
+                  line=dict(color='purple', width=1)),
+        row=1, col=1
+    )
+    
+    # Volume
+    fig.add_trace(
+        go.Bar(x=data.index, y=V, name='Volume', 
+               marker_color='lightblue', showlegend=False),
+        row=2, col=1
+    )
+    fig.add_trace(
+        go.Scatter(x=data.index, y=VOL_MA20, name='Vol MA20', 
+                  line=dict(color='red', width=1)),
+        row=2, col=1
+    )
+    
+    # RSI
+    fig.add_trace(
+        go.Scatter(x=data.index, y=RSI14, name='RSI(14)', 
+                  line=dict(color='green', width=2), showlegend=False),
+        row=3, col=1
+    )
+    
+    # RSI reference lines
+    fig.add_hline(y=70, line_dash="dash", line_color="red", 
+                  annotation_text="Overbought (70)", row=3, col=1)
+    fig.add_hline(y=30, line_dash="dash", line_color="blue", 
+                  annotation_text="Oversold (30)", row=3, col=1)
+    fig.add_hline(y=50, line_dash="dot", line_color="gray", row=3, col=1)
+    
+    # Layout styling (Light theme)
+    fig.update_layout(
+        title=f"{symbol} - Technical Analysis ({len(data)} days)",
+        height=800,
+        template="plotly_white",
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        margin=dict(l=50, r=50, t=100, b=50)
+    )
+    
+    # X-axis formatting
+    fig.update_xaxes(
+        rangeslider_visible=False,
+        rangeselector=dict(
+            buttons=list([
+                dict(count=30, label="30D", step="day", stepmode="backward"),
+                dict(count=60, label="60D", step="day", stepmode="backward"),
+                dict(count=90, label="90D", step="day", stepmode="backward"),
+                dict(step="all", label="All")
+            ])
+        )
+    )
+    
+    # Y-axis RSI range
+    fig.update_yaxes(range=[0, 100], row=3, col=1)
+    
+    return fig
+
+
+def get_chart_data(symbol: str, days: int = 120, timeframe: str = "D") -> pd.DataFrame:
+    """Dữ liệu vẽ chart: nến ngày `days` phiên gần nhất, hoặc khung khác gộp từ cache."""
+    if timeframe == "D":
+        return fetch_extended_history(symbol, days)
+    return bars_history(symbol, timeframe, days)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Hàng đợi gửi tin Telegram theo giới hạn tốc độ
+- Token bucket toàn cục (~30 tin/s của Bot API) và theo chat (chat riêng ~1 tin/s,
+  nhóm ~20 tin/phút); chat nào tới lượt trước gửi trước, mỗi chat giữ đúng thứ tự
+- Lỗi 429 (RetryAfter): tạm dừng đúng `retry_after` giây rồi gửi lại tin đó;
+  lỗi mạng thử lại có backoff; lỗi khác (chat chặn bot, HTML sai) báo qua future
+- Tin ngắn đang chờ của cùng 1 chat (cùng parse_mode, không có nút) được gộp thành 1 tin
+- depth() cho biết số tin đang chờ / đã gửi / đã gộp / lỗi
+
+Run:
+  python send_queue.py bench --chats 200 --messages 3   # cần fake_telegram.py serve --flood
+"""
+from __future__ import annotations
+import os, sys, html, time, heapq, asyncio, argparse, itertools
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter, NetworkError, TimedOut
+
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 25))       # tin/giây toàn bot (Telegram: ~30)
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))            # tin/giây mỗi chat riêng
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", 20 / 60))    # tin/giây mỗi nhóm (20/phút)
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", 3))            # tin gửi liền được trước khi bị giãn
+SEND_MERGE_WINDOW = float(os.getenv("SEND_MERGE_WINDOW", 0.15))   # giây chờ gom tin đầu tiên của 1 chat
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", 16))         # request sendMessage cùng lúc
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 5))
+MAX_TEXT = 4096
+MERGE_MAX_CHARS = 1000  # chỉ gộp tin ngắn (cảnh báo, thông báo trạng thái), tin dài gửi riêng
+MERGE_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """`rate` token/giây, tối đa `burst` token; thời gian tính theo loop.time()."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = float(burst), now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def ready_at(self, now: float) -> float:
+        self._refill(now)
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Item:
+    __slots__ = ("chat_id", "text", "kwargs", "future", "mergeable", "attempts", "parts")
+
+    def __init__(self, chat_id: int, text: str, kwargs: dict, future: asyncio.Future, mergeable: bool):
+        self.chat_id, self.text, self.kwargs, self.future = chat_id, text, kwargs, future
+        self.mergeable = mergeable and not kwargs.get("reply_markup") and len(text) <= MERGE_MAX_CHARS
+        self.attempts = 0
+        self.parts = 1
+
+
+class _Chat:
+    __slots__ = ("items", "bucket", "scheduled", "busy")
+
+    def __init__(self, bucket: TokenBucket):
+        self.items: Deque[_Item] = deque()
+        self.bucket = bucket
+        self.scheduled = False
+        self.busy = False  # đang gửi 1 tin: tin sau chờ để giữ đúng thứ tự trong chat
+
+
+class SendQueue:
+    """Gửi tin qua bot.send_message theo giới hạn tốc độ; send() trả về future của Message."""
+
+    def __init__(self, bot, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 group_rate: float = SEND_GROUP_RATE, chat_burst: int = SEND_CHAT_BURST,
+                 merge_window: float = SEND_MERGE_WINDOW, concurrency: int = SEND_CONCURRENCY,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.bot = bot
+        self.global_rate, self.chat_rate, self.group_rate = global_rate, chat_rate, group_rate
+        self.chat_burst, self.merge_window = chat_burst, merge_window
+        self.max_retries = max_retries
+        self._concurrency = concurrency
+        self._chats: Dict[int, _Chat] = {}
+        self._ready: List[Tuple[float, int, int]] = []  # heap (thời điểm được gửi, seq, chat_id)
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._global: Optional[TokenBucket] = None
+        self._paused_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self.stats = {"queued": 0, "sent": 0, "merged": 0, "retried": 0, "retry_after": 0, "failed": 0}
+
+    # ---- vòng đời ----
+
+    def start(self) -> "SendQueue":
+        """Gọi trong event loop của bot (post_init)."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # burst nhỏ: trong mọi cửa sổ 1 giây không vượt quá ~1.2 x global_rate
+        self._global = TokenBucket(self.global_rate, max(1.0, self.global_rate / 5), self._loop.time())
+        self._slots = asyncio.Semaphore(self._concurrency)
+        self._task = self._loop.create_task(self._run(), name="send-queue")
+        return self
+
+    async def stop(self, drain: float = 30.0):
+        """Chờ gửi hết tin đang chờ (tối đa `drain` giây) rồi dừng."""
+        deadline = time.time() + drain
+        while (self.pending() or self._inflight) and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+        for chat in self._chats.values():
+            for item in chat.items:
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Hàng đợi gửi đã dừng"))
+            chat.items.clear()
+
+    # ---- API ----
+
+    def send(self, chat_id: int, text: str, mergeable: bool = True, **kwargs) -> asyncio.Future:
+        """Xếp tin vào hàng đợi (gọi trong event loop); future trả về Message đã gửi
+        (tin bị gộp trả về cùng Message với tin gộp cùng)."""
+        loop = self._loop or asyncio.get_running_loop()
+        future = loop.create_future()
+        self.stats["queued"] += 1
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, self.chat_burst, loop.time()))
+        last = chat.items[-1] if chat.items else None
+        if last is not None and mergeable and last.mergeable and not kwargs.get("reply_markup"):
+            merged = _merge(last.text, last.kwargs, text, kwargs)
+            if merged is not None:
+                last.text, last.kwargs = merged
+                last.parts += 1
+                last.future.add_done_callback(lambda f: _copy_result(f, future))
+                self.stats["merged"] += 1
+                return future
+        chat.items.append(_Item(chat_id, text, kwargs, future, mergeable))
+        if not chat.scheduled and not chat.busy:
+            self._schedule(chat_id, chat, loop.time() + (self.merge_window if mergeable else 0))
+        return future
+
+    def send_threadsafe(self, chat_id: int, text: str, **kwargs):
+        """Từ thread khác (engine tín hiệu, cảnh báo giá): xếp hàng, không chờ kết quả."""
+        if self._loop is None:
+            raise RuntimeError("SendQueue chưa start()")
+        self._loop.call_soon_threadsafe(lambda: _ignore(self.send(chat_id, text, **kwargs)))
+
+    def pending(self) -> int:
+        return sum(len(c.items) for c in self._chats.values())
+
+    def depth(self) -> dict:
+        return {"pending": self.pending(), "chats_waiting": sum(1 for c in self._chats.values() if c.items),
+                "inflight": len(self._inflight),
+                "paused_for": round(max(0.0, self._paused_until - self._loop.time()), 1) if self._loop else 0,
+                **self.stats}
+
+    # ---- điều phối ----
+
+    def _schedule(self, chat_id: int, chat: _Chat, at: float):
+        chat.scheduled = True
+        heapq.heappush(self._ready, (max(at, chat.bucket.ready_at(self._loop.time())), next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def _sleep(self, seconds: float):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        loop = self._loop
+        while True:
+            if not self._ready:
+                await self._sleep(3600)
+                continue
+            now = loop.time()
+            at, _, chat_id = self._ready[0]
+            wait = max(at, self._global.ready_at(now), self._paused_until) - now
+            if wait > 0:
+                await self._sleep(wait)
+                continue
+            heapq.heappop(self._ready)
+            chat = self._chats[chat_id]
+            if not chat.items:
+                chat.scheduled = False
+                continue
+            ready = chat.bucket.ready_at(now)
+            if ready > now:  # bucket của chat bị trừ bởi RetryAfter -> xếp lại
+                heapq.heappush(self._ready, (ready, next(self._seq), chat_id))
+                continue
+            await self._slots.acquire()
+            item = chat.items.popleft()
+            self._global.take(now)
+            chat.bucket.take(now)
+            chat.scheduled = False
+            chat.busy = True  # tin kế tiếp của chat được xếp lịch khi tin này gửi xong
+            task = loop.create_task(self._deliver(item, chat))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, item: _Item, chat: _Chat):
+        try:
+            msg = await self.bot.send_message(chat_id=item.chat_id, text=item.text, **item.kwargs)
+            self.stats["sent"] += 1
+            if not item.future.done():
+                item.future.set_result(msg)
+        except RetryAfter as e:
+            self.stats["retry_after"] += 1
+            wait = e.retry_after  # PTB 21: int giây hoặc timedelta
+            wait = wait.total_seconds() if hasattr(wait, "total_seconds") else float(wait)
+            self._requeue(item, chat, wait, global_pause=True)
+        except (TimedOut, NetworkError) as e:
+            item.attempts += 1
+            self.stats["retried"] += 1
+            if item.attempts > self.max_retries:
+                self._fail(item, e)
+            else:
+                self._requeue(item, chat, min(30.0, 0.5 * 2 ** item.attempts))
+        except Exception as e:  # Forbidden (chat chặn bot), BadRequest (HTML sai)...
+            self._fail(item, e)
+        finally:
+            self._slots.release()
+            chat.busy = False
+            if chat.items and not chat.scheduled:
+                self._schedule(item.chat_id, chat, self._loop.time())
+
+    def _requeue(self, item: _Item, chat: _Chat, delay: float, global_pause: bool = False):
+        now = self._loop.time()
+        if global_pause:  # 429 của Telegram áp cho cả bot: dừng mọi chat
+            self._paused_until = max(self._paused_until, now + delay)
+        chat.items.appendleft(item)  # giữ thứ tự tin trong chat
+        chat.bucket.take(now)
+        chat.bucket.tokens = min(chat.bucket.tokens, 1 - delay * chat.bucket.rate)  # sẵn sàng sau `delay`
+
+    def _fail(self, item: _Item, e: Exception):
+        self.stats["failed"] += 1  # số tin (lần gửi) lỗi, như "sent"; tin đã gộp vào cùng báo lỗi qua future
+        print(f"⚠️ Không gửi được tin tới {item.chat_id}: {e}")
+        if not item.future.done():
+            item.future.set_exception(e)
+            item.future.exception()  # không ai chờ thì không cảnh báo
+
+
+def _merge(text_a: str, kw_a: dict, text_b: str, kw_b: dict) -> Optional[Tuple[str, dict]]:
+    """Gộp 2 tin của cùng chat; tin thường gộp vào tin HTML thì được escape. None = không gộp được
+    (khác tham số, tin mới dài hơn MERGE_MAX_CHARS, hoặc gộp xong vượt MAX_TEXT)."""
+    if len(text_b) > MERGE_MAX_CHARS:
+        return None
+    mode_a, mode_b = kw_a.get("parse_mode"), kw_b.get("parse_mode")
+    rest_a = {k: v for k, v in kw_a.items() if k != "parse_mode"}
+    if rest_a != {k: v for k, v in kw_b.items() if k != "parse_mode"}:
+        return None
+    if mode_a != mode_b:
+        if {mode_a, mode_b} != {None, "HTML"}:
+            return None
+        text_a = text_a if mode_a else html.escape(text_a, quote=False)
+        text_b = text_b if mode_b else html.escape(text_b, quote=False)
+    text = text_a + MERGE_SEPARATOR + text_b
+    if len(text) > MAX_TEXT:
+        return None
+    return text, {**rest_a, **({"parse_mode": mode_a or mode_b} if (mode_a or mode_b) else {})}
+
+
+def _copy_result(src: asyncio.Future, dst: asyncio.Future):
+    if dst.done():
+        return
+    if src.exception() is not None:
+        dst.set_exception(src.exception())
+        dst.exception()
+    else:
+        dst.set_result(src.result())
+
+
+def _ignore(future: asyncio.Future):
+    future.add_done_callback(lambda f: f.exception())
+
+
+# =====================
+# Benchmark với fake_telegram.py (serve --flood)
+# =====================
+
+async def _bench(api_url: str, chats: int, messages: int, use_queue: bool) -> dict:
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    bot = Bot("123:fake", base_url=f"{api_url.rstrip('/')}/bot",
+              request=HTTPXRequest(connection_pool_size=SEND_CONCURRENCY * 2))
+    await bot.initialize()
+    targets = [(c, f"Cảnh báo {i + 1} cho chat {c}") for i in range(messages) for c in range(1, chats + 1)]
+    t0 = time.time()
+    if use_queue:
+        q = SendQueue(bot).start()
+        results = await asyncio.gather(*(q.send(c, text) for c, text in targets), return_exceptions=True)
+        depth = q.depth()
+        await q.stop()
+    else:  # gửi thẳng như trước: mọi tin cùng lúc
+        results = await asyncio.gather(*(bot.send_message(c, text) for c, text in targets), return_exceptions=True)
+        depth = {}
+    await bot.shutdown()
+    errors = [r for r in results if isinstance(r, Exception)]
+    return {"mode": "queue" if use_queue else "direct", "messages": len(targets),
+            "errors": len(errors), "first_error": repr(errors[0]) if errors else None,
+            "seconds": round(time.time() - t0, 2), **{k: depth[k] for k in ("sent", "merged", "retry_after")
+                                                       if k in depth}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hàng đợi gửi tin Telegram")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="Gửi hàng loạt qua fake_telegram.py: thẳng vs hàng đợi")
+    b.add_argument("--api", default=os.getenv("TELEGRAM_API_URL", "http://127.0.0.1:8790"))
+    b.add_argument("--chats", type=int, default=200)
+    b.add_argument("--messages", type=int, default=3, help="Số tin mỗi chat")
+    b.add_argument("--mode", choices=("both", "direct", "queue"), default="both")
+    args = ap.parse_args(argv)
+    modes = [False, True] if args.mode == "both" else [args.mode == "queue"]
+    for i, use_queue in enumerate(modes):
+        if i:
+            time.sleep(3)  # chờ hết thời gian chặn 429 của lượt trước
+        print(asyncio.run(_bench(args.api, args.chats, args.messages, use_queue)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
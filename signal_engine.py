@@ -0,0 +1,197 @@
+"""
+Engine tín hiệu realtime: theo dõi bảng giá và phát sự kiện vào/ra của từng bộ lọc
+- Nhận danh sách mã vừa đổi giá từ QuoteTable (quote poller), chỉ đánh giá lại các mã đó
+- Trạng thái theo mã: TAIL nến đã chốt + EMA34/EMA89 tại nến đã chốt cuối (Snapshot 1 mã của
+  indicator_snapshot.py, dựng lại khi có nến chốt mới); mỗi lần giá đổi chỉ gộp nến đang chạy
+  (EMA 1 bước, cửa sổ trượt trên TAIL + 1 cột) thay vì chạy lại apply_filters* trên cả chuỗi nến
+- Giá lần đánh giá trước và kết quả tín hiệu trước
+- Phát Event "enter"/"exit" cho subscriber (bot) và giữ lịch sử gần nhất cho web app
+"""
+from __future__ import annotations
+import time, threading, datetime as dt
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from bar_cache import bar_days
+from indicator_snapshot import Snapshot, build_snapshot
+from trading_calendar import VN_TZ, final_day, vn_now
+
+SIGNAL_LABELS = {
+    "BuyBreak": "Mua Break", "BuyNormal": "Mua Thường", "Sell": "Bán",
+    "Short": "Short", "Cover": "Cover", "Sideway": "Sideway",
+    "BuySin": "Mua Sịn", "BuySin2": "Mua Sịn 2", "BuySin3": "Mua Sịn 3",
+}
+
+
+@dataclass
+class Event:
+    seq: int
+    ts: float
+    symbol: str
+    signal: str   # key của bộ lọc, ví dụ "BuySin3"
+    kind: str     # "enter" | "exit"
+    price: float
+    pct: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def format_html(self) -> str:
+        icon = "🚀" if self.kind == "enter" else "🔻"
+        verb = "vào" if self.kind == "enter" else "rời"
+        label = SIGNAL_LABELS.get(self.signal, self.signal)
+        clock = dt.datetime.fromtimestamp(self.ts, VN_TZ).strftime("%H:%M:%S")
+        return (f"{icon} <b>{self.symbol}</b> {verb} <b>{label}</b> • {self.price:,.2f} • "
+                f"<b>{self.pct:+.2f}%</b> <i>({clock})</i>")
+
+
+class SignalEngine:
+    """Đánh giá lại bộ lọc cho các mã vừa đổi giá và phát sự kiện chuyển trạng thái."""
+
+    def __init__(self, closed: Callable[[str, int], pd.DataFrame], live: Callable[[str], Optional[dict]],
+                 lookback: Callable[[], int], min_bars: Dict[str, int], history: int = 500):
+        """closed(sym, lookback_days): nến đã chốt; live(sym): nến phiên hiện tại hoặc None;
+        lookback(): số ngày lịch của cửa sổ nến ngày (như daily_history); min_bars: bộ lọc -> số nến tối thiểu."""
+        self.closed, self.live, self.lookback = closed, live, lookback
+        self.min_bars = min_bars
+        self.states: Dict[str, Snapshot] = {}           # sym -> trạng thái chỉ báo tại nến đã chốt cuối
+        self.signals: Dict[str, Dict[str, bool]] = {}   # sym -> tín hiệu lần trước
+        self.prices: Dict[str, tuple] = {}              # sym -> nến phiên hiện tại (O, H, L, C, V) lần đánh giá trước
+        self.events: deque = deque(maxlen=history)
+        self._subscribers: List[Callable[[Event], None]] = []
+        self._pending: set = set()
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.evaluations = 0
+        self.rebuilds = 0
+        self.last_latency = 0.0  # giây từ lúc nhận cập nhật tới lúc đánh giá xong
+
+    # ---- Đầu vào ----
+    def attach(self, quotes) -> "SignalEngine":
+        """Nghe QuoteTable; mỗi lần poller ghi giá mới, các mã đổi giá được xếp hàng đánh giá."""
+        quotes.subscribe(self.notify)
+        return self
+
+    def notify(self, symbols: List[str]):
+        with self._cond:
+            self._pending.update(symbols)
+            self._cond.notify()
+
+    # ---- Đầu ra ----
+    def subscribe(self, fn: Callable[[Event], None]):
+        self._subscribers.append(fn)
+
+    def events_since(self, seq: int = 0) -> List[Event]:
+        return [e for e in list(self.events) if e.seq > seq]
+
+    def active(self, signal: Optional[str] = None) -> Dict[str, List[str]]:
+        """Các mã đang thoả từng tín hiệu (theo trạng thái gần nhất)."""
+        out: Dict[str, List[str]] = {}
+        for sym, sigs in self.signals.items():
+            for k, v in sigs.items():
+                if v and (signal is None or k == signal):
+                    out.setdefault(k, []).append(sym)
+        return out
+
+    # ---- Xử lý ----
+    def _state(self, sym: str) -> Optional[Snapshot]:
+        """Trạng thái nến đã chốt của mã cho phiên hiện tại; chỉ dựng lại khi có nến chốt mới
+        hoặc cửa sổ nến đổi."""
+        now = vn_now()
+        through, lookback = final_day(now), self.lookback()
+        snap = self.states.get(sym)
+        if (snap is not None and snap.session == now.date() and snap.through == through
+                and snap.lookback_days == lookback):
+            return snap
+        frame = self.closed(sym, lookback + 1)  # build_snapshot tự cắt đúng cửa sổ
+        if frame is None or frame.empty:
+            return None
+        snap = build_snapshot({sym: frame}, now.date(), through, lookback)
+        self.rebuilds += 1
+        if bar_days(frame)[-1] >= through:  # tải thiếu nến (BarCache sẽ tải lại) -> lần sau dựng lại
+            self.states[sym] = snap
+        return snap
+
+    def evaluate(self, sym: str) -> List[Event]:
+        snap = self._state(sym)
+        if snap is None:
+            return []
+        bar = self.live(sym)
+        price = float(bar["C"]) if bar is not None else float(snap.tails["C"][0, -1])
+        # bộ lọc đọc cả H/L/O và KL (Short, Cover, Sideway, Mua Sịn...): chỉ bỏ qua khi cả nến không đổi
+        key = tuple(float(bar[f]) for f in ("O", "H", "L", "C", "V")) if bar is not None else (price,)
+        if self.prices.get(sym) == key and sym in self.signals:
+            return []
+        self.prices[sym] = key
+        current: Dict[str, bool] = {}
+        prev_close = None
+        for name, min_bars in self.min_bars.items():
+            try:
+                ok, sig, _, prev = snap.signals(name, [sym], {sym: bar}, min_bars)
+            except Exception as e:
+                print(f"⚠️ Lỗi bộ lọc {name} cho {sym}: {e}")
+                continue
+            if ok:  # thiếu nến cho bộ lọc -> không có tín hiệu của bộ lọc đó
+                current.update({k: bool(v[0]) for k, v in sig.items()})
+                prev_close = float(prev[0])
+        if prev_close is None:
+            return []
+        previous = self.signals.get(sym)
+        self.signals[sym] = current
+        self.evaluations += 1
+        if previous is None:  # lần đầu chỉ lấy mốc, không phát sự kiện
+            return []
+        pct = (price / prev_close - 1) * 100 if prev_close > 0 else 0.0
+        events = []
+        for key, now_on in current.items():
+            if bool(now_on) != bool(previous.get(key, False)):
+                self._seq += 1
+                events.append(Event(self._seq, time.time(), sym, key,
+                                    "enter" if now_on else "exit", price, pct))
+        return events
+
+    def _publish(self, events: List[Event]):
+        for e in events:
+            self.events.append(e)
+            for fn in list(self._subscribers):
+                try:
+                    fn(e)
+                except Exception as ex:
+                    print(f"⚠️ Lỗi subscriber tín hiệu: {ex}")
+
+    def _loop(self):
+        while self._running:
+            with self._cond:
+                while not self._pending and self._running:
+                    self._cond.wait(1.0)
+                batch, self._pending = self._pending, set()
+            t0 = time.time()
+            for sym in sorted(batch):
+                try:
+                    self._publish(self.evaluate(sym))
+                except Exception as e:
+                    print(f"⚠️ Lỗi đánh giá {sym}: {e}")
+            if batch:
+                self.last_latency = time.time() - t0
+
+    def start(self) -> "SignalEngine":
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, name="signal-engine", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+
+    def status(self) -> dict:
+        return {"symbols": len(self.signals), "pending": len(self._pending),
+                "evaluations": self.evaluations, "rebuilds": self.rebuilds, "events": self._seq,
+                "last_batch_seconds": round(self.last_latency, 3)}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Symbol registry: danh sách mã toàn thị trường (HOSE/HNX/UPCOM)
+- Nguồn: VNDIRECT stocks endpoint (phân trang) hoặc file JSON thay thế cục bộ
+- Lưu universe kèm floor/status vào file (mặc định symbols.json)
+- Memoize trong process, chỉ đọc lại khi file thay đổi (mtime/size)
+
+Run:
+  python symbol_registry.py --refresh                 # tải lại từ API
+  python symbol_registry.py --refresh --source x.json # dùng file thay thế
+  python symbol_registry.py --floors HOSE,HNX         # in danh sách đã lọc
+"""
+from __future__ import annotations
+import os, sys, json, time, argparse, threading
+from dataclasses import dataclass, asdict
+from typing import Iterable, List, Optional
+
+import requests
+
+# =====================
+# Config
+# =====================
+FINFO_STOCKS = "https://api.vndirect.com.vn/v4/stocks"
+UNIVERSE_FILE = os.getenv("UNIVERSE_FILE", "symbols.json")
+STOCKS_SOURCE = os.getenv("STOCKS_SOURCE", FINFO_STOCKS)  # URL hoặc đường dẫn file JSON
+STOCKS_PAGE_SIZE = int(os.getenv("STOCKS_PAGE_SIZE", 500))
+FLOORS = ("HOSE", "HNX", "UPCOM")
+REQUEST_TIMEOUT = 30
+
+
+@dataclass
+class SymbolInfo:
+    code: str
+    floor: str  # HOSE/HNX/UPCOM
+    status: str = ""  # LISTED/SUSPENDED/... (rỗng nếu nguồn không có)
+
+
+def _normalize_floors(floors: Optional[Iterable[str]]) -> Optional[set]:
+    if not floors:
+        return None
+    if isinstance(floors, str):
+        floors = floors.split(",")
+    return {f.strip().upper() for f in floors if f.strip()}
+
+
+def _parse_items(items: list) -> List[SymbolInfo]:
+    """Chuẩn hoá record từ API/file về SymbolInfo, bỏ mã trùng và không hợp lệ."""
+    out: List[SymbolInfo] = []
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict) or "code" not in item:
+            print(f"⚠️ Bỏ qua item không hợp lệ: {item}")
+            continue
+        code = str(item["code"]).strip().upper()
+        if not code or code in seen:
+            continue
+        if item.get("type") and str(item["type"]).upper() != "STOCK":
+            continue
+        seen.add(code)
+        out.append(SymbolInfo(
+            code=code,
+            floor=str(item.get("floor", "")).upper(),
+            status=str(item.get("status", "")).upper(),
+        ))
+    return out
+
+
+# =====================
+# Nguồn universe
+# =====================
+
+def _fetch_pages(url: str, page_size: int = STOCKS_PAGE_SIZE) -> list:
+    """Duyệt toàn bộ các trang của VNDIRECT stocks endpoint."""
+    params = {
+        "q": f"type:STOCK~floor:{','.join(FLOORS)}",
+        "size": page_size,
+        "page": 1,
+    }
+    headers = {"User-Agent": "Mozilla/5.0", "Accept": "application/json"}
+    items: list = []
+    while True:
+        r = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        js = r.json()
+        data = js.get("data") or []
+        items.extend(data)
+        total_pages = int(js.get("totalPages") or 1)
+        if not data or params["page"] >= total_pages:
+            break
+        params["page"] += 1
+    return items
+
+
+def _read_source_file(path: str) -> list:
+    """File thay thế: cùng format với API ({"data": [...]}) hoặc array như symbols.json."""
+    with open(path, "r", encoding="utf-8") as f:
+        js = json.load(f)
+    if isinstance(js, dict):
+        return js.get("data") or []
+    if isinstance(js, list):
+        return js
+    raise ValueError(f"File {path} phải chứa array hoặc object có key 'data'")
+
+
+class SymbolRegistry:
+    """Universe mã cổ phiếu, memoize theo (mtime, size) của file lưu trữ."""
+
+    def __init__(self, path: str = UNIVERSE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._symbols: List[SymbolInfo] = []
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self) -> List[SymbolInfo]:
+        """Trả về universe; chỉ đọc/validate lại file khi file thay đổi."""
+        try:
+            stamp = self._file_stamp()
+        except FileNotFoundError:
+            raise RuntimeError(f"❌ Không tìm thấy file {self.path}")
+        with self._lock:
+            if stamp == self._stamp:
+                return self._symbols
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise RuntimeError(f"❌ File {self.path} có lỗi format: {e}")
+            if not isinstance(data, list):
+                raise RuntimeError(f"❌ File {self.path} phải chứa một array")
+            self._symbols = _parse_items(data)
+            self._stamp = stamp
+            print(f"✅ Đã load {len(self._symbols)} symbols từ {self.path}")
+            return self._symbols
+
+    def symbols(self, floors: Optional[Iterable[str]] = None) -> List[SymbolInfo]:
+        """Universe lọc theo sàn (None = tất cả)."""
+        wanted = _normalize_floors(floors)
+        syms = self.load()
+        if wanted is None:
+            return list(syms)
+        return [s for s in syms if s.floor in wanted]
+
+    def codes(self, floors: Optional[Iterable[str]] = None) -> List[str]:
+        return [s.code for s in self.symbols(floors)]
+
+    def refresh(self, source: str = STOCKS_SOURCE) -> List[SymbolInfo]:
+        """Xây lại universe từ API (hoặc file thay thế) và ghi xuống file."""
+        t0 = time.time()
+        if source.startswith(("http://", "https://")):
+            items = _fetch_pages(source)
+        else:
+            items = _read_source_file(source)
+        syms = [s for s in _parse_items(items) if s.floor in FLOORS]
+        # Bỏ mã đã huỷ niêm yết nếu nguồn có status
+        syms = [s for s in syms if s.status not in ("DELISTED",)]
+        if not syms:
+            raise RuntimeError(f"❌ Nguồn {source} không trả về mã nào")
+        syms.sort(key=lambda s: (FLOORS.index(s.floor), s.code))
+        self.save(syms)
+        print(f"✅ Đã cập nhật {len(syms)} mã từ {source} ({time.time() - t0:.1f}s)")
+        return self.load()
+
+    def save(self, syms: List[SymbolInfo]):
+        """Ghi atomically để process khác không đọc phải file dở dang."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([asdict(s) for s in syms], f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+REGISTRY = SymbolRegistry()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Quản lý universe mã cổ phiếu")
+    ap.add_argument("--refresh", action="store_true", help="Tải lại universe từ nguồn")
+    ap.add_argument("--source", default=STOCKS_SOURCE, help="URL stocks endpoint hoặc file JSON")
+    ap.add_argument("--floors", default="", help="Lọc theo sàn, ví dụ HOSE,HNX")
+    args = ap.parse_args(argv)
+
+    if args.refresh:
+        REGISTRY.refresh(args.source)
+    syms = REGISTRY.symbols(args.floors or None)
+    counts = {f: sum(1 for s in syms if s.floor == f) for f in FLOORS}
+    print(f"📊 {len(syms)} mã: " + ", ".join(f"{f}={n}" for f, n in counts.items()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
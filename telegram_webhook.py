@@ -0,0 +1,102 @@
+"""
+Chế độ webhook cho bot Telegram (thay cho long polling)
+- Telegram POST update vào server asyncio của async_http.py; update được xác nhận ngay
+  rồi đưa vào application.update_queue, handler chạy song song (BOT_CONCURRENT_UPDATES)
+- Kiểm tra header X-Telegram-Bot-Api-Secret-Token (WEBHOOK_SECRET)
+- Nhiều bot worker có thể đứng sau 1 endpoint (reverse proxy), không còn lỗi Conflict
+  của getUpdates; chỉ 1 worker cần gọi setWebhook (WEBHOOK_REGISTER)
+- Dừng êm (SIGINT/SIGTERM): ngừng nhận request, xử lý hết update đã nhận rồi mới thoát
+- Có thể phục vụ luôn API scanner trên cùng port (WEBHOOK_WITH_API=1)
+
+Run:
+  WEBHOOK_URL=https://bot.example.com WEBHOOK_SECRET=... python app.py
+  python fake_telegram.py & TELEGRAM_API_URL=http://127.0.0.1:8790 WEBHOOK_URL=http://127.0.0.1:8788 python app.py
+"""
+from __future__ import annotations
+import os, time
+
+from telegram import Update
+from telegram.ext import Application
+
+from async_http import HttpServer, HttpError, Request, Response, json_response
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")                # URL công khai (https), rỗng = long polling
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")  # sau reverse proxy; 0.0.0.0 nếu nhận trực tiếp
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8788))
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1") != "0"  # 0 = worker phụ, không gọi setWebhook
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))  # Telegram gửi song song tối đa
+WEBHOOK_DELETE_ON_EXIT = os.getenv("WEBHOOK_DELETE_ON_EXIT", "0") == "1"
+WEBHOOK_WITH_API = os.getenv("WEBHOOK_WITH_API", "0") == "1"
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", 30))  # giây chờ update đang xử lý khi dừng
+
+
+class WebhookReceiver:
+    """Route nhận update của Telegram trên HttpServer."""
+
+    def __init__(self, application: Application, server: HttpServer, path: str = WEBHOOK_PATH,
+                 secret: str = WEBHOOK_SECRET):
+        self.application, self.server = application, server
+        self.path, self.secret = path, secret
+        self.stats = {"received": 0, "rejected": 0, "last": 0.0}
+        server.route("POST", path)(self.receive)
+        server.route("GET", "/webhook/health")(self.health)
+
+    async def receive(self, req: Request) -> Response:
+        if self.secret and req.headers.get("x-telegram-bot-api-secret-token") != self.secret:
+            self.stats["rejected"] += 1
+            raise HttpError(403, "Sai secret token")
+        update = Update.de_json(req.json(), self.application.bot)
+        if update is None:
+            raise HttpError(400, "Update rỗng")
+        await self.application.update_queue.put(update)  # xác nhận ngay, handler chạy sau
+        self.stats["received"] += 1
+        self.stats["last"] = time.time()
+        return Response(status=200)
+
+    async def health(self, req: Request) -> Response:
+        outbox = self.application.bot_data.get("send_queue")
+        return json_response({"ok": self.application.running, "queue": self.application.update_queue.qsize(),
+                              **self.stats, "outbox": outbox.depth() if outbox is not None else None})
+
+
+async def run_webhook(application: Application, url: str = WEBHOOK_URL, listen: str = WEBHOOK_LISTEN,
+                      port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                      register: bool = WEBHOOK_REGISTER, with_api: bool = WEBHOOK_WITH_API,
+                      grace: float = SHUTDOWN_GRACE, drop_pending: bool = False):
+    """Vòng đời đầy đủ của bot ở chế độ webhook (tương đương Application.run_webhook, không cần tornado)."""
+    server = HttpServer(listen, port)
+    receiver = WebhookReceiver(application, server, path, secret)
+    if with_api:
+        from api_server import ScannerApi  # import muộn: chỉ khi gộp API vào cùng process
+        ScannerApi(server)
+
+    async def stop_bot():
+        if WEBHOOK_DELETE_ON_EXIT and register:
+            try:
+                await application.bot.delete_webhook()
+            except Exception as e:
+                print(f"⚠️ Không xoá được webhook: {e}")
+        if application.running:
+            await application.stop()  # xử lý hết update đã nhận và các task đang chạy
+            print(f"✅ Đã xử lý xong {receiver.stats['received']} update")
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    server.on_shutdown.append(stop_bot)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await server.start()
+    if register:
+        await application.bot.set_webhook(
+            url.rstrip("/") + path, secret_token=secret or None, allowed_updates=Update.ALL_TYPES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS, drop_pending_updates=drop_pending)
+    print(f"🪝 Webhook: {url.rstrip('/') + path} -> http://{server.host}:{server.port}{path}"
+          f"{' (+ API)' if with_api else ''}")
+    await server.serve(grace)
@@ -0,0 +1,101 @@
+"""
+Gộp nến sang khung thời gian khác ngay tại chỗ, không gọi thêm API
+- W/M: gộp từ nến ngày đã cache (tuần bắt đầu thứ Hai, tháng theo lịch, giờ VN)
+- 5/15/60 phút: gộp từ bộ đệm vòng nến 1 phút của phiên hiện tại, nên số nến có tối đa là số
+  khoảng N phút của 1 phiên (max_bars); bộ lọc cần nhiều nến hơn không chạy được trên khung đó
+- merge_bar: gộp nến phiên hiện tại vào phần đã chốt của kỳ đang chạy (tuần/tháng),
+  dùng để vá nến cuối thay vì gộp lại cả chuỗi
+"""
+from __future__ import annotations
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from minute_store import MinuteRing, MINUTE_RING_SIZE
+from trading_calendar import MARKET_OPEN, LUNCH_START, LUNCH_END, MARKET_CLOSE
+
+MINUTE_TIMEFRAMES = {"5": 5, "15": 15, "60": 60}
+PERIOD_TIMEFRAMES = ("W", "M")
+TIMEFRAMES = ("1", *MINUTE_TIMEFRAMES, "D", *PERIOD_TIMEFRAMES)
+# số ngày lịch cho 1 nến (để tính cửa sổ nến ngày cần tải cho N nến tuần/tháng)
+CALENDAR_DAYS = {"D": 1.45, "W": 7, "M": 30.5}
+TIMEFRAME_LABELS = {"1": "1 phút", "5": "5 phút", "15": "15 phút", "60": "1 giờ",
+                    "D": "Ngày", "W": "Tuần", "M": "Tháng"}
+
+
+def _aggregate(keys: np.ndarray, o, h, l, c, v) -> Tuple[np.ndarray, dict]:
+    """Gộp các dòng liên tiếp cùng key; trả về vị trí dòng đầu mỗi nhóm và cột O/H/L/C/V."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    return starts, {
+        "O": np.asarray(o, dtype=np.float64)[starts],
+        "H": np.maximum.reduceat(np.asarray(h, dtype=np.float64), starts),
+        "L": np.minimum.reduceat(np.asarray(l, dtype=np.float64), starts),
+        "C": np.asarray(c, dtype=np.float64)[ends],
+        "V": np.add.reduceat(np.asarray(v, dtype=np.int64), starts),
+    }
+
+
+def period_keys(index: pd.DatetimeIndex, tf: str) -> np.ndarray:
+    """Khoá kỳ (ngày đầu tuần/tháng theo giờ VN) cho từng nến ngày."""
+    days = (index + pd.Timedelta(hours=7)).values.astype("datetime64[D]")
+    if tf == "W":
+        return days - (days.astype(np.int64) + 3) % 7  # 1970-01-01 là thứ Năm -> lùi về thứ Hai
+    if tf == "M":
+        return days.astype("datetime64[M]")
+    raise ValueError(f"Khung không hỗ trợ: {tf}")
+
+
+def resample_daily(daily: pd.DataFrame, tf: str) -> pd.DataFrame:
+    """Nến tuần/tháng từ nến ngày; index = thời điểm nến ngày đầu tiên của kỳ."""
+    if daily.empty:
+        return daily
+    starts, cols = _aggregate(period_keys(daily.index, tf), daily["O"].to_numpy(), daily["H"].to_numpy(),
+                              daily["L"].to_numpy(), daily["C"].to_numpy(), daily["V"].to_numpy())
+    return pd.DataFrame(cols, index=daily.index[starts])
+
+
+def resample_minutes(ring: Optional[MinuteRing], minutes: int) -> pd.DataFrame:
+    """Nến N phút từ bộ đệm nến 1 phút (tối đa 1 phiên nên chi phí gộp lại luôn nhỏ);
+    nến cuối là nến đang chạy."""
+    if ring is None or not len(ring):
+        return pd.DataFrame(columns=["O", "H", "L", "C", "V"])
+    step = minutes * 60
+    keys = ring.view("t") // step
+    starts, cols = _aggregate(keys, ring.view("O"), ring.view("H"), ring.view("L"),
+                              ring.view("C"), ring.view("V"))
+    for f in ("O", "H", "L", "C"):
+        cols[f] = cols[f].round(4)  # bộ đệm lưu float32
+    index = pd.DatetimeIndex(pd.to_datetime(keys[starts] * step, unit="s"), name="date")
+    return pd.DataFrame(cols, index=index)
+
+
+def merge_bar(base: Optional[dict], bar: dict) -> dict:
+    """Nến kỳ đang chạy = phần đã chốt của kỳ (nếu có) + nến phiên hiện tại."""
+    if base is None:
+        return dict(bar)
+    return {"O": base["O"], "H": max(base["H"], bar["H"]), "L": min(base["L"], bar["L"]),
+            "C": bar["C"], "V": base["V"] + bar["V"]}
+
+
+def _minute_of_day(t) -> int:
+    return t.hour * 60 + t.minute
+
+
+def max_bars(tf: str) -> Optional[int]:
+    """Số nến nhiều nhất khung `tf` có được (khung phút: 1 phiên trong bộ đệm nến 1 phút);
+    None = không giới hạn (D/W/M từ nến ngày)."""
+    if tf != "1" and tf not in MINUTE_TIMEFRAMES:
+        return None
+    minutes = MINUTE_TIMEFRAMES.get(tf, 1)
+    count = 0
+    for start, end in ((MARKET_OPEN, LUNCH_START), (LUNCH_END, MARKET_CLOSE)):
+        a, b = _minute_of_day(start), _minute_of_day(end)
+        count += (b - 1) // minutes - a // minutes + 1  # số khoảng N phút có nến khớp lệnh
+    return min(count, -(-MINUTE_RING_SIZE // minutes))
+
+
+def lookback_days(tf: str, bars: int) -> int:
+    """Cửa sổ nến ngày (ngày lịch) cần tải để có `bars` nến ở khung ngày/tuần/tháng."""
+    return int(bars * CALENDAR_DAYS[tf]) + 10
@@ -0,0 +1,139 @@
+"""
+Lịch giao dịch HOSE/HNX: ngày giao dịch, giờ khớp lệnh, nghỉ trưa, ngày nghỉ lễ
+- Phiên: sáng 9:00-11:30, chiều 13:00-14:45 (ATC 14:30-14:45), HNX khớp lệnh sau giờ tới 15:00;
+  nến ngày coi là chốt sau MARKET_CLOSE + CLOSE_SETTLE
+- Ngày nghỉ: thứ 7, chủ nhật, bảng HOLIDAYS (theo thông báo lịch nghỉ hằng năm của sở, cần cập nhật
+  mỗi năm) và MARKET_HOLIDAYS (env, bổ sung ngày nghỉ chưa có trong bảng)
+- Dùng để: không tải nến phút / poll giá ngoài giờ, lúc nghỉ trưa và ngày lễ; không tải bổ sung nến
+  đã chốt vào cuối tuần / ngày lễ; quy số phiên chỉ báo cần ra số ngày lịch của cửa sổ nến
+
+Run:
+  python trading_calendar.py              # trạng thái phiên hiện tại
+  python trading_calendar.py window 95    # số ngày lịch để cửa sổ phủ 95 phiên
+"""
+from __future__ import annotations
+import os, sys, argparse, datetime as dt
+from typing import Iterable, Optional
+
+VN_TZ = dt.timezone(dt.timedelta(hours=7))
+MARKET_OPEN = dt.time(9, 0)
+LUNCH_START = dt.time(11, 30)
+LUNCH_END = dt.time(13, 0)
+MARKET_CLOSE = dt.time(15, 0)
+CLOSE_SETTLE = dt.timedelta(minutes=5)  # chờ dữ liệu ATC/đóng cửa ổn định rồi mới chốt
+PAUSE_GRACE = dt.timedelta(minutes=1)   # nến phút cuối phiên sáng về trễ
+
+# Ngày nghỉ lễ trong tuần (Tết Dương lịch, Tết Nguyên đán, Giỗ Tổ, 30/4-1/5, Quốc khánh và ngày nghỉ bù)
+HOLIDAYS = [
+    "2024-01-01", "2024-02-08", "2024-02-09", "2024-02-12", "2024-02-13", "2024-02-14", "2024-04-18",
+    "2024-04-29", "2024-04-30", "2024-05-01", "2024-09-02", "2024-09-03",
+    "2025-01-01", "2025-01-27", "2025-01-28", "2025-01-29", "2025-01-30", "2025-01-31", "2025-04-07",
+    "2025-04-30", "2025-05-01", "2025-05-02", "2025-09-01", "2025-09-02",
+    "2026-01-01", "2026-02-16", "2026-02-17", "2026-02-18", "2026-02-19", "2026-02-20", "2026-04-27",
+    "2026-04-30", "2026-05-01", "2026-09-02",
+]
+MARKET_HOLIDAYS = os.getenv("MARKET_HOLIDAYS", "")  # ví dụ "2026-09-01,2027-01-01"
+
+
+def vn_now() -> dt.datetime:
+    return dt.datetime.now(VN_TZ)
+
+
+class TradingCalendar:
+    """Ngày/giờ giao dịch; mọi mốc thời gian là giờ Việt Nam."""
+
+    def __init__(self, holidays: Iterable = ()):
+        self.holidays = {d if isinstance(d, dt.date) else dt.date.fromisoformat(d.strip())
+                         for d in holidays if str(d).strip()}
+
+    def is_trading_day(self, day: dt.date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def next_session(self, day: dt.date) -> dt.date:
+        """Phiên giao dịch kế tiếp sau `day`."""
+        d = day + dt.timedelta(days=1)
+        while not self.is_trading_day(d):
+            d += dt.timedelta(days=1)
+        return d
+
+    def previous_session(self, day: dt.date) -> dt.date:
+        """Phiên giao dịch gần nhất trước `day`."""
+        d = day - dt.timedelta(days=1)
+        while not self.is_trading_day(d):
+            d -= dt.timedelta(days=1)
+        return d
+
+    def sessions_back(self, day: dt.date, sessions: int) -> dt.date:
+        """Phiên thứ `sessions` tính lùi, `day` (nếu là ngày giao dịch) là phiên thứ 1."""
+        d = day if self.is_trading_day(day) else self.previous_session(day)
+        for _ in range(max(sessions, 1) - 1):
+            d = self.previous_session(d)
+        return d
+
+    def final_day(self, now: dt.datetime) -> dt.date:
+        """Phiên gần nhất có nến đã chốt: hôm nay nếu đã qua giờ đóng cửa, ngược lại là phiên trước."""
+        close_at = dt.datetime.combine(now.date(), MARKET_CLOSE, VN_TZ) + CLOSE_SETTLE
+        if self.is_trading_day(now.date()) and now >= close_at:
+            return now.date()
+        return self.previous_session(now.date())
+
+    def in_session(self, now: dt.datetime) -> bool:
+        """Phiên hôm nay đã mở và chưa chốt (có nến đang chạy, kể cả lúc nghỉ trưa)."""
+        return (self.is_trading_day(now.date()) and now.time() >= MARKET_OPEN
+                and self.final_day(now) < now.date())
+
+    def quiet_since(self, now: dt.datetime) -> Optional[float]:
+        """Đang nghỉ trưa: epoch từ đó giá không đổi nữa (dữ liệu tải sau mốc này là đủ); ngược lại None."""
+        pause = dt.datetime.combine(now.date(), LUNCH_START, VN_TZ) + PAUSE_GRACE
+        if self.in_session(now) and pause <= now < dt.datetime.combine(now.date(), LUNCH_END, VN_TZ):
+            return pause.timestamp()
+        return None
+
+    def trading(self, now: dt.datetime) -> bool:
+        """Giá đang thay đổi: trong phiên và không nghỉ trưa (poller chỉ chạy lúc này)."""
+        return self.in_session(now) and self.quiet_since(now) is None
+
+    def window_days(self, sessions: int, day: dt.date) -> int:
+        """Số ngày lịch `lookback_days` để cửa sổ nến ngày xem vào ngày `day` (since = now - lookback_days)
+        phủ đúng `sessions` phiên gần nhất, tính cả phiên của `day` nếu là ngày giao dịch."""
+        return (day - self.sessions_back(day, sessions)).days + 1
+
+    def info(self, now: dt.datetime) -> dict:
+        return {"now": now.isoformat(timespec="seconds"), "trading_day": self.is_trading_day(now.date()),
+                "in_session": self.in_session(now), "trading": self.trading(now),
+                "final_day": self.final_day(now).isoformat(),
+                "next_session": self.next_session(now.date()).isoformat(),
+                "holidays": len(self.holidays)}
+
+
+CALENDAR = TradingCalendar(HOLIDAYS + MARKET_HOLIDAYS.split(","))
+
+
+def final_day(now: dt.datetime) -> dt.date:
+    return CALENDAR.final_day(now)
+
+
+def in_session(now: dt.datetime) -> bool:
+    return CALENDAR.in_session(now)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Lịch giao dịch HOSE/HNX")
+    sub = ap.add_subparsers(dest="cmd")
+    p = sub.add_parser("window")
+    p.add_argument("sessions", type=int)
+    p.add_argument("--day", default="", help="YYYY-MM-DD, mặc định hôm nay")
+    args = ap.parse_args(argv)
+
+    now = vn_now()
+    if args.cmd == "window":
+        day = dt.date.fromisoformat(args.day) if args.day else now.date()
+        days = CALENDAR.window_days(args.sessions, day)
+        print(f"📅 {args.sessions} phiên tới {day}: {days} ngày lịch "
+              f"(từ {CALENDAR.sessions_back(day, args.sessions)})")
+        return
+    print(CALENDAR.info(now))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
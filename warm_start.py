@@ -0,0 +1,114 @@
+"""
+Khởi động ấm: sau khi restart, trả lời ngay bằng trạng thái đã lưu rồi làm mới ở nền
+- Kết quả scan gần nhất của từng bộ lọc được lưu xuống đĩa (JSON, ghi file tạm rồi os.replace)
+- Kết quả lưu từ process trước được trả về ngay, đánh dấu là cũ, trong lúc scan mới chạy
+- Nến đã chốt nạp sẵn từ cache đĩa/panel, bảng giá nạp từ file của quote poller
+  (quote giữ thời điểm cập nhật cũ nên không được dùng làm giá realtime)
+- BootClock đo thời gian từ lúc process khởi động tới câu trả lời hữu ích đầu tiên
+"""
+from __future__ import annotations
+import os, json, time, threading
+from typing import Callable, Dict, List, Optional
+
+SCAN_RESULTS_FILE = os.getenv("SCAN_RESULTS_FILE", ".cache/scan_results.json")
+
+
+class ScanResultStore:
+    """Kết quả scan gần nhất theo bộ lọc: {name: {"rows", "scanned_at", "symbols"}}."""
+
+    def __init__(self, path: str = SCAN_RESULTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._results: Dict[str, dict] = {}
+        self._loaded = False  # đọc file ở lần dùng đầu, không đọc lúc import
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self.load()
+
+    def load(self) -> int:
+        if not self.path:
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+        with self._lock:
+            self._results = {k: v for k, v in data.items() if isinstance(v, dict) and "rows" in v}
+        return len(self._results)
+
+    def put(self, name: str, rows: List[dict], symbols: int = 0, scanned_at: Optional[float] = None):
+        entry = {"rows": rows, "scanned_at": scanned_at or time.time(), "symbols": symbols}
+        self._ensure_loaded()
+        with self._lock:
+            self._results[name] = entry
+            snapshot = dict(self._results)
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Không lưu được kết quả scan: {e}")
+
+    def get(self, name: str) -> Optional[dict]:
+        self._ensure_loaded()
+        return self._results.get(name)
+
+    def stale(self, name: str, before: float) -> Optional[dict]:
+        """Kết quả có từ trước thời điểm `before` (ví dụ từ process trước khi restart)."""
+        entry = self.get(name)
+        return entry if entry is not None and entry["scanned_at"] < before else None
+
+
+class BootClock:
+    """Mốc thời gian khởi động; ghi lại lần đầu có câu trả lời hữu ích."""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started or time.time()
+        self.first_answer: Optional[dict] = None
+        self.steps: Dict[str, float] = {}
+
+    def step(self, name: str):
+        self.steps[name] = round(time.time() - self.started, 2)
+
+    def mark(self, what: str, stale: bool):
+        if self.first_answer is not None:
+            return
+        seconds = round(time.time() - self.started, 2)
+        self.first_answer = {"what": what, "stale": stale, "seconds": seconds}
+        print(f"⏱️ Khởi động -> câu trả lời đầu tiên ({what}, {'dữ liệu cũ' if stale else 'mới'}): {seconds}s")
+
+    def report(self) -> dict:
+        return {"first_answer": self.first_answer, "steps": dict(self.steps)}
+
+
+def warm_start(clock: BootClock, load_quotes: Callable[[], int], preload_bars: Callable[[], int],
+               refresh: Dict[str, Callable[[], object]]) -> threading.Thread:
+    """Thread nền: nạp bảng giá + nến đã lưu (không gọi API), rồi chạy lại từng scan để có kết quả mới."""
+    def run():
+        try:
+            n = load_quotes()
+            clock.step("quotes")
+            print(f"♨️ Nạp {n} quote đã lưu ({clock.steps['quotes']}s)")
+            n = preload_bars()
+            clock.step("bars")
+            print(f"♨️ Nạp sẵn nến đã chốt của {n} mã ({clock.steps['bars']}s)")
+        except Exception as e:
+            print(f"⚠️ Lỗi nạp trạng thái đã lưu: {e}")
+        for name, fn in refresh.items():
+            try:
+                fn()
+                clock.step(f"scan_{name}")
+                print(f"♨️ Đã làm mới kết quả {name} ({clock.steps[f'scan_{name}']}s sau khởi động)")
+            except Exception as e:
+                print(f"⚠️ Lỗi làm mới {name}: {e}")
+
+    t = threading.Thread(target=run, name="warm-start", daemon=True)
+    t.start()
+    return t
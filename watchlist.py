@@ -0,0 +1,205 @@
+"""
+Danh sách theo dõi: theo chat (bot Telegram) và theo người dùng (web app)
+- Bot và web app dùng chung 1 file JSON (WATCHLIST_FILE), key "tg:<chat_id>" / "web:<tên>";
+  ghi file tạm rồi os.replace, process khác thấy file đổi thì tự đọc lại
+- union() / index(): hợp mọi danh sách và chỉ mục ngược mã -> các danh sách chứa mã,
+  để làm mới/cảnh báo theo mã (1 lần / mã) rồi mới chia ra từng danh sách
+- SharedEvaluations: cache TTL + single-flight theo mã (thread-safe): 100 danh sách trùng
+  nhau chỉ tốn 1 lượt tải + đánh giá mỗi mã trong mỗi chu kỳ làm mới
+
+Run:
+  python watchlist.py show
+  python watchlist.py add tg:42 VCB FPT HPG
+"""
+from __future__ import annotations
+import os, sys, json, time, argparse, threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+WATCHLIST_FILE = os.getenv("WATCHLIST_FILE", ".cache/watchlists.json")
+WATCHLIST_MAX = int(os.getenv("WATCHLIST_MAX", 100))  # số mã tối đa / danh sách
+WATCHLIST_TTL = float(os.getenv("WATCHLIST_TTL", 15))  # giây dùng chung 1 lượt đánh giá / mã
+
+
+def chat_key(chat_id: int) -> str:
+    return f"tg:{chat_id}"
+
+
+def user_key(name: str) -> str:
+    return f"web:{name.strip().lower()}"
+
+
+def normalize(symbols: Iterable[str]) -> List[str]:
+    """'vcb, fpt  HPG' -> ['VCB', 'FPT', 'HPG'] (bỏ trùng, giữ thứ tự)."""
+    out: List[str] = []
+    for s in symbols:
+        for part in str(s).replace(",", " ").split():
+            code = part.strip().upper()
+            if code and code not in out:
+                out.append(code)
+    return out
+
+
+class WatchlistStore:
+    """{key: [mã, ...]} lưu đĩa, dùng chung giữa các process."""
+
+    def __init__(self, path: str = WATCHLIST_FILE, max_size: int = WATCHLIST_MAX):
+        self.path, self.max_size = path, max_size
+        self._lock = threading.Lock()
+        self._lists: Dict[str, List[str]] = {}
+        self._stamp = None
+        self._index: Optional[Dict[str, Set[str]]] = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Đọc lại file nếu process khác vừa ghi (gọi khi đang giữ lock)."""
+        if not self.path:
+            return
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._lists = {k: normalize(v) for k, v in data.items() if isinstance(v, list)}
+        except (FileNotFoundError, ValueError):
+            self._lists = {}
+        self._stamp = stamp
+        self._index = None
+
+    def _save(self):
+        self._index = None
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({k: v for k, v in self._lists.items() if v}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._stamp = self._file_stamp()
+        except OSError as e:
+            print(f"⚠️ Không lưu được danh sách theo dõi: {e}")
+
+    def get(self, key: str) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._lists.get(key, []))
+
+    def set(self, key: str, symbols: Iterable[str]) -> List[str]:
+        with self._lock:
+            self._refresh()
+            self._lists[key] = normalize(symbols)[:self.max_size]
+            self._save()
+            return list(self._lists[key])
+
+    def add(self, key: str, symbols: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """-> (mã vừa thêm, mã bị bỏ vì danh sách đã đủ WATCHLIST_MAX)."""
+        with self._lock:
+            self._refresh()
+            current = self._lists.setdefault(key, [])
+            new = [s for s in normalize(symbols) if s not in current]
+            room = max(0, self.max_size - len(current))
+            current.extend(new[:room])
+            self._save()
+            return new[:room], new[room:]
+
+    def remove(self, key: str, symbols: Iterable[str]) -> List[str]:
+        with self._lock:
+            self._refresh()
+            drop = set(normalize(symbols))
+            current = self._lists.get(key, [])
+            removed = [s for s in current if s in drop]
+            self._lists[key] = [s for s in current if s not in drop]
+            self._save()
+            return removed
+
+    def clear(self, key: str):
+        with self._lock:
+            self._refresh()
+            self._lists.pop(key, None)
+            self._save()
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return [k for k, v in self._lists.items() if v]
+
+    def index(self) -> Dict[str, Set[str]]:
+        """mã -> các key có mã đó (dựng lại khi danh sách đổi)."""
+        with self._lock:
+            self._refresh()
+            if self._index is None:
+                index: Dict[str, Set[str]] = defaultdict(set)
+                for key, symbols in self._lists.items():
+                    for s in symbols:
+                        index[s].add(key)
+                self._index = dict(index)
+            return self._index
+
+    def union(self) -> List[str]:
+        return sorted(self.index())
+
+    def info(self) -> dict:
+        with self._lock:
+            self._refresh()
+            total = sum(len(v) for v in self._lists.values())
+        unique = len(self.index())
+        return {"lists": len(self.keys()), "entries": total, "unique_symbols": unique}
+
+
+class SharedEvaluations:
+    """Cache TTL + single-flight theo mã cho code đồng bộ (thread pool, Streamlit):
+    thread đến sau cùng mã chờ lượt tính đang chạy thay vì tải/đánh giá lại."""
+
+    def __init__(self, ttl: float = WATCHLIST_TTL):
+        self.ttl = ttl
+        self._values: Dict[str, Tuple[float, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        self.stats = {"computed": 0, "shared": 0}
+
+    def get(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._guard:
+            lock = self._locks[key]
+        with lock:
+            hit = self._values.get(key)
+            if hit is not None and time.time() - hit[0] <= self.ttl:
+                self.stats["shared"] += 1
+                return hit[1]
+            value = compute()
+            self._values[key] = (time.time(), value)
+            self.stats["computed"] += 1
+            return value
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Danh sách theo dõi (bot + web app)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("show")
+    for name in ("add", "remove"):
+        p = sub.add_parser(name)
+        p.add_argument("key", help="tg:<chat_id> hoặc web:<tên>")
+        p.add_argument("symbols", nargs="+")
+    args = ap.parse_args(argv)
+
+    store = WatchlistStore()
+    if args.cmd == "add":
+        added, rejected = store.add(args.key, args.symbols)
+        print(f"➕ {args.key}: {', '.join(added) or '-'}" + (f" (bỏ {', '.join(rejected)}: quá {store.max_size} mã)"
+                                                            if rejected else ""))
+    elif args.cmd == "remove":
+        print(f"➖ {args.key}: {', '.join(store.remove(args.key, args.symbols)) or '-'}")
+    for key in store.keys():
+        print(f"{key}: {' '.join(store.get(key))}")
+    print(store.info())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,17 +5,23 @@ Matching exact format from user's screenshot
 """
 import streamlit as st
 import pandas as pd
-import json
-import time
 from datetime import datetime
 
-# Import từ app.py gốc
-from app import (
-    fetch_all_symbols, fetch_symbol_bundle, apply_filters, apply_filters_sin,
-    scan_symbols, scan_symbols_sin, scan_symbols_sin2, scan_symbols_sin3,
-    fetch_extended_history, create_candlestick_chart
+# Import từ lõi quét (không kéo theo Telegram/dotenv)
+from scanner_core import (
+    fetch_all_symbols, scan_symbols, scan_symbols_sin, scan_symbols_sin2, scan_symbols_sin3,
+    fetch_extended_history, create_candlestick_chart, start_quote_poller, QUOTES,
+    start_signal_engine, scan_timeframe, supported_timeframes, TIMEFRAMES, PANEL, WATCHLISTS, watchlist_rows
 )
-import plotly.graph_objects as go
+from signal_engine import SIGNAL_LABELS
+from trading_calendar import VN_TZ
+from watchlist import user_key
+from timeframes import TIMEFRAME_LABELS
+from api_client import get_client
+
+# Có SCANNER_API_URL: universe, quét, giá, chart và sự kiện tín hiệu đều qua api_server.py (dùng chung
+# cache, poller và engine với bot); web không chạy poller / engine riêng
+API = get_client()
 
 # =====================
 # Page Config
@@ -78,19 +84,64 @@ st.markdown("""
 # =====================
 # Helper Functions
 # =====================
-def load_symbols():
-    """Load symbols từ JSON file"""
+def load_symbols(floors=None):
+    """Load symbols từ symbol registry (lọc theo sàn nếu có), hoặc từ API"""
     try:
-        with open("symbols.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return [item["code"] for item in data]  # Thay đổi từ "symbol" thành "code"
-    except FileNotFoundError:
-        st.error("File symbols.json không tìm thấy!")
-        return []
+        if API is not None:
+            return API.symbols(floors or None)
+        return [s.code for s in fetch_all_symbols(floors or [])]
     except Exception as e:
         st.error(f"Lỗi đọc symbols: {e}")
         return []
 
+@st.cache_resource
+def quote_poller():
+    """Poller giá nền dùng chung cho mọi phiên web (1 lần / process); None khi dùng API"""
+    return start_quote_poller() if API is None else None
+
+@st.cache_resource
+def signal_engine():
+    """Engine tín hiệu realtime dùng chung, nghe bảng giá của poller; None khi dùng API"""
+    return start_signal_engine() if API is None else None
+
+def get_quote(symbol: str):
+    """Quote realtime của 1 mã: bảng giá tại chỗ hoặc /quotes của API"""
+    if API is None:
+        return QUOTES.get(symbol)
+    try:
+        return API.quotes([symbol]).get(symbol)
+    except Exception:
+        return None
+
+def signal_events(engine, watchlist=None):
+    """(sự kiện dạng dict, tổng số sự kiện) từ engine tại chỗ hoặc /events của API"""
+    if API is not None:
+        try:
+            data = API.events(symbols=sorted(watchlist) if watchlist else None)
+        except Exception as e:
+            st.caption(f"⚠️ Không đọc được sự kiện tín hiệu từ API: {e}")
+            return [], 0
+        return data["events"], data["total"]
+    events = [e.to_dict() for e in list(engine.events) if not watchlist or e.symbol in watchlist]
+    return events, len(engine.events)
+
+def render_signal_events(engine, limit: int = 20, watchlist=None):
+    """Các lần vào/ra tín hiệu gần nhất do engine phát (mới nhất ở trên); có watchlist thì chỉ mã trong danh sách"""
+    events, total = signal_events(engine, watchlist)
+    events = events[-limit:][::-1]
+    with st.expander(f"⚡ Tín hiệu realtime ({total} sự kiện)", expanded=bool(events)):
+        if not events:
+            st.caption("Chưa có thay đổi tín hiệu nào trong phiên.")
+            return
+        st.dataframe(pd.DataFrame([{
+            "Giờ": datetime.fromtimestamp(e["ts"], VN_TZ).strftime("%H:%M:%S"),
+            "Mã": e["symbol"],
+            "Tín hiệu": SIGNAL_LABELS.get(e["signal"], e["signal"]),
+            "Loại": "🚀 Vào" if e["kind"] == "enter" else "🔻 Ra",
+            "Giá": e["price"],
+            "%": round(e["pct"], 2),
+        } for e in events]), hide_index=True, use_container_width=True)
+
 # =====================
 # Chart Functions
 # =====================
@@ -113,7 +164,7 @@ def show_chart_content(symbol: str, row_index: int = 0):
     if symbol not in st.session_state.chart_data:
         with st.spinner(f"🔄 Đang tải dữ liệu..."):
             # Fetch extended data (500 days or max available)
-            chart_data = fetch_extended_history(symbol, 500)
+            chart_data = API.chart(symbol, 500) if API else fetch_extended_history(symbol, 500)
             
             if chart_data.empty:
                 st.error(f"❌ Không thể tải dữ liệu cho {symbol}")
@@ -195,9 +246,13 @@ def show_chart_content(symbol: str, row_index: int = 0):
                 
                 color = "🟢" if change_pct > 0 else "🔴" if change_pct < 0 else "⚪"
                 
+                # Độ tươi của giá từ bảng giá realtime
+                quote = get_quote(symbol)
+                quote_age = f"  \n**🕐 Giá cập nhật:** {quote['age']:.0f}s trước" if quote else ""
+                
                 st.info(f"""
                 **💰 Giá hiện tại:** {price_formatted} {color} {change_pct:+.2f}%  
-                **📅 Dữ liệu:** {start_date} → {end_date}
+                **📅 Dữ liệu:** {start_date} → {end_date}{quote_age}
                 """)
         else:
             st.error("❌ Không thể tạo biểu đồ")
@@ -210,10 +265,13 @@ def show_chart_button(symbol: str, row_index: int = 0):
     with st.expander(f"📈 Chart {symbol}", expanded=False):
         show_chart_content(symbol, row_index)
 
-def run_scanner(filter_type):
-    """Chạy quét tín hiệu với bộ lọc được chọn"""
+FILTER_NAMES = {"MUA 1": "mua1", "MUA SỊN": "sin", "MUA SỊN 2": "sin2", "MUA SỊN 3": "sin3"}
+
+def run_scanner(filter_type, floors=None, timeframe="D", watchlist=None):
+    """Chạy quét tín hiệu với bộ lọc được chọn (khung khác D gộp nến tại chỗ từ cache);
+    watchlist: chỉ quét các mã trong danh sách theo dõi (đánh giá dùng chung giữa người dùng)"""
     # Load symbols
-    symbol_codes = load_symbols()
+    symbol_codes = list(watchlist) if watchlist else load_symbols(floors)
     if not symbol_codes:
         st.error("Không thể tải danh sách mã cổ phiếu")
         return []
@@ -226,7 +284,14 @@ def run_scanner(filter_type):
     total_symbols = len(symbol_codes)
     
     try:
-        if filter_type == "MUA 1":
+        if API is not None:
+            results = API.scan(FILTER_NAMES[filter_type], symbols=watchlist or None, floors=floors,
+                               timeframe=timeframe)
+        elif watchlist and timeframe == "D":
+            results = watchlist_rows(FILTER_NAMES[filter_type], symbol_codes)
+        elif timeframe != "D":
+            results = scan_timeframe(FILTER_NAMES[filter_type], symbol_codes, timeframe)
+        elif filter_type == "MUA 1":
             results = scan_symbols(symbol_codes)
         elif filter_type == "MUA SỊN":
             results = scan_symbols_sin(symbol_codes)
@@ -252,6 +317,8 @@ def run_scanner(filter_type):
 def main():
     # Initialize session state
     initialize_session_state()
+    poller = quote_poller()
+    engine = signal_engine()
     
     # Header - centered và đơn giản như trong hình
     st.markdown("""
@@ -271,6 +338,43 @@ def main():
             ["MUA 1", "MUA SỊN", "MUA SỊN 2", "MUA SỊN 3"],
             help="Chọn loại bộ lọc để quét tín hiệu"
         )
+
+        # Lọc theo sàn (để trống = toàn thị trường)
+        floors = st.multiselect(
+            "🏛️ Sàn:",
+            ["HOSE", "HNX", "UPCOM"],
+            default=[],
+            help="Để trống để quét toàn bộ HOSE/HNX/UPCOM"
+        )
+
+        # Khung thời gian (tuần/tháng gộp từ nến ngày, phút gộp từ nến 1 phút của phiên);
+        # chỉ hiện khung có đủ nến cho bộ lọc đang chọn
+        timeframes = [tf for tf in supported_timeframes(FILTER_NAMES[filter_type]) if tf != "1"]
+        hidden = [TIMEFRAME_LABELS[tf] for tf in TIMEFRAMES if tf != "1" and tf not in timeframes]
+        timeframe = st.selectbox(
+            "🕰️ Khung thời gian:",
+            timeframes,
+            index=timeframes.index("D"),
+            format_func=lambda tf: TIMEFRAME_LABELS[tf],
+            help="Khung phút chỉ có nến của phiên hiện tại"
+                 + (f"; không đủ nến cho bộ lọc này: {', '.join(hidden)}" if hidden else "")
+        )
+
+        # Danh sách theo dõi theo người dùng (lưu chung file với bot, ?user=ten trên URL để nhớ tên)
+        st.markdown("## ⭐ Danh sách theo dõi")
+        user = st.text_input("👤 Người dùng:", value=st.query_params.get("user", ""),
+                             help="Mỗi tên có 1 danh sách riêng")
+        watchlist, only_watchlist = [], False
+        if user.strip():
+            key = user_key(user)
+            saved = WATCHLISTS.get(key)
+            all_codes = load_symbols()
+            watchlist = st.multiselect("Mã theo dõi:", sorted(set(all_codes) | set(saved)), default=saved,
+                                       max_selections=WATCHLISTS.max_size)
+            if watchlist != saved:
+                WATCHLISTS.set(key, watchlist)
+            only_watchlist = st.checkbox("Chỉ quét & báo tín hiệu các mã này", value=bool(watchlist),
+                                         disabled=not watchlist)
         
         # Hiển thị thông tin bộ lọc theo format trong hình
         if filter_type == "MUA 1":
@@ -335,7 +439,7 @@ def main():
         # Thống kê
         st.markdown("---")
         st.markdown("## 📊 Thống kê")
-        symbols = load_symbols()
+        symbols = load_symbols(floors)
         total_symbols = len(symbols) if symbols else 0
         
         col1, col2 = st.columns(2)
@@ -343,6 +447,23 @@ def main():
             st.metric("Tổng mã", total_symbols)
         with col2:
             st.metric("Cập nhật", datetime.now().strftime("%H:%M"))
+        
+        # Trạng thái bảng giá realtime (của process này, hoặc của api_server)
+        if poller is not None:
+            quote_status = poller.status()
+            st.caption(f"📡 Bảng giá: {quote_status['fresh']} mới • {quote_status['stale']} cũ • "
+                       f"{quote_status['missing']} chưa có (làm mới {quote_status['interval']:.0f}s/lần)")
+        else:
+            try:
+                quote_status = API.stats()["quotes"]
+                st.caption(f"📡 Bảng giá (API): {quote_status['fresh']} mới • {quote_status['stale']} cũ • "
+                           f"{quote_status['missing']} chưa có")
+            except Exception as e:
+                st.caption(f"⚠️ Không đọc được trạng thái bảng giá từ API: {e}")
+        panel = PANEL.info() if API is None else {"available": False}
+        if panel["available"]:
+            st.caption(f"🧱 Panel dùng chung: {panel['symbols']} mã x {panel['days']} phiên, "
+                       f"chốt tới {panel['through']}")
     
     # Main content area giống format trong hình
     # Button quét ở giữa như trong ảnh
@@ -356,11 +477,14 @@ def main():
         
         # Hiển thị quét lần cuối
         st.markdown(f"🕐 **Quét lần cuối:** {datetime.now().strftime('%H:%M:%S')}")
+
+    scoped = watchlist if only_watchlist else None
+    render_signal_events(engine, watchlist=set(scoped) if scoped else None)
     
     if scan_button:
         # Loading state
         with st.spinner(f"🔍 Đang quét với bộ lọc {filter_type}..."):
-            results = run_scanner(filter_type)
+            results = run_scanner(filter_type, floors, timeframe, scoped)
         
         if results:
             # Success message
@@ -546,7 +670,7 @@ def main():
             2. 🚀 Nhấn "Quét {filter_type}" để bắt đầu
             3. 📊 Xem kết quả và tải xuống CSV
             
-            **Lưu ý:** Quét toàn bộ {len(load_symbols())} mã cổ phiếu.
+            **Lưu ý:** {f"Chỉ quét {len(scoped)} mã trong danh sách theo dõi." if scoped else f"Quét toàn bộ {len(load_symbols(floors))} mã cổ phiếu."}
             """)
     
 
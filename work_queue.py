@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Hàng đợi công việc quét dựa trên SQLite (chạy được trên nhiều host dùng chung file
+hoặc làm broker cục bộ để tách tải CPU khỏi Telegram bot)
+- Client (SCAN_MODE=queue): submit job = nhiều batch mã, chờ gom kết quả
+- Worker: lease từng batch, chạy scanner local, ghi các dòng kết quả về
+- Worker chết giữa chừng: lease hết hạn -> batch được worker khác nhận lại
+- Batch lỗi quá QUEUE_MAX_ATTEMPTS lần hoặc chưa xong khi client hết giờ chờ: client quét lại
+  phần mã đó trong process của mình, không trả về kết quả thiếu mã
+
+Run:
+  python work_queue.py worker              # chạy 1 worker
+  python work_queue.py status              # xem tiến độ các job
+  SCAN_MODE=queue python app.py            # bot chỉ submit job và gom kết quả
+"""
+from __future__ import annotations
+import os, sys, json, time, uuid, socket, sqlite3, argparse, threading, contextlib
+from typing import List, Optional, Tuple
+
+from scan_dispatch import SCANNERS, local_scanner, merge_rows
+
+QUEUE_DB = os.getenv("QUEUE_DB", "scan_queue.db")
+QUEUE_BATCH_SIZE = int(os.getenv("QUEUE_BATCH_SIZE", 100))
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", 60))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 3))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", 300))  # client chờ tối đa
+QUEUE_POLL_SECONDS = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    scanner TEXT NOT NULL,
+    module TEXT NOT NULL,
+    symbols TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    symbols TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending/leased/done/failed
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_batches_status ON batches(status, lease_until);
+CREATE INDEX IF NOT EXISTS idx_batches_job ON batches(job_id);
+"""
+
+
+class WorkQueue:
+    """Hàng đợi batch mã trên SQLite (WAL), an toàn khi nhiều process cùng truy cập."""
+
+    def __init__(self, path: str = QUEUE_DB):
+        self.path = path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # isolation_level=None: tự quản lý BEGIN IMMEDIATE/COMMIT; đóng kết nối = rollback nếu lỗi
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            yield db
+        finally:
+            db.close()
+
+    # ---- Client ----
+    def submit(self, scanner: str, symbols: List[str], batch_size: int = QUEUE_BATCH_SIZE) -> str:
+        job_id = uuid.uuid4().hex
+        module = SCANNERS[scanner][0] if scanner in SCANNERS else ""
+        batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("INSERT INTO jobs VALUES (?, ?, ?, ?, ?)",
+                       (job_id, scanner, module, json.dumps(symbols), time.time()))
+            db.executemany("INSERT INTO batches (job_id, seq, symbols) VALUES (?, ?, ?)",
+                           [(job_id, i, json.dumps(b)) for i, b in enumerate(batches)])
+            db.execute("COMMIT")
+        return job_id
+
+    def progress(self, job_id: str) -> dict:
+        with self._connect() as db:
+            cur = db.execute("SELECT status, COUNT(*) FROM batches WHERE job_id = ? GROUP BY status", (job_id,))
+            counts = dict(cur.fetchall())
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def collect(self, job_id: str, timeout: float = QUEUE_TIMEOUT) -> Tuple[List[dict], List[str]]:
+        """Chờ tới khi mọi batch xong (hoặc hết giờ) rồi gộp kết quả theo thứ tự mã.
+
+        Trả về (rows, các mã của batch lỗi / chưa xong); batch chưa xong bị huỷ để worker không nhận nữa."""
+        deadline = time.time() + timeout
+        while True:
+            p = self.progress(job_id)
+            finished = p.get("done", 0) + p.get("failed", 0)
+            if finished >= p["total"] or time.time() >= deadline:
+                break
+            time.sleep(QUEUE_POLL_SECONDS)
+        if finished < p["total"]:
+            print(f"⚠️ Job {job_id[:8]}: hết thời gian chờ, mới xong {finished}/{p['total']} batch")
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("UPDATE batches SET status = 'failed', error = 'timeout', lease_until = NULL "
+                       "WHERE job_id = ? AND status IN ('pending', 'leased')", (job_id,))
+            symbols = json.loads(db.execute("SELECT symbols FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+            parts, missing = [], []
+            for status, batch, rows in db.execute(
+                    "SELECT status, symbols, rows FROM batches WHERE job_id = ? ORDER BY seq", (job_id,)):
+                if status == "done":
+                    parts.append(json.loads(rows))
+                else:
+                    missing.extend(json.loads(batch))
+            db.execute("COMMIT")
+        return merge_rows(symbols, parts), missing
+
+    def purge(self, job_id: str):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM batches WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            db.execute("COMMIT")
+
+    # ---- Worker ----
+    def lease(self, worker: str, lease_seconds: float = QUEUE_LEASE_SECONDS
+              ) -> Optional[Tuple[int, str, str, List[str]]]:
+        """Nhận 1 batch đang chờ hoặc có lease đã hết hạn (worker cũ đã chết)."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT b.id, j.scanner, j.module, b.symbols, b.attempts FROM batches b "
+                "JOIN jobs j ON j.id = b.job_id "
+                "WHERE b.status = 'pending' OR (b.status = 'leased' AND b.lease_until < ?) "
+                "ORDER BY b.id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            batch_id, scanner, module, symbols, attempts = row
+            if attempts >= QUEUE_MAX_ATTEMPTS:
+                db.execute("UPDATE batches SET status = 'failed', error = 'max_attempts' WHERE id = ?",
+                           (batch_id,))
+                db.execute("COMMIT")
+                return self.lease(worker, lease_seconds)
+            db.execute("UPDATE batches SET status = 'leased', worker = ?, lease_until = ?, "
+                       "attempts = attempts + 1 WHERE id = ?", (worker, now + lease_seconds, batch_id))
+            db.execute("COMMIT")
+        return batch_id, scanner, module, json.loads(symbols)
+
+    def heartbeat(self, batch_id: int, worker: str, lease_seconds: float = QUEUE_LEASE_SECONDS) -> bool:
+        with self._connect() as db:
+            cur = db.execute("UPDATE batches SET lease_until = ? WHERE id = ? AND worker = ? "
+                             "AND status = 'leased'", (time.time() + lease_seconds, batch_id, worker))
+            return cur.rowcount == 1
+
+    def complete(self, batch_id: int, worker: str, rows: List[dict]) -> bool:
+        """Ghi kết quả; bỏ qua nếu lease đã bị worker khác nhận lại."""
+        with self._connect() as db:
+            cur = db.execute("UPDATE batches SET status = 'done', rows = ?, lease_until = NULL "
+                             "WHERE id = ? AND worker = ? AND status = 'leased'",
+                             (json.dumps(rows), batch_id, worker))
+            return cur.rowcount == 1
+
+    def release(self, batch_id: int, worker: str, error: str):
+        """Trả batch về hàng đợi sau lỗi để thử lại (tối đa QUEUE_MAX_ATTEMPTS lần)."""
+        with self._connect() as db:
+            db.execute("UPDATE batches SET status = 'pending', error = ?, lease_until = NULL "
+                       "WHERE id = ? AND worker = ? AND status = 'leased'", (error, batch_id, worker))
+
+
+def scan_via_queue(name: str, symbols: List[str]) -> List[dict]:
+    """Thin client: submit job vào hàng đợi và gom kết quả từ các worker; mã của batch lỗi hoặc
+    chưa xong (không có worker, worker chậm) được quét lại tại chỗ, lỗi ở bước này lan ra người gọi."""
+    q = WorkQueue()
+    job_id = q.submit(name, symbols)
+    t0 = time.time()
+    try:
+        rows, missing = q.collect(job_id)
+        if missing:
+            print(f"⚠️ Job {job_id[:8]}: {len(missing)} mã chưa có kết quả từ worker, quét lại trong process này")
+            rows = merge_rows(symbols, [rows, local_scanner(name)(missing)])
+    finally:
+        q.purge(job_id)
+    print(f"✅ Job {job_id[:8]} ({name}): {len(symbols)} mã, {len(rows)} dòng trong {time.time() - t0:.1f}s")
+    return rows
+
+
+def run_worker(worker: Optional[str] = None, once: bool = False, idle_sleep: float = 1.0):
+    """Vòng lặp worker: lease -> quét -> ghi kết quả; gia hạn lease khi batch chạy lâu."""
+    q = WorkQueue()
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    print(f"👷 Worker {worker} đang chờ việc từ {q.path}")
+    while True:
+        job = q.lease(worker)
+        if job is None:
+            if once:
+                return
+            time.sleep(idle_sleep)
+            continue
+        batch_id, scanner, module, symbols = job
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(QUEUE_LEASE_SECONDS / 3):
+                q.heartbeat(batch_id, worker)
+
+        threading.Thread(target=keep_alive, daemon=True).start()
+        try:
+            rows = local_scanner(scanner, module or None)(symbols)
+            if not q.complete(batch_id, worker, rows):
+                print(f"⚠️ Batch {batch_id} đã bị worker khác nhận lại, bỏ kết quả")
+        except Exception as e:
+            print(f"❌ Batch {batch_id} lỗi: {e}")
+            q.release(batch_id, worker, str(e))
+        finally:
+            stop.set()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hàng đợi quét SQLite")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="Chạy worker")
+    w.add_argument("--id", default=None)
+    w.add_argument("--once", action="store_true", help="Thoát khi hết việc")
+    sub.add_parser("status", help="Tiến độ các job")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "worker":
+        run_worker(args.id, args.once)
+    else:
+        q = WorkQueue()
+        with q._connect() as db:
+            jobs = db.execute("SELECT id, scanner, created FROM jobs ORDER BY created").fetchall()
+        if not jobs:
+            print("📭 Không có job nào")
+        for job_id, scanner, created in jobs:
+            print(f"📦 {job_id[:8]} {scanner:5} {time.strftime('%H:%M:%S', time.localtime(created))} "
+                  f"{q.progress(job_id)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())